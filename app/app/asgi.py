@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+# Django's handler, also awaiting the async streaming responses
+from core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+from app import warmup  # noqa: E402
+
+# The event loop is already running here, so only the steps that do not
+# touch the database can run
+warmup.run_steps(warmup.PRELOAD_STEPS)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 
@@ -27,6 +28,9 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'changeme')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = bool(int(os.environ.get('DEBUG', 0)))
 
+# Running the test suite, which only throttles the tests setting a rate
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS = []
 ALLOWED_HOSTS.extend(
     filter(
@@ -54,15 +58,55 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestTimingMiddleware',
+    'core.middleware.ShardMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'core.middleware.LeanSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.LeanCsrfViewMiddleware',
+    'core.middleware.LeanAuthenticationMiddleware',
+    'core.middleware.LeanMessageMiddleware',
+    'core.middleware.LeanXFrameOptionsMiddleware',
 ]
 
+# Token authenticated paths that skip the session, CSRF, messages and
+# clickjacking middleware, except the HTML pages under them
+LEAN_MIDDLEWARE_PREFIXES = ['/api/', '/metrics']
+LEAN_MIDDLEWARE_EXCLUDED_PREFIXES = ['/api/docs/']
+
+# Share of the requests whose queries and timings are recorded and
+# logged, Server-Timing exposes them to the client when enabled
+REQUEST_TIMING_SAMPLE_RATE = float(
+    os.environ.get('REQUEST_TIMING_SAMPLE_RATE', 0))
+SERVER_TIMING_HEADER = bool(int(os.environ.get('SERVER_TIMING_HEADER', 0)))
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+
+# Serve the recipe lists from the precomputed cards, run
+# build_recipe_cards after turning it on
+RECIPE_CARDS = bool(int(os.environ.get('RECIPE_CARDS', 0)))
+
+# Background tasks, see core.queue. Eager mode runs them inline, for
+# the tests and the dev server.
+TASKS_EAGER = bool(int(os.environ.get('TASKS_EAGER', 0)))
+TASK_WORKER_CONCURRENCY = int(os.environ.get('TASK_WORKER_CONCURRENCY', 2))
+TASK_POLL_INTERVAL = float(os.environ.get('TASK_POLL_INTERVAL', 1))
+TASK_MAX_ATTEMPTS = int(os.environ.get('TASK_MAX_ATTEMPTS', 5))
+# First retry delay in seconds, doubled on every attempt
+TASK_RETRY_DELAY = float(os.environ.get('TASK_RETRY_DELAY', 10))
+# Seconds after which a running task of a dead worker is run again
+TASK_TIMEOUT = float(os.environ.get('TASK_TIMEOUT', 600))
+
+# Deleted accounts are purged by user.tasks.purge_user, each task runs
+# PURGE_BATCHES batches of PURGE_BATCH_SIZE rows then queues the next
+PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 500))
+PURGE_BATCHES = int(os.environ.get('PURGE_BATCHES', 20))
+
+# Prometheus metrics served on /metrics behind a bearer token, without
+# one they are only served with DEBUG on
+METRICS_ENABLED = bool(int(os.environ.get('METRICS_ENABLED', 1)))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -83,6 +127,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Size of the thread pool running the ORM work of the async views,
+# 0 runs it on the request thread
+ASYNC_ORM_THREADS = int(os.environ.get('ASYNC_ORM_THREADS', 8))
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -97,6 +145,45 @@ DATABASES = {
     }
 }
 
+# Streaming replicas of the default database, the GET and HEAD requests
+# read from them unless the client wrote recently. Tests mirror them to
+# the default database.
+REPLICA_DATABASES = []
+for _index, _host in enumerate(
+        filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), 1):
+    _alias = f'replica_{_index}'
+    DATABASES[_alias] = dict(
+        DATABASES['default'], HOST=_host, TEST={'MIRROR': 'default'})
+    REPLICA_DATABASES.append(_alias)
+
+# Databases holding the recipes, tags and ingredients of a share of the
+# users, the users and their tokens stay on the default database.
+# DB_SHARD_HOSTS entries are host or host/name.
+SHARD_DATABASES = ['default']
+for _index, _host in enumerate(
+        filter(None, os.environ.get('DB_SHARD_HOSTS', '').split(',')), 1):
+    _host, _, _name = _host.partition('/')
+    _alias = f'shard_{_index}'
+    DATABASES[_alias] = dict(
+        DATABASES['default'], HOST=_host,
+        NAME=_name or DATABASES['default']['NAME'])
+    SHARD_DATABASES.append(_alias)
+# Databases taking the new users. The tests keep their users on the
+# default database unless they pick a shard.
+SHARD_PLACEMENT_DATABASES = ['default'] if TESTING else SHARD_DATABASES
+# Seconds the workers keep the shard of a user
+SHARD_DIRECTORY_TTL = float(os.environ.get('SHARD_DIRECTORY_TTL', 30))
+
+DATABASE_ROUTERS = ['core.routers.ShardRouter', 'core.routers.ReplicaRouter']
+
+# Seconds a client reads from the primary after a write
+READ_YOUR_WRITES_SECONDS = float(
+    os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+# Seconds between the health checks of a replica, and the replication
+# lag over which it stops taking reads
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 2))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -148,9 +235,97 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.ReadRateThrottle',
+        'core.throttling.WriteRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        scope: None if TESTING else os.environ.get(variable, default)
+        for scope, variable, default in [
+            ('read', 'THROTTLE_READ_RATE', '600/min'),
+            ('write', 'THROTTLE_WRITE_RATE', '120/min'),
+            ('upload', 'THROTTLE_UPLOAD_RATE', '30/min'),
+            ('login', 'THROTTLE_LOGIN_RATE', '10/min'),
+            ('login_account', 'THROTTLE_LOGIN_ACCOUNT_RATE', '5/min'),
+        ]
+    },
+    # Proxies in front of the app trusted for X-Forwarded-For, 1 behind
+    # the nginx of proxy/, which appends the client address in both modes
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Where each throttle scope counts its requests, see core.counters.
+# 'database' is exact across the containers but writes to the primary
+# on every request, 'file' counts in THROTTLE_FILE_DIRECTORY, shared by
+# the workers of one container. Reads count in the files, so the safe
+# requests stay off the primary.
+THROTTLE_COUNTERS = {
+    scope: os.environ.get(f'THROTTLE_{scope.upper()}_COUNTERS', default)
+    for scope, default in [
+        ('read', 'file'),
+        ('write', 'database'),
+        ('upload', 'database'),
+        ('login', 'database'),
+        ('login_account', 'database'),
+    ]
 }
+THROTTLE_FILE_DIRECTORY = os.environ.get(
+    'THROTTLE_FILE_DIRECTORY', '/tmp/recipe-api-throttle')
+# The clients that wrote recently are database counters too. Share of
+# the increments deleting the expired counters.
+SHARED_COUNTER_PRUNE_RATE = float(
+    os.environ.get('SHARED_COUNTER_PRUNE_RATE', 0.001))
 
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+SCHEMA_FILE = os.environ.get(
+    'SCHEMA_FILE',
+    os.path.join(STATIC_ROOT, 'schema.json'),
+)
+SCHEMA_CACHE_MAX_AGE = int(os.environ.get('SCHEMA_CACHE_MAX_AGE', 3600))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'line': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'line'},
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('APP_LOG_LEVEL', 'INFO'),
+        },
+        'app': {
+            'handlers': ['console'],
+            'level': os.environ.get('APP_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
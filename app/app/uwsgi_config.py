@@ -0,0 +1,145 @@
+"""
+uwsgi configuration derived from the container limits.
+
+Reads the CPU quota and memory limit from the cgroup (v2 or v1) and
+prints the matching uwsgi ini file. Every value can be overridden with
+an environment variable, e.g. UWSGI_PROCESSES or UWSGI_HARAKIRI.
+UWSGI_LAZY_APPS=1 trades the app preloaded in the master for chain
+reloads.
+
+Usage: python -m app.uwsgi_config > /tmp/uwsgi.ini
+"""
+
+import math
+import os
+import shlex
+import sys
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+SOMAXCONN = '/proc/sys/net/core/somaxconn'
+UNLIMITED = 1 << 60
+MB = 1024 * 1024
+
+
+def _read(path):
+    """Return the stripped content of a file, or None if missing"""
+    try:
+        with open(path) as limit_file:
+            return limit_file.read().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """Return the CPUs this process may be scheduled on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_limit(root=CGROUP_ROOT):
+    """Return the CPU quota of the cgroup rounded up, in CPUs"""
+    cpus = available_cpus()
+    quota = period = None
+    cpu_max = _read(os.path.join(root, 'cpu.max'))
+    if cpu_max:
+        quota, period = cpu_max.split()
+    else:
+        quota = _read(os.path.join(root, 'cpu', 'cpu.cfs_quota_us'))
+        period = _read(os.path.join(root, 'cpu', 'cpu.cfs_period_us'))
+    if quota in (None, 'max', '-1') or not period:
+        return cpus
+    return max(1, min(cpus, math.ceil(int(quota) / int(period))))
+
+
+def memory_limit(root=CGROUP_ROOT):
+    """Return the memory limit of the cgroup, or of the host, in bytes"""
+    limit = _read(os.path.join(root, 'memory.max'))
+    if limit is None:
+        limit = _read(os.path.join(root, 'memory', 'memory.limit_in_bytes'))
+    if limit and limit != 'max' and int(limit) < UNLIMITED:
+        return int(limit)
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def listen_limit():
+    """Return the kernel cap on the listen queue"""
+    value = _read(SOMAXCONN)
+    return int(value) if value else 128
+
+
+def build_options(env=os.environ, cpus=None, memory=None, max_listen=None):
+    """Return the uwsgi options for the given limits"""
+    cpus = cpus or cpu_limit()
+    memory = memory or memory_limit()
+    max_listen = max_listen or listen_limit()
+
+    def setting(name, default):
+        return int(env.get(f'UWSGI_{name}', default))
+
+    worker_mb = setting('WORKER_MEMORY_MB', 150)
+    budget_mb = memory * 0.8 / MB
+    processes = setting('PROCESSES', max(2, cpus * 2))
+    processes = max(1, min(processes, int(budget_mb // worker_mb)))
+    threads = setting('THREADS', 4)
+
+    options = {
+        'module': 'app.wsgi',
+        'socket': env.get('UWSGI_SOCKET', ':9000'),
+        'master': True,
+        'need-app': True,
+        'die-on-term': True,
+        'vacuum': True,
+        'processes': processes,
+        'threads': threads,
+        'enable-threads': True,
+        'thunder-lock': True,
+        'offload-threads': setting('OFFLOAD_THREADS', max(1, cpus // 2)),
+        'listen': min(setting('LISTEN', 1024), max_listen),
+        'harakiri': setting('HARAKIRI', 30),
+        'harakiri-verbose': True,
+        'post-buffering': setting('POST_BUFFERING', 65536),
+        'buffer-size': setting('BUFFER_SIZE', 16384),
+        'max-requests': setting('MAX_REQUESTS', 5000),
+        'max-requests-delta': setting('MAX_REQUESTS_DELTA', 500),
+        'reload-on-rss': setting(
+            'RELOAD_ON_RSS', int(min(worker_mb * 2, budget_mb / processes))),
+        'worker-reload-mercy': setting('RELOAD_MERCY', 60),
+        'master-fifo': env.get('UWSGI_FIFO', '/tmp/uwsgi-fifo'),
+    }
+    reload_file = env.get('UWSGI_RELOAD_FILE', '/tmp/uwsgi-reload')
+    if setting('LAZY_APPS', 0):
+        # Chain reloads restart one worker at a time so the pool never
+        # drains, they need every worker to load and warm the app itself
+        options['lazy-apps'] = True
+        options['touch-chain-reload'] = reload_file
+    else:
+        # The master loads and warms the app once, the workers share it
+        # copy-on-write. A graceful reload lets the in-flight requests
+        # finish, new ones wait in the listen queue meanwhile.
+        options['touch-reload'] = reload_file
+    metrics_dir = env.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        # The master wipes the metric files when it starts, reloads
+        # included, so a new run does not add the previous counters
+        options['exec-asap'] = f'rm -f {shlex.quote(metrics_dir)}/*.db'
+    return options
+
+
+def render_ini(options):
+    """Render the options as an uwsgi ini file"""
+    lines = ['[uwsgi]']
+    for key, value in options.items():
+        if value is True:
+            value = 'true'
+        lines.append(f'{key} = {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    sys.stdout.write(render_ini(build_options()))
+
+
+if __name__ == '__main__':
+    main()
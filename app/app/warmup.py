@@ -0,0 +1,143 @@
+"""
+Warm up the application before it serves requests.
+
+Under uwsgi the app is loaded once in the master, so ``preload`` runs
+before the fork and its work is shared by every worker. ``warm_worker``
+runs in each worker as a postfork hook, before the worker accepts any
+request. With lazy-apps, set for chain reloads, there is no master
+copy to share: both steps run in each worker while it loads.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver, resolve, reverse
+
+logger = logging.getLogger(__name__)
+
+WARM_URLS = [
+    '/api/recipe/recipe/',
+    '/api/recipe/recipe/1/',
+    '/api/recipe/tags/',
+    '/api/recipe/ingredients/',
+    '/api/user/token/',
+    '/api/user/me/',
+    '/api/schema/',
+]
+
+
+def _serializer_classes():
+    """Return the serializers used on the hot paths"""
+    from recipe import serializers as recipe_serializers
+    from user import serializers as user_serializers
+
+    return [
+        recipe_serializers.RecipeSerializer,
+        recipe_serializers.RecipeDetailSerializer,
+        recipe_serializers.RecipeImageSerializer,
+        recipe_serializers.TagSerializer,
+        recipe_serializers.IngredientSerializer,
+        user_serializers.UserSerializer,
+        user_serializers.AuthTokenSerializer,
+    ]
+
+
+def _import_modules():
+    import drf_spectacular.openapi  # noqa: F401
+    import recipe.fastpath  # noqa: F401
+
+
+def _compile_urls():
+    get_resolver().url_patterns
+    for url in WARM_URLS:
+        resolve(url)
+    reverse('recipe:recipe-list')
+
+
+def _build_serializers():
+    from recipe import fastpath
+
+    for serializer_class in _serializer_classes():
+        serializer_class().fields
+    fastpath._price_field()
+
+
+def _load_schema():
+    from core.views import CachedSchemaView
+
+    CachedSchemaView()._get_schema(None, settings.LANGUAGE_CODE)
+
+
+def _connect_databases():
+    """Connect to the databases, only the default one must answer
+
+    The replica routing falls back to the primary when a replica is
+    down, so the other databases must not keep the worker from starting.
+    """
+    connections['default'].ensure_connection()
+    for alias in connections:
+        if alias == 'default':
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as exc:
+            logger.warning('warmup could not connect to %s: %s', alias, exc)
+
+
+PRELOAD_STEPS = [
+    ('import', _import_modules),
+    ('urls', _compile_urls),
+    ('serializers', _build_serializers),
+    ('schema', _load_schema),
+]
+WORKER_STEPS = [
+    ('connect', _connect_databases),
+    ('urls', _compile_urls),
+    ('serializers', _build_serializers),
+]
+
+
+def run_steps(steps):
+    """Run the warmup steps and return their durations in seconds"""
+    durations = {}
+    for name, step in steps:
+        start = time.perf_counter()
+        step()
+        durations[name] = time.perf_counter() - start
+    logger.info(
+        'warmup %s',
+        ' '.join(f'{name}={duration * 1000:.1f}ms'
+                 for name, duration in durations.items()),
+    )
+    return durations
+
+
+def preload():
+    """Warm the shared state once, before the workers are forked"""
+    durations = run_steps(PRELOAD_STEPS)
+    # Connections must never be shared with the forked workers
+    connections.close_all()
+    return durations
+
+
+def warm_worker():
+    """Warm a freshly forked worker before it accepts requests"""
+    return run_steps(WORKER_STEPS)
+
+
+def install():
+    """Hook the warmup into uwsgi, does nothing outside of uwsgi"""
+    try:
+        import uwsgi
+    except ImportError:
+        return
+
+    preload()
+    if 'lazy-apps' in uwsgi.opt or 'lazy' in uwsgi.opt:
+        warm_worker()
+    else:
+        import uwsgidecorators
+
+        uwsgidecorators.postfork(warm_worker)
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+from app import warmup  # noqa: E402
+from core import metrics  # noqa: E402
+
+warmup.install()
+metrics.install()
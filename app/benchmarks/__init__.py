@@ -0,0 +1,5 @@
+"""
+Benchmarks for the recipe API.
+
+Run from the app directory, e.g. ``python -m benchmarks.list_serializers``.
+"""
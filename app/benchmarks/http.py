@@ -0,0 +1,157 @@
+"""
+HTTP load generation helpers shared by the load tests
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+
+def percentile(values, pct):
+    """Return the pct percentile of values, nearest rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def request(method, url, body=None, headers=None):
+    """Send a request and return (status, body)
+
+    body is sent as JSON, unless it is already encoded bytes.
+    """
+    headers = dict(headers or {})
+    data = body
+    if body is not None and not isinstance(body, bytes):
+        data = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+    req = urllib.request.Request(url, data=data, headers=headers,
+                                 method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as res:
+            return res.status, res.read()
+    except urllib.error.HTTPError as exc:
+        return exc.code, exc.read()
+
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, content) files
+
+    Returns the body and its Content-Type header.
+    """
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; '
+            f'name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, content in files:
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; '
+            f'name="{name}"; filename="{filename}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'.encode()
+            + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def create_token(base_url):
+    """Create a throwaway user and return its auth headers"""
+    email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+    password = 'loadtest-pass-123'
+    request('POST', f'{base_url}/api/user/create/', {
+        'email': email, 'password': password, 'name': 'Load test',
+    })
+    status, body = request('POST', f'{base_url}/api/user/token/', {
+        'email': email, 'password': password,
+    })
+    if status != 200:
+        raise RuntimeError(f'Could not get a token: {status} {body!r}')
+    return {'Authorization': f'Token {json.loads(body)["token"]}'}
+
+
+def run_load(send, concurrency, duration):
+    """Call send() from concurrency threads for duration seconds
+
+    send returns the response status. Returns the latencies in seconds,
+    the error count and the elapsed time.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = send()
+            except OSError:
+                status = None
+            local.append(time.perf_counter() - start)
+            if status is None or status >= 400:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - start
+
+
+def summarize(latencies, errors, elapsed):
+    """Return throughput and latency percentiles of a load run"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def start_server(argv, base_url, timeout=60):
+    """Start a server process and wait until it answers"""
+    process = subprocess.Popen(
+        argv, env=os.environ.copy(), stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited: {" ".join(argv)}')
+        try:
+            request('GET', f'{base_url}/api/schema/')
+            return process
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f'Server did not start: {" ".join(argv)}')
+
+
+def stop_server(process):
+    """Stop a server started with start_server"""
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def python_command(*args):
+    """Return the command running the current interpreter"""
+    return [sys.executable, *args]
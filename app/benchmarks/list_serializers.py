@@ -0,0 +1,104 @@
+"""
+Compare the recipe list fast path with the DRF serializers.
+
+Usage: python -m benchmarks.list_serializers [--rows 1000 10000]
+"""
+
+import argparse
+from decimal import Decimal
+
+from benchmarks import utils
+
+
+def create_data(user, rows):
+    """Create rows recipes with a few tags and ingredients each"""
+    from core.models import Recipe, Tag, Ingredient
+
+    Tag.objects.bulk_create(
+        Tag(user=user, name=f'Tag {i}') for i in range(20))
+    Ingredient.objects.bulk_create(
+        Ingredient(user=user, name=f'Ingredient {i}') for i in range(50))
+    Recipe.objects.bulk_create(
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=i % 120,
+            price=Decimal(i % 9999) / 100,
+            link=f'https://example.com/recipe/{i}',
+        )
+        for i in range(rows)
+    )
+    # Not every backend returns primary keys from bulk_create
+    tags = list(Tag.objects.filter(user=user).order_by('id'))
+    ingredients = list(Ingredient.objects.filter(user=user).order_by('id'))
+    recipes = list(Recipe.objects.filter(user=user).order_by('id'))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag.pk)
+        for i, recipe in enumerate(recipes)
+        for tag in tags[i % 17:i % 17 + 3]
+    )
+    Recipe.ingredients.through.objects.bulk_create(
+        Recipe.ingredients.through(
+            recipe_id=recipe.pk, ingredient_id=ingredient.pk)
+        for i, recipe in enumerate(recipes)
+        for ingredient in ingredients[i % 45:i % 45 + 5]
+    )
+
+
+def run(rows, repeat):
+    """Time each list strategy for rows recipes"""
+    from django.contrib.auth import get_user_model
+
+    from core.models import Recipe
+    from recipe import fastpath
+    from recipe.serializers import RecipeSerializer
+
+    with utils.rollback():
+        user = get_user_model().objects.create_user(
+            email=f'bench-{rows}@example.com', password='benchpass')
+        create_data(user, rows)
+        queryset = Recipe.objects.filter(user=user).order_by('-id')
+
+        serializer = utils.best_of(
+            lambda: RecipeSerializer(queryset.all(), many=True).data,
+            repeat,
+        )
+        prefetched = utils.best_of(
+            lambda: RecipeSerializer(
+                queryset.prefetch_related('tags', 'ingredients'),
+                many=True,
+            ).data,
+            repeat,
+        )
+        fast = utils.best_of(
+            lambda: fastpath.serialize_recipes(queryset.all()),
+            repeat,
+        )
+    return serializer, prefetched, fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    utils.setup()
+    results = []
+    for rows in args.rows:
+        serializer, prefetched, fast = run(rows, args.repeat)
+        results.append([
+            rows,
+            f'{serializer * 1000:.1f}',
+            f'{prefetched * 1000:.1f}',
+            f'{fast * 1000:.1f}',
+            f'{prefetched / fast:.1f}x',
+        ])
+    utils.print_table(
+        ['rows', 'serializer ms', 'prefetch ms', 'fastpath ms', 'speedup'],
+        results,
+    )
+
+
+if __name__ == '__main__':
+    main()
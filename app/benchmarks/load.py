@@ -0,0 +1,324 @@
+"""
+Load test the API endpoints against a locally started server.
+
+Each scenario runs at fixed concurrency for a fixed duration, after a
+short warmup, and reports the throughput and latency percentiles. The
+results can be saved as JSON and are compared against a baseline, the
+exit status is 1 when a scenario regressed.
+
+The numbers depend on the machine, so no baseline ships with the tree.
+The first run without one, on the machine doing the comparisons and
+with the default settings, stores its results as the baseline. Later
+runs compare against it, --save replaces it after an accepted change.
+
+Usage: python -m benchmarks.load [--server uwsgi|uvicorn | --url URL]
+           [--scenario recipe_list ...] [--output results.json]
+           [--baseline baseline.json --tolerance 0.15] [--save]
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from app import uwsgi_config
+from benchmarks import http, utils
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(
+    APP_DIR, 'benchmarks', 'history', 'load_baseline.json')
+TAG_NAMES = [f'Tag {i}' for i in range(20)]
+INGREDIENT_NAMES = [f'Ingredient {i}' for i in range(40)]
+# The server must not throttle the load generator
+SERVER_ENV = {
+    'THROTTLE_READ_RATE': '1000000/s',
+    'THROTTLE_WRITE_RATE': '1000000/s',
+    'THROTTLE_UPLOAD_RATE': '1000000/s',
+    'THROTTLE_LOGIN_RATE': '1000000/s',
+    'THROTTLE_LOGIN_ACCOUNT_RATE': '1000000/s',
+    'REQUEST_TIMING_SAMPLE_RATE': '0',
+}
+
+
+def recipe_payload(rng, index):
+    """Return a recipe with nested tags and ingredients"""
+    return {
+        'title': f'Load test recipe {index}',
+        'time_minutes': rng.randint(5, 120),
+        'price': f'{rng.randint(100, 5000) / 100:.2f}',
+        'link': f'https://example.com/recipe/{index}',
+        'tags': [
+            {'name': name} for name in rng.sample(TAG_NAMES, rng.randint(1, 4))
+        ],
+        'ingredients': [
+            {'name': name}
+            for name in rng.sample(INGREDIENT_NAMES, rng.randint(2, 10))
+        ],
+    }
+
+
+def jpeg_image(size=(400, 300)):
+    """Return the bytes of a JPEG image"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class Fixtures:
+    """A user with recipes, created through the API"""
+
+    def __init__(self, base_url, rng, recipes):
+        self.base_url = base_url
+        self.email = f'load-{uuid.uuid4().hex[:12]}@example.com'
+        self.password = 'loadtest-pass-123'
+        self.call('POST', '/api/user/create/', {
+            'email': self.email, 'password': self.password,
+            'name': 'Load test',
+        })
+        token = json.loads(self.call('POST', '/api/user/token/', {
+            'email': self.email, 'password': self.password,
+        }))['token']
+        self.headers = {'Authorization': f'Token {token}'}
+
+        created = [
+            json.loads(self.call(
+                'POST', '/api/recipe/recipe/', recipe_payload(rng, i),
+                self.headers))
+            for i in range(recipes)
+        ]
+        self.recipe_ids = [recipe['id'] for recipe in created]
+        self.tag_ids = sorted({
+            tag['id'] for recipe in created for tag in recipe['tags']})
+        self.ingredient_ids = sorted({
+            item['id'] for recipe in created
+            for item in recipe['ingredients']
+        })
+
+    def call(self, method, path, body=None, headers=None):
+        status, content = http.request(
+            method, self.base_url + path, body, headers)
+        if status >= 400:
+            raise RuntimeError(f'{method} {path} failed: {status} {content}')
+        return content
+
+
+def scenarios(fixtures, rng):
+    """Return the scenarios as (name, send) pairs
+
+    The inputs of every scenario are drawn up front from the seeded
+    generator, send cycles through them.
+    """
+    base_url = fixtures.base_url
+    headers = fixtures.headers
+
+    def sender(method, requests):
+        cycle = itertools.cycle(requests)
+
+        def send():
+            url, body, extra = next(cycle)
+            return http.request(
+                method, base_url + url, body, {**headers, **extra})[0]
+        return send
+
+    def filters():
+        tags = rng.sample(fixtures.tag_ids, min(2, len(fixtures.tag_ids)))
+        ingredients = rng.sample(
+            fixtures.ingredient_ids, min(2, len(fixtures.ingredient_ids)))
+        return (
+            f'/api/recipe/recipe/?tags={",".join(map(str, tags))}'
+            f'&ingredients={",".join(map(str, ingredients))}'
+        )
+
+    image = jpeg_image()
+    uploads = []
+    for recipe_id in rng.sample(
+            fixtures.recipe_ids, min(20, len(fixtures.recipe_ids))):
+        body, content_type = http.multipart(
+            {}, [('image', 'load.jpg', image)])
+        uploads.append((
+            f'/api/recipe/recipe/{recipe_id}/upload_image/',
+            body, {'Content-Type': content_type},
+        ))
+    login = {'email': fixtures.email, 'password': fixtures.password}
+
+    return [
+        ('recipe_list', sender(
+            'GET', [('/api/recipe/recipe/', None, {})])),
+        ('recipe_list_filtered', sender(
+            'GET', [(filters(), None, {}) for _ in range(50)])),
+        ('recipe_detail', sender('GET', [
+            (f'/api/recipe/recipe/{recipe_id}/', None, {})
+            for recipe_id in fixtures.recipe_ids
+        ])),
+        ('recipe_create', sender('POST', [
+            ('/api/recipe/recipe/', recipe_payload(rng, i), {})
+            for i in range(100)
+        ])),
+        ('upload_image', sender('POST', uploads)),
+        ('tag_list_assigned', sender(
+            'GET', [('/api/recipe/tags/?assigned_only=1', None, {})])),
+        ('token_login', lambda: http.request(
+            'POST', f'{base_url}/api/user/token/', login)[0]),
+    ]
+
+
+def server_command(server, port, tmp_dir):
+    """Return the command line starting the server on port"""
+    if server == 'uvicorn':
+        return http.python_command(
+            '-m', 'uvicorn', 'app.asgi:application',
+            '--port', str(port), '--workers', str(uwsgi_config.cpu_limit()),
+            '--no-access-log',
+        )
+    options = uwsgi_config.build_options()
+    del options['socket']
+    options['http-socket'] = f':{port}'
+    options['touch-chain-reload'] = os.path.join(tmp_dir, 'reload')
+    options['master-fifo'] = os.path.join(tmp_dir, 'fifo')
+    options['disable-logging'] = True
+    ini = os.path.join(tmp_dir, 'uwsgi.ini')
+    with open(ini, 'w') as ini_file:
+        ini_file.write(uwsgi_config.render_ini(options))
+    return ['uwsgi', '--ini', ini]
+
+
+def compare(results, baseline, tolerance):
+    """Return the regressions of results against the baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} ms')
+        if current['rps'] < previous['rps'] * (1 - tolerance):
+            regressions.append(
+                f'{name}: throughput {previous["rps"]} -> '
+                f'{current["rps"]} req/s')
+        if current['errors'] and not previous['errors']:
+            regressions.append(f'{name}: {current["errors"]} errors')
+    return regressions
+
+
+def save(path, report):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+        output_file.write('\n')
+
+
+def run(base_url, args):
+    """Run the selected scenarios and return their summaries"""
+    rng = random.Random(args.seed)
+    fixtures = Fixtures(base_url, rng, args.recipes)
+    results = {}
+    for name, send in scenarios(fixtures, rng):
+        if args.scenario and name not in args.scenario:
+            continue
+        http.run_load(send, args.concurrency, args.warmup)
+        results[name] = http.summarize(*http.run_load(
+            send, args.concurrency, args.duration))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument(
+        '--server', choices=['uwsgi', 'uvicorn'], default='uwsgi')
+    parser.add_argument('--url', help='Load test a running server instead')
+    parser.add_argument('--port', type=int, default=8150)
+    parser.add_argument('--scenario', nargs='+')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--recipes', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument(
+        '--baseline', default=DEFAULT_BASELINE,
+        help='JSON results to compare with, stored by the first run')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument(
+        '--save', action='store_true',
+        help='Store the results as the baseline instead of comparing')
+    args = parser.parse_args()
+
+    if args.url:
+        results = run(args.url.rstrip('/'), args)
+    else:
+        os.environ.update(SERVER_ENV)
+        base_url = f'http://127.0.0.1:{args.port}'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            server = http.start_server(
+                server_command(args.server, args.port, tmp_dir), base_url)
+            try:
+                results = run(base_url, args)
+            finally:
+                http.stop_server(server)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'commit': utils.git_commit(),
+            'server': args.url or args.server,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'cpus': uwsgi_config.cpu_limit(),
+        },
+        'scenarios': results,
+    }
+    baseline = {}
+    if args.save or not os.path.exists(args.baseline):
+        if not args.save:
+            print(
+                f'No baseline at {args.baseline}, storing these results as '
+                f'the baseline', file=sys.stderr)
+        save(args.baseline, report)
+    else:
+        with open(args.baseline) as baseline_file:
+            stored = json.load(baseline_file)
+        baseline = stored['scenarios']
+        for key in ['server', 'concurrency', 'duration', 'cpus']:
+            if stored['meta'].get(key) != report['meta'][key]:
+                print(
+                    f'The baseline was run with {key}='
+                    f'{stored["meta"].get(key)}, not {report["meta"][key]}',
+                    file=sys.stderr)
+    rows = []
+    for name, summary in results.items():
+        previous = baseline.get(name)
+        change = ''
+        if previous and previous['p95_ms']:
+            change = f'{summary["p95_ms"] / previous["p95_ms"] - 1:+.0%}'
+        rows.append([name] + list(summary.values()) + [change])
+    utils.print_table(
+        ['scenario', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+         'p99 ms', 'p95 vs base'],
+        rows,
+    )
+
+    if args.output:
+        save(args.output, report)
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+In-process microbenchmarks of the recipe serializers and views.
+
+Reports the CPU time per call and the peak memory allocated by one
+call. Each run is appended to a JSON lines history together with the
+commit and a hash of the benchmarked modules, and compared with the
+last run made on different sources of those modules.
+
+Usage: python -m benchmarks.micro [--bench serializer_many ...]
+           [--history benchmarks/history/micro.jsonl]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import time
+import timeit
+import tracemalloc
+
+from benchmarks import utils
+from benchmarks.list_serializers import create_data
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = ['recipe/serializers.py', 'recipe/views.py', 'recipe/filters.py']
+DEFAULT_HISTORY = os.path.join(APP_DIR, 'benchmarks', 'history', 'micro.jsonl')
+QUERY_FILTERS = {
+    'none': {},
+    'tags': {'tags': '1,2,3'},
+    'ingredients': {'ingredients': '4,5,6,7'},
+    'tags_ingredients': {'tags': '1,2,3', 'ingredients': '4,5,6,7'},
+}
+
+
+def sources_hash():
+    """Return a short hash of the benchmarked modules"""
+    digest = hashlib.sha1()
+    for path in SOURCES:
+        with open(os.path.join(APP_DIR, path), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:12]
+
+
+def measure(func, repeat):
+    """Return the best CPU seconds per call and the peak bytes of a call"""
+    timer = timeit.Timer(func, timer=time.process_time)
+    number, _ = timer.autorange()
+    cpu = min(timer.repeat(repeat, number)) / number
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return cpu, peak
+
+
+def recipe_view(user, params):
+    """Return a RecipeViewSet set up for a list request"""
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from recipe.views import RecipeViewSet
+
+    request = APIRequestFactory().get('/api/recipe/recipe/', params)
+    view = RecipeViewSet(action='list', format_kwarg=None)
+    view.request = Request(request)
+    view.request.user = user
+    return view
+
+
+def nested_payload(tags, ingredients):
+    return {
+        'title': 'Benchmark recipe',
+        'time_minutes': 25,
+        'price': '12.50',
+        'link': 'https://example.com/recipe',
+        'description': 'A recipe with nested tags and ingredients',
+        'tags': [{'name': f'Tag {i}'} for i in range(tags)],
+        'ingredients': [
+            {'name': f'Ingredient {i}'} for i in range(ingredients)],
+    }
+
+
+def benchmarks(user, sizes):
+    """Return the benchmarks as (name, func) pairs"""
+    from core.models import Recipe
+    from recipe.filters import RecipeFilterSerializer
+    from recipe.serializers import RecipeDetailSerializer, RecipeSerializer
+
+    queryset = Recipe.objects.filter(user=user).order_by('-id')
+    for size in sizes:
+        # Loaded once, so only the serializer work is measured
+        recipes = list(
+            queryset.prefetch_related('tags', 'ingredients')[:size])
+        yield (
+            f'serializer_many[{size}]',
+            lambda recipes=recipes: RecipeSerializer(recipes, many=True).data,
+        )
+
+    for tags, ingredients in [(2, 5), (10, 30)]:
+        payload = nested_payload(tags, ingredients)
+        yield (
+            f'detail_validation[{tags}x{ingredients}]',
+            lambda payload=payload: RecipeDetailSerializer(
+                data=payload).is_valid(raise_exception=True),
+        )
+
+    for name, params in QUERY_FILTERS.items():
+        view = recipe_view(user, params)
+        yield (
+            f'get_queryset[{name}]',
+            lambda view=view: str(view.get_queryset().query),
+        )
+
+    for count in [3, 100]:
+        params = {
+            'tags': ','.join(str(i) for i in range(1, count + 1)),
+            'price_max': '20.00',
+            'ordering': 'price',
+        }
+        yield (
+            f'filter_validation[{count}]',
+            lambda params=params: RecipeFilterSerializer(
+                data=params).is_valid(raise_exception=True),
+        )
+
+
+def previous_run(history, source_hash):
+    """Return the last recorded run made on other sources, if any"""
+    if not os.path.exists(history):
+        return None
+    previous = None
+    with open(history) as history_file:
+        for line in history_file:
+            run = json.loads(line)
+            if run['sources'] != source_hash:
+                previous = run
+    return previous
+
+
+def change(current, previous):
+    if not previous:
+        return ''
+    return f'{current / previous - 1:+.0%}'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--bench', nargs='+', help='Name prefixes to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.contrib.auth import get_user_model
+
+    results = {}
+    with utils.rollback():
+        user = get_user_model().objects.create_user(
+            email='micro-bench@example.com', password='benchpass')
+        create_data(user, max(args.sizes))
+        for name, func in benchmarks(user, args.sizes):
+            if args.bench and not name.startswith(tuple(args.bench)):
+                continue
+            cpu, peak = measure(func, args.repeat)
+            results[name] = {
+                'cpu_us': round(cpu * 1e6, 2),
+                'peak_kib': round(peak / 1024, 1),
+            }
+
+    source_hash = sources_hash()
+    previous = previous_run(args.history, source_hash)
+    before = previous['results'] if previous else {}
+    rows = []
+    for name, result in results.items():
+        old = before.get(name, {})
+        rows.append([
+            name,
+            result['cpu_us'],
+            change(result['cpu_us'], old.get('cpu_us')),
+            result['peak_kib'],
+            change(result['peak_kib'], old.get('peak_kib')),
+        ])
+    utils.print_table(['benchmark', 'cpu us', 'cpu', 'peak KiB', 'mem'], rows)
+    if previous:
+        print(f'Compared with {previous["commit"]} ({previous["time"]})')
+
+    if not args.no_save:
+        os.makedirs(os.path.dirname(args.history), exist_ok=True)
+        with open(args.history, 'a') as history_file:
+            history_file.write(json.dumps({
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'commit': utils.git_commit(),
+                'sources': source_hash,
+                'python': platform.python_version(),
+                'results': results,
+            }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure the per-request middleware overhead on API paths, with and
+without the request timings sampled.
+
+Usage: python -m benchmarks.middleware [--requests 5000]
+"""
+
+import argparse
+import time
+
+from benchmarks import utils
+
+FULL_STACK = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+PATHS = ['/api/recipe/recipe/', '/api/schema/']
+
+
+def make_handler(middleware):
+    """Return a WSGI handler built with the given middleware"""
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import override_settings
+
+    with override_settings(MIDDLEWARE=middleware):
+        return WSGIHandler()
+
+
+def per_request(handler, path, requests):
+    """Return the mean time of a request through handler, in seconds"""
+    from django.test import RequestFactory
+
+    factory = RequestFactory()
+
+    def start_response(status, headers):
+        pass
+
+    handler(factory.get(path).environ, start_response)
+    start = time.perf_counter()
+    for _ in range(requests):
+        handler(factory.get(path).environ, start_response)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    utils.setup()
+    from django.conf import settings
+    from django.test import override_settings
+
+    lean = make_handler(settings.MIDDLEWARE)
+    handlers = [
+        ('full stack', make_handler(FULL_STACK), 0),
+        ('lean', lean, 0),
+        ('lean, timed', lean, 1),
+    ]
+    results = []
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        for path in PATHS:
+            for name, handler, rate in handlers:
+                with override_settings(REQUEST_TIMING_SAMPLE_RATE=rate):
+                    duration = per_request(handler, path, args.requests)
+                results.append([path, name, f'{duration * 1e6:.1f}'])
+    utils.print_table(['path', 'middleware', 'us/request'], results)
+
+
+if __name__ == '__main__':
+    main()
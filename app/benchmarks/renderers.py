@@ -0,0 +1,67 @@
+"""
+Compare encode time and payload size of the API renderers.
+
+Usage: python -m benchmarks.renderers [--rows 100 1000 10000]
+"""
+
+import argparse
+
+from benchmarks import utils
+
+
+def recipe_list(rows):
+    """Return a recipe list shaped like the list endpoint output"""
+    return [
+        {
+            'id': i,
+            'title': f'Recipe {i}',
+            'time_minutes': i % 120,
+            'price': f'{i % 9999 / 100:.2f}',
+            'link': f'https://example.com/recipe/{i}',
+            'tags': [
+                {'id': t, 'name': f'Tag {t}'}
+                for t in range(i % 17, i % 17 + 3)
+            ],
+            'ingredients': [
+                {'id': n, 'name': f'Ingredient {n}'}
+                for n in range(i % 45, i % 45 + 5)
+            ],
+        }
+        for i in range(rows)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    utils.setup()
+    from rest_framework.renderers import JSONRenderer
+
+    from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+    renderers = [
+        ('json', JSONRenderer()),
+        ('orjson', ORJSONRenderer()),
+        ('msgpack', MessagePackRenderer()),
+    ]
+    results = []
+    for rows in args.rows:
+        data = recipe_list(rows)
+        for name, renderer in renderers:
+            duration = utils.best_of(
+                lambda: renderer.render(data), args.repeat)
+            results.append([
+                rows,
+                name,
+                f'{duration * 1000:.2f}',
+                len(renderer.render(data)),
+            ])
+    utils.print_table(['rows', 'renderer', 'encode ms', 'bytes'], results)
+
+
+if __name__ == '__main__':
+    main()
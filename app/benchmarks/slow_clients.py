@@ -0,0 +1,135 @@
+"""
+Compare uwsgi and the ASGI server under slow-client load.
+
+Slow clients trickle image uploads byte by byte while fast clients
+read the recipe list. Under uwsgi every slow upload holds a worker
+thread; under ASGI it only holds a coroutine.
+
+Usage: python -m benchmarks.slow_clients [--slow 64 --duration 20]
+"""
+
+import argparse
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+from app import uwsgi_config
+from benchmarks import http, utils
+
+
+def uwsgi_command(port, tmp_dir):
+    """Return the uwsgi command line with the generated config"""
+    options = uwsgi_config.build_options()
+    del options['socket']
+    options['http-socket'] = f':{port}'
+    options['touch-chain-reload'] = os.path.join(tmp_dir, 'reload')
+    options['master-fifo'] = os.path.join(tmp_dir, 'fifo')
+    ini = os.path.join(tmp_dir, 'uwsgi.ini')
+    with open(ini, 'w') as ini_file:
+        ini_file.write(uwsgi_config.render_ini(options))
+    return ['uwsgi', '--ini', ini], options['processes']
+
+
+def slow_upload(port, path, headers, stop, body_size=4096, delay=0.2):
+    """Trickle a multipart upload until stop is set"""
+    try:
+        sock = socket.create_connection(('127.0.0.1', port), timeout=60)
+    except OSError:
+        return
+    head = [
+        f'POST {path} HTTP/1.1',
+        f'Host: 127.0.0.1:{port}',
+        'Content-Type: multipart/form-data; boundary=slow',
+        f'Content-Length: {body_size}',
+    ] + [f'{key}: {value}' for key, value in headers.items()]
+    try:
+        sock.sendall(('\r\n'.join(head) + '\r\n\r\n').encode())
+        sent = 0
+        while not stop.is_set() and sent < body_size - 1:
+            sock.sendall(b'x')
+            sent += 1
+            time.sleep(delay)
+    except OSError:
+        pass
+    finally:
+        sock.close()
+
+
+def measure(name, argv, port, args):
+    """Run the slow and fast clients against one server"""
+    base_url = f'http://127.0.0.1:{port}'
+    server = http.start_server(argv, base_url)
+    try:
+        headers = http.create_token(base_url)
+        _, body = http.request(
+            'POST', f'{base_url}/api/recipe/recipe/',
+            {'title': 'Slow', 'time_minutes': 5, 'price': '1.00'},
+            headers=headers,
+        )
+        recipe_id = json.loads(body)['id']
+        upload_path = (
+            f'/api/recipe/recipe/{recipe_id}/upload_image/'
+            if name == 'uwsgi' else
+            f'/api/recipe/recipe/{recipe_id}/upload_image_async/'
+        )
+
+        stop = threading.Event()
+        slow = [
+            threading.Thread(
+                target=slow_upload,
+                args=(port, upload_path, headers, stop),
+            )
+            for _ in range(args.slow)
+        ]
+        for thread in slow:
+            thread.start()
+        time.sleep(1)
+        url = f'{base_url}/api/recipe/recipe/'
+        summary = http.summarize(*http.run_load(
+            lambda: http.request('GET', url, headers=headers)[0],
+            args.concurrency,
+            args.duration,
+        ))
+        stop.set()
+        for thread in slow:
+            thread.join()
+    finally:
+        http.stop_server(server)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8133)
+    parser.add_argument('--slow', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        argv, processes = uwsgi_command(args.port, tmp_dir)
+        servers = [
+            ('uwsgi', argv, args.port),
+            ('uvicorn', http.python_command(
+                '-m', 'uvicorn', 'app.asgi:application',
+                '--port', str(args.port + 1),
+                '--workers', str(processes),
+                '--no-access-log',
+            ), args.port + 1),
+        ]
+        for name, argv, port in servers:
+            summary = measure(name, argv, port, args)
+            results.append([name, args.slow] + list(summary.values()))
+    utils.print_table(
+        ['server', 'slow clients', 'requests', 'errors', 'req/s',
+         'p50 ms', 'p95 ms', 'p99 ms'],
+        results,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Profile the application startup.
+
+Reports the import time of django.setup() per top level package, the
+duration of each warmup step and the latency of the first requests
+served by a cold and by a warmed up process.
+
+Usage: python -m benchmarks.startup [--top 15]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from benchmarks import utils
+
+SETUP = (
+    "import os; "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings'); "
+    "import django; django.setup()"
+)
+FIRST_REQUESTS = """
+import json, time
+from benchmarks import utils
+utils.setup()
+from django.test import Client, override_settings
+from app import warmup
+durations = {}
+if WARM:
+    durations.update(warmup.preload())
+    durations.update(
+        {f'worker {k}': v for k, v in warmup.warm_worker().items()})
+client = Client()
+latencies = []
+with override_settings(ALLOWED_HOSTS=['testserver']):
+    for path in ['/api/recipe/recipe/', '/api/recipe/tags/', '/api/schema/']:
+        start = time.perf_counter()
+        client.get(path)
+        latencies.append([path, time.perf_counter() - start])
+print(json.dumps({'steps': durations, 'latencies': latencies}))
+"""
+
+
+def import_times():
+    """Return the self import time of django.setup() per package, in us"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SETUP],
+        capture_output=True, text=True, check=True,
+    )
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        packages[name.strip().split('.')[0]] += int(self_us)
+    return packages
+
+
+def first_requests(warm):
+    """Return warmup durations and first request latencies of a process"""
+    result = subprocess.run(
+        [sys.executable, '-c', f'WARM = {warm}\n' + FIRST_REQUESTS],
+        capture_output=True, text=True, check=True, env=os.environ.copy(),
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    packages = import_times()
+    total = sum(packages.values())
+    rows = sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+    print(f'django.setup() imports: {total / 1000:.1f} ms')
+    utils.print_table(
+        ['package', 'self ms', 'share'],
+        [[name, f'{us / 1000:.1f}', f'{us / total:.0%}']
+         for name, us in rows],
+    )
+
+    cold = first_requests(warm=False)
+    warm = first_requests(warm=True)
+    print()
+    utils.print_table(
+        ['warmup step', 'ms'],
+        [[name, f'{duration * 1000:.1f}']
+         for name, duration in warm['steps'].items()],
+    )
+    print()
+    utils.print_table(
+        ['first request', 'cold ms', 'warm ms'],
+        [[path, f'{cold_s * 1000:.1f}', f'{warm_s * 1000:.1f}']
+         for (path, cold_s), (_, warm_s)
+         in zip(cold['latencies'], warm['latencies'])],
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Helpers shared by the benchmarks
+"""
+
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+
+
+def setup():
+    """Configure Django for a standalone benchmark run"""
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    django.setup()
+
+
+@contextmanager
+def rollback():
+    """Run the block in a transaction that is always rolled back"""
+    from django.db import transaction
+
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+def best_of(func, repeat=5):
+    """Return the fastest wall time of func over repeat runs, in seconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def print_table(headers, rows):
+    """Print rows as a plain aligned table"""
+    widths = [
+        max(len(str(value)) for value in column)
+        for column in zip(headers, *rows)
+    ]
+    for line in [headers] + list(rows):
+        print('  '.join(
+            str(value).rjust(width) for value, width in zip(line, widths)
+        ))
+
+
+def git_commit():
+    """Return the short hash of the checked out commit, or None"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -0,0 +1,72 @@
+"""
+Load test the legacy uwsgi flags against the generated configuration.
+
+Starts uwsgi on a local HTTP socket with each configuration and drives
+the recipe list endpoint at fixed concurrency.
+
+Usage: python -m benchmarks.uwsgi_load [--concurrency 32 --duration 20]
+"""
+
+import argparse
+import os
+import tempfile
+
+from app import uwsgi_config
+from benchmarks import http, utils
+
+LEGACY = [
+    '--workers', '4', '--master', '--enable-threads',
+    '--module', 'app.wsgi',
+]
+
+
+def configurations(port, tmp_dir):
+    """Return the uwsgi command lines to compare, with their port"""
+    options = uwsgi_config.build_options(env=dict(
+        os.environ,
+        UWSGI_RELOAD_FILE=os.path.join(tmp_dir, 'reload'),
+        UWSGI_FIFO=os.path.join(tmp_dir, 'fifo'),
+    ))
+    del options['socket']
+    options['http-socket'] = f':{port + 1}'
+    ini = os.path.join(tmp_dir, 'uwsgi.ini')
+    with open(ini, 'w') as ini_file:
+        ini_file.write(uwsgi_config.render_ini(options))
+    return [
+        ('legacy', port, ['uwsgi', '--http-socket', f':{port}'] + LEGACY),
+        ('generated', port + 1, ['uwsgi', '--ini', ini]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8123)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=20)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, port, argv in configurations(args.port, tmp_dir):
+            base_url = f'http://127.0.0.1:{port}'
+            server = http.start_server(argv, base_url)
+            try:
+                headers = http.create_token(base_url)
+                url = f'{base_url}/api/recipe/recipe/'
+                summary = http.summarize(*http.run_load(
+                    lambda: http.request('GET', url, headers=headers)[0],
+                    args.concurrency,
+                    args.duration,
+                ))
+            finally:
+                http.stop_server(server)
+            results.append([name] + list(summary.values()))
+    utils.print_table(
+        ['config', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms',
+         'p99 ms'],
+        results,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,25 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def reserve_shard_ids(sender, using, **kwargs):
+    """Move the id sequences of a migrated shard to its range"""
+    from django.conf import settings
+
+    from core import sharding
+
+    if using in settings.SHARD_DATABASES:
+        sharding.reserve_id_range(using)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core import signals  # noqa: F401
+        from core.instrumentation import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
+        post_migrate.connect(reserve_shard_ids, sender=self)
@@ -0,0 +1,80 @@
+"""
+ASGI handler streaming async iterators
+
+Django 3.2 iterates a streaming response synchronously, on the event
+loop, so blocking work between two chunks stalls every request of the
+worker. AsyncStreamingHttpResponse wraps an async iterator, which the
+handler below awaits chunk by chunk instead.
+"""
+
+import django
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers.asgi import ASGIHandler as BaseASGIHandler
+from django.http import StreamingHttpResponse
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """Streaming response over an async iterator
+
+    The async iterator must not be an async generator: sync servers and
+    the test client iterate it from a new event loop for each chunk.
+    """
+
+    def __init__(self, async_content, *args, **kwargs):
+        self.async_content = async_content
+        super().__init__(self._iterate_sync(), *args, **kwargs)
+
+    def _iterate_sync(self):
+        iterator = self.async_content.__aiter__()
+        while True:
+            try:
+                yield async_to_sync(iterator.__anext__)()
+            except StopAsyncIteration:
+                return
+
+
+class ASGIHandler(BaseASGIHandler):
+    """Django ASGI handler awaiting AsyncStreamingHttpResponse"""
+
+    @staticmethod
+    def response_headers(response):
+        """Return the headers of a response as ASGI header pairs"""
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append((
+                b'Set-Cookie',
+                cookie.output(header='').encode('ascii').strip(),
+            ))
+        return headers
+
+    async def send_response(self, response, send):
+        if not isinstance(response, AsyncStreamingHttpResponse):
+            return await super().send_response(response, send)
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': self.response_headers(response),
+        })
+        try:
+            async for part in response.async_content:
+                for chunk, _ in self.chunk_bytes(response.make_bytes(part)):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    """Return the project ASGI application, like Django's own"""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
@@ -0,0 +1,46 @@
+"""
+Authentication classes for the API
+"""
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+
+from core import metrics, routers, sharding
+
+
+class CountedTokenAuthentication(TokenAuthentication):
+    """Token authentication counting the lookups by result
+
+    Activates the shard of the user for the rest of the request.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            sharding.activate(
+                result[0], write=request.method not in SAFE_METHODS)
+        return result
+
+    def authenticate_credentials(self, key):
+        try:
+            result = self.lookup(key)
+        except AuthenticationFailed:
+            metrics.TOKEN_AUTH.labels('failed').inc()
+            raise
+        metrics.TOKEN_AUTH.labels('success').inc()
+        return result
+
+    def lookup(self, key):
+        """Authenticate, on the primary if a replica lacks the token
+
+        A token created by the previous request may not have reached the
+        replica yet.
+        """
+        try:
+            return super().authenticate_credentials(key)
+        except AuthenticationFailed:
+            if not routers.reading_replicas():
+                raise
+        with routers.use_replicas(False):
+            return super().authenticate_credentials(key)
@@ -0,0 +1,175 @@
+"""
+Expiring counters shared by the worker processes
+
+Both stores start a counter over on the first increment after its
+expiry, and a small share of the increments deletes the expired ones.
+
+DatabaseCounters keeps them in the SharedCounter table of the default
+database. An increment is a single INSERT ... ON CONFLICT DO UPDATE, so
+the count is exact across every container, at the cost of a write on
+the primary.
+
+FileCounters keeps each counter in a small file of a local directory,
+updated under an exclusive flock, so the count is exact across the
+worker processes of one container and the database is never touched.
+"""
+
+import fcntl
+import hashlib
+import os
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from core.models import SharedCounter
+
+INCR_SQL = """
+    INSERT INTO {table} AS counter (key, count, expires)
+    VALUES (%(key)s, 1, %(expires)s)
+    ON CONFLICT (key) DO UPDATE SET
+        count = CASE WHEN counter.expires > %(now)s
+            THEN counter.count + 1 ELSE 1 END,
+        expires = CASE WHEN counter.expires > %(now)s
+            THEN GREATEST(counter.expires, EXCLUDED.expires)
+            ELSE EXCLUDED.expires END
+    RETURNING count
+"""
+
+
+def _prune():
+    return random.random() < settings.SHARED_COUNTER_PRUNE_RATE
+
+
+class DatabaseCounters:
+    """Counters in the default database, shared by every container"""
+
+    @staticmethod
+    def _table():
+        return connections['default'].ops.quote_name(
+            SharedCounter._meta.db_table)
+
+    def incr(self, key, expires, now=None):
+        """Add one to a counter, return its count
+
+        A live counter keeps the later of its expiry and expires.
+        """
+        now = time.time() if now is None else now
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                INCR_SQL.format(table=self._table()),
+                {'key': key, 'expires': expires, 'now': now},
+            )
+            count = cursor.fetchone()[0]
+            if _prune():
+                cursor.execute(
+                    f'DELETE FROM {self._table()} WHERE expires <= %s',
+                    [now])
+        return count
+
+    def get(self, key, now=None):
+        """Return the count of a counter, 0 once it expired"""
+        now = time.time() if now is None else now
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                f'SELECT count FROM {self._table()} '
+                'WHERE key = %s AND expires > %s',
+                [key, now],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+
+class FileCounters:
+    """Counters in the files of a directory, shared by one container"""
+
+    # Fixed size records, rewritten in place
+    RECORD_SIZE = 48
+    # Files untouched for longer than the longest throttle window
+    MAX_AGE = 24 * 60 * 60
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def _open(self, key):
+        path = self.path(key)
+        try:
+            return os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    @classmethod
+    def _read(cls, fd):
+        """Return the (expires, count) of a counter file, or None"""
+        fields = os.pread(fd, cls.RECORD_SIZE, 0).split()
+        if len(fields) != 2:
+            return None
+        return float(fields[0]), int(fields[1])
+
+    def incr(self, key, expires, now=None):
+        """Add one to a counter, return its count
+
+        A live counter keeps the later of its expiry and expires.
+        """
+        now = time.time() if now is None else now
+        fd = self._open(key)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            record = self._read(fd)
+            count = 1
+            if record is not None and record[0] > now:
+                expires = max(record[0], expires)
+                count = record[1] + 1
+            os.pwrite(
+                fd, f'{expires!r} {count}'.ljust(self.RECORD_SIZE).encode(),
+                0)
+        finally:
+            os.close(fd)
+        if _prune():
+            self.prune()
+        return count
+
+    def get(self, key, now=None):
+        """Return the count of a counter, 0 once it expired"""
+        now = time.time() if now is None else now
+        try:
+            fd = os.open(self.path(key), os.O_RDONLY)
+        except FileNotFoundError:
+            return 0
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            record = self._read(fd)
+        finally:
+            os.close(fd)
+        return record[1] if record is not None and record[0] > now else 0
+
+    def prune(self):
+        """Delete the counter files nobody wrote for MAX_AGE"""
+        oldest = time.time() - self.MAX_AGE
+        try:
+            subdirectories = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return
+        for subdirectory in subdirectories:
+            for entry in os.scandir(subdirectory.path):
+                try:
+                    if entry.stat().st_mtime < oldest:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+database = DatabaseCounters()
+
+
+def for_scope(scope):
+    """Return the counters of a throttle scope, see THROTTLE_COUNTERS"""
+    if settings.THROTTLE_COUNTERS.get(scope, 'database') == 'file':
+        return FileCounters(settings.THROTTLE_FILE_DIRECTORY)
+    return database
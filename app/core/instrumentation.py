@@ -0,0 +1,144 @@
+"""
+Per request timings of the database, serializer and render work
+
+The middleware activates a RequestTimings for the sampled requests.
+A permanent execute wrapper on every connection records the queries
+while one is active, and costs a context variable lookup otherwise.
+"""
+
+import contextvars
+import logging
+import re
+import time
+from contextlib import contextmanager
+
+import orjson
+from django.conf import settings
+
+logger = logging.getLogger('core.requests')
+slow_query_logger = logging.getLogger('core.slow_query')
+
+_current = contextvars.ContextVar('request_timings', default=None)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """Return the SQL with the literals and IN lists collapsed"""
+    sql = _STRING.sub('%s', sql)
+    sql = _NUMBER.sub('%s', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestTimings:
+    """Query count and durations, in seconds, of a single request"""
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.durations = {'db': 0.0, 'serialize': 0.0, 'render': 0.0}
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0.0) + duration
+
+    def server_timing(self, total):
+        """Return the Server-Timing header value"""
+        metrics = [
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.durations.items()
+        ]
+        metrics[0] += f';desc="{self.queries} queries"'
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def as_dict(self, total):
+        """Return the timings in milliseconds for the log line"""
+        data = {'view': self.view, 'queries': self.queries}
+        for name, duration in self.durations.items():
+            data[f'{name}_ms'] = round(duration * 1000, 2)
+        data['total_ms'] = round(total * 1000, 2)
+        return data
+
+
+def log_event(log, level, data):
+    """Log data as a single JSON line"""
+    if log.isEnabledFor(level):
+        log.log(level, orjson.dumps(data).decode())
+
+
+def current():
+    """Return the timings of the current request, or None"""
+    return _current.get()
+
+
+def activate():
+    """Start recording the timings of the current request"""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+@contextmanager
+def measure(name):
+    """Add the duration of the block to the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+class TimedSerializerMixin:
+    """Add the serializer output time to the current request"""
+
+    @property
+    def data(self):
+        with measure('serialize'):
+            return super().data
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper counting and timing the queries"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        timings.queries += 1
+        timings.add('db', duration)
+        if duration * 1000 >= settings.SLOW_QUERY_MS:
+            log_event(slow_query_logger, logging.WARNING, {
+                'view': timings.view,
+                'duration_ms': round(duration * 1000, 2),
+                'sql': normalize_sql(sql),
+            })
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Add the query recorder to a new database connection"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def view_name(view_func, request):
+    """Return the name of a view with the viewset action, or method"""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__qualname__', repr(view_func))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{cls.__name__}.{action}'
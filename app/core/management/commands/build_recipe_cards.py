@@ -0,0 +1,85 @@
+"""
+Django command to backfill and check the recipe cards
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe, RecipeCard
+from recipe import cards, fastpath
+
+
+class Command(BaseCommand):
+    """Django command to build or verify the recipe cards."""
+
+    help = (
+        'Build the cards of every recipe, or with --check compare the '
+        'stored cards with the serializer output and report the recipes '
+        'whose card is missing or stale.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to process, every shard by default',
+        )
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Only compare, exit with an error on differences',
+        )
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='With --check, rebuild the cards that differ',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=fastpath.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        problems = 0
+        for using in options['database'] or settings.SHARD_DATABASES:
+            for batch in self.batches(using, options['batch_size']):
+                if not options['check']:
+                    cards.build(batch, using)
+                    continue
+                bad = self.compare(batch, using)
+                problems += len(bad)
+                if bad and options['fix']:
+                    cards.build(bad, using)
+            self.stdout.write(f'{using}: done')
+
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS('Built the recipe cards'))
+        elif problems and not options['fix']:
+            raise CommandError(f'{problems} recipe cards differ')
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'{problems} recipe cards differ'))
+
+    def batches(self, using, batch_size):
+        """Yield the recipe ids in batches, in id order"""
+        after = 0
+        while True:
+            ids = list(
+                Recipe.objects.using(using).filter(pk__gt=after)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return
+            yield ids
+            after = ids[-1]
+
+    def compare(self, recipe_ids, using):
+        """Return the ids whose stored card is missing or stale"""
+        stored = dict(
+            RecipeCard.objects.using(using).filter(recipe_id__in=recipe_ids)
+            .values_list('recipe_id', 'data'))
+        items = fastpath.serialize_recipes(
+            Recipe.objects.using(using).filter(pk__in=recipe_ids))
+        bad = [
+            item['id'] for item in items
+            if stored.get(item['id']) != cards.encode(item)
+        ]
+        for pk in bad:
+            state = 'stale' if pk in stored else 'missing'
+            self.stdout.write(f'{using} recipe {pk}: {state} card')
+        return bad
@@ -0,0 +1,30 @@
+"""
+Django command to build the OpenAPI schema served by the API
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from drf_spectacular.renderers import OpenApiJsonRenderer
+from drf_spectacular.settings import spectacular_settings
+
+
+class Command(BaseCommand):
+    """Django command to write the OpenAPI schema to disk."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=settings.SCHEMA_FILE,
+            help='Path of the generated JSON schema',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+        schema = generator.get_schema(request=None, public=True)
+        output = OpenApiJsonRenderer().render(schema, renderer_context={})
+
+        with open(options['file'], 'wb') as schema_file:
+            schema_file.write(output)
+        self.stdout.write(
+            self.style.SUCCESS(f'Schema written to {options["file"]}'))
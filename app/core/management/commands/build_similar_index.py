@@ -0,0 +1,43 @@
+"""
+Django command to backfill the similar recipes buckets
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe import fastpath, similar
+
+
+class Command(BaseCommand):
+    """Django command to build the similarity buckets of every recipe."""
+
+    help = (
+        'Rebuild the MinHash buckets of every recipe in batches of ids. '
+        'Writes keep them up to date afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to process, every shard by default',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=fastpath.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        for using in options['database'] or settings.SHARD_DATABASES:
+            recipes = Recipe.objects.using(using)
+            written = 0
+            after = 0
+            while True:
+                ids = list(
+                    recipes.filter(pk__gt=after).order_by('pk')
+                    .values_list('pk', flat=True)[:options['batch_size']])
+                if not ids:
+                    break
+                written += similar.build(ids, using)
+                after = ids[-1]
+            self.stdout.write(f'{using}: {written} buckets')
+        self.stdout.write(self.style.SUCCESS('Built the similarity index'))
@@ -0,0 +1,140 @@
+"""
+Django command to capture the plans of the hot queries and check them
+"""
+
+import difflib
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+
+from core import plans
+from core.models import Ingredient, Recipe, Tag, User
+
+TABLES = [
+    User, Recipe, Tag, Ingredient, Recipe.tags.through,
+    Recipe.ingredients.through,
+]
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'core', 'plan_shapes.json')
+
+
+class Command(BaseCommand):
+    """Django command to EXPLAIN the hot queries on seeded data."""
+
+    help = (
+        'Run EXPLAIN (ANALYZE, BUFFERS) on the hot list queries and compare '
+        'the plan shapes with the stored baseline. Run it on a database '
+        'filled by seed_data, after applying the migrations under test. '
+        'Without a baseline the current shapes are stored as the first one.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--email', help='User to query as, the largest one by default')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument(
+            '--save', action='store_true',
+            help='Store the plan shapes as the new baseline',
+        )
+        parser.add_argument(
+            '--output', help='Write the full plans to this JSON file')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        using = options['database']
+        if connections[using].vendor != 'postgresql':
+            raise CommandError('explain_plans needs a PostgreSQL database')
+
+        # Plans depend on the statistics, refresh them after bulk loads
+        with connections[using].cursor() as cursor:
+            for model in TABLES:
+                cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+        users = User.objects.using(using)
+        if options['email']:
+            user = users.get(email=options['email'])
+        else:
+            user = users.annotate(
+                recipes=Count('recipe')).order_by('-recipes').first()
+        if user is None:
+            raise CommandError('No users, run seed_data first')
+
+        queries = plans.hot_queries(
+            user,
+            self.most_used(Tag, user, using),
+            self.most_used(Ingredient, user, using),
+        )
+        full, shapes = {}, {}
+        for name, queryset in queries.items():
+            output = plans.explain(queryset.using(using), using)
+            full[name] = output
+            shapes[name] = plans.plan_shape(output['Plan'])
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {output.get("Execution Time", 0):.2f} ms, '
+                f'{output["Plan"].get("Shared Hit Blocks", 0)} hit / '
+                f'{output["Plan"].get("Shared Read Blocks", 0)} read blocks'))
+            self.stdout.write('\n'.join(plans.format_shape(shapes[name])))
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump(full, output_file, indent=2)
+        if options['save']:
+            self.save_baseline(options['baseline'], shapes)
+            return
+        self.check_baseline(options['baseline'], shapes)
+
+    def most_used(self, model, user, using):
+        """Return the ids of the two objects on the most recipes"""
+        return list(
+            model.objects.using(using).filter(user=user)
+            .annotate(uses=Count('recipe')).order_by('-uses')
+            .values_list('id', flat=True)[:2]
+        )
+
+    def save_baseline(self, path, shapes):
+        with open(path, 'w') as baseline_file:
+            json.dump(shapes, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        self.stdout.write(self.style.SUCCESS(
+            f'Plan shapes written to {path}'))
+
+    def check_baseline(self, path, shapes):
+        """Compare the shapes with the baseline, store them if missing
+
+        The first run on a tree without a baseline has nothing to check
+        against, it stores the shapes to be committed instead.
+        """
+        if not os.path.exists(path):
+            self.stderr.write(self.style.WARNING(
+                f'No baseline at {path}, storing the current plans as the '
+                f'baseline, commit it after reviewing them'))
+            self.save_baseline(path, shapes)
+            return
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+
+        problems = []
+        for name, shape in shapes.items():
+            if name not in baseline:
+                self.stdout.write(f'{name}: not in the baseline')
+                continue
+            if shape != baseline[name]:
+                self.stdout.write('\n'.join(difflib.unified_diff(
+                    plans.format_shape(baseline[name]),
+                    plans.format_shape(shape),
+                    f'{name} baseline', f'{name} current', lineterm='',
+                )))
+            problems += [
+                f'{name}: {problem}'
+                for problem in plans.regressions(baseline[name], shape)
+            ]
+        for problem in problems:
+            self.stderr.write(problem)
+        if problems:
+            raise CommandError(f'{len(problems)} plan regressions')
+        self.stdout.write(self.style.SUCCESS('Plans match the baseline'))
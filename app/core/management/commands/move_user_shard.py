@@ -0,0 +1,101 @@
+"""
+Django command to move the objects of a user to another shard
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core import sharding, signals
+from core.models import Ingredient, Recipe, Tag, User, UserShard
+
+
+class Command(BaseCommand):
+    """Django command to move a user between shards while serving."""
+
+    help = (
+        'Copy the recipes, tags and ingredients of a user to another '
+        'shard and switch the directory to it. Writes of the user get a '
+        '503 during the copy, reads keep working.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('database')
+        parser.add_argument(
+            '--settle', type=float,
+            help='Seconds the workers need to see a directory change, '
+                 'SHARD_DIRECTORY_TTL plus a request by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        target = options['database']
+        if target not in settings.SHARD_DATABASES:
+            raise CommandError(
+                f'{target} is not one of {settings.SHARD_DATABASES}')
+        try:
+            user = User.objects.using('default').get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user {options["email"]}')
+        settle = options['settle']
+        if settle is None:
+            settle = settings.SHARD_DIRECTORY_TTL + 30
+        self.batch_size = options['batch_size']
+
+        entry, _ = UserShard.objects.using('default').get_or_create(
+            user=user, defaults={'database': 'default'})
+        source = entry.database
+        if source == target:
+            raise CommandError(f'{user.email} is already on {target}')
+
+        self.set_entry(entry, source, read_only=True)
+        self.wait(settle, 'for the workers to stop writing')
+        try:
+            counts = self.copy(user, source, target)
+        except Exception:
+            self.set_entry(entry, source, read_only=False)
+            raise
+        self.set_entry(entry, target, read_only=False)
+        self.stdout.write(f'Copied {counts} to {target}')
+
+        # Workers still reading the old entry need the source rows
+        self.wait(settle, 'for the workers to switch')
+        # Every counted row goes too, the counts need no update
+        with signals.bulk_delete():
+            for model in [Recipe, Tag, Ingredient]:
+                model.objects.using(source).filter(user=user).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {user.email} from {source} to {target}'))
+
+    def set_entry(self, entry, database, read_only):
+        entry.database = database
+        entry.read_only = read_only
+        entry.save(using='default')
+        sharding.forget(entry.user_id)
+
+    def wait(self, seconds, reason):
+        if seconds > 0:
+            self.stdout.write(f'Waiting {seconds:g}s {reason}...')
+            time.sleep(seconds)
+
+    def copy(self, user, source, target):
+        """Copy the sharded rows of the user, return the counts"""
+        counts = {}
+        with transaction.atomic(using=target):
+            if target != 'default':
+                sharding.add_stub_user(user, target)
+            for model in sharding.sharded_models():
+                user_field = (
+                    'user' if hasattr(model, 'user') else 'recipe__user')
+                queryset = model.objects.using(source).filter(
+                    **{user_field: user}).order_by('pk')
+                rows = list(queryset)
+                for start in range(0, len(rows), self.batch_size):
+                    model.objects.using(target).bulk_create(
+                        rows[start:start + self.batch_size])
+                counts[model._meta.model_name] = len(rows)
+        return counts
@@ -0,0 +1,69 @@
+"""
+Django command to repair the recipe_count of the tags and ingredients and
+the ingredient_count of the recipes
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from core import signals
+
+
+class Command(BaseCommand):
+    """Django command to recount the denormalized link counts."""
+
+    help = (
+        'Compare recipe_count and ingredient_count with the through '
+        'tables in batches of ids and fix the rows that drifted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to check, every shard by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the drift without fixing it',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        total = 0
+        for using in options['database'] or settings.SHARD_DATABASES:
+            for model in signals.COUNT_FIELDS:
+                fixed = self.reconcile(
+                    model, using, options['batch_size'], options['dry_run'])
+                total += fixed
+                self.stdout.write(
+                    f'{using} {model._meta.model_name}: {fixed} drifted')
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {total} counts'))
+
+    def reconcile(self, model, using, batch_size, dry_run):
+        """Fix the drifted rows of a model, return how many there were"""
+        objects = model.objects.using(using)
+        field = signals.COUNT_FIELDS[model]
+        fixed = 0
+        after = 0
+        while True:
+            ids = list(
+                objects.filter(pk__gt=after).order_by('pk')
+                .values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return fixed
+            with transaction.atomic(using=using):
+                batch = objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+                drifted = list(
+                    batch.annotate(actual=signals.expected_count(model))
+                    .exclude(**{field: F('actual')})
+                    .values_list('pk', flat=True)
+                )
+                if drifted and not dry_run:
+                    objects.filter(pk__in=drifted).update(
+                        **{field: signals.expected_count(model)})
+            fixed += len(drifted)
+            after = ids[-1]
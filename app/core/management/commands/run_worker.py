@@ -0,0 +1,94 @@
+"""
+Django command to run the queued background tasks
+"""
+
+import os
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core import queue
+
+
+class Command(BaseCommand):
+    """Django command to run the tasks of core.queue."""
+
+    help = (
+        'Claim and run the due tasks in worker threads until SIGTERM, '
+        'or until none is left with --burst.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            help='Worker threads, TASK_WORKER_CONCURRENCY by default',
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            help='Seconds to wait when the queue is empty',
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no task is due',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        queue.autodiscover()
+        concurrency = (
+            options['concurrency'] or settings.TASK_WORKER_CONCURRENCY)
+        poll = options['poll_interval'] or settings.TASK_POLL_INTERVAL
+        self.stopping = threading.Event()
+        self.ran = 0
+        self.lock = threading.Lock()
+        previous = {
+            signum: signal.signal(signum, self.stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            if concurrency == 1:
+                self.work(queue.worker_name(os.getpid()), options['burst'],
+                          poll)
+            else:
+                threads = [
+                    threading.Thread(
+                        target=self.work_thread,
+                        args=(queue.worker_name(f'{os.getpid()}-{n}'),
+                              options['burst'], poll),
+                    )
+                    for n in range(concurrency)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+        self.stdout.write(self.style.SUCCESS(f'Ran {self.ran} tasks'))
+
+    def stop(self, signum, frame):
+        """Let the running tasks finish, then exit"""
+        self.stopping.set()
+
+    def work(self, worker, burst, poll):
+        while not self.stopping.is_set():
+            close_old_connections()
+            task = queue.claim(worker)
+            if task is None:
+                if burst:
+                    return
+                self.stopping.wait(poll)
+                continue
+            queue.execute(task)
+            with self.lock:
+                self.ran += 1
+
+    def work_thread(self, worker, burst, poll):
+        try:
+            self.work(worker, burst, poll)
+        finally:
+            connection.close()
@@ -0,0 +1,315 @@
+"""
+Django command to generate synthetic users and recipes for load testing
+"""
+
+import collections
+import io
+import itertools
+import math
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from core.models import Ingredient, Recipe, Tag
+
+WORDS = (
+    'apple basil bean beef berry bread broccoli butter cabbage caramel '
+    'carrot cheese cherry chicken chili chocolate cinnamon coconut cod '
+    'corn cream cucumber curry date dill egg fennel feta fig garlic '
+    'ginger grape ham honey kale lamb leek lemon lentil lime mango maple '
+    'milk mint miso mushroom mustard noodle nut oat olive onion orange '
+    'oregano paprika parsley pasta pea peach pear pepper pesto pie plum '
+    'pork potato prawn pumpkin radish raisin rice rosemary saffron sage '
+    'salmon salsa sesame shallot soy spinach squash steak sugar thyme '
+    'tofu tomato tuna turmeric vanilla vinegar walnut yogurt zucchini'
+).split()
+STYLES = (
+    'baked braised charred creamy crispy easy fried grilled hearty '
+    'quick roasted rustic simple slow smoked spicy steamed stuffed sweet '
+    'tangy warm'
+).split()
+DISHES = (
+    'bake bowl broth burger cake casserole curry dip gratin hash pie '
+    'pilaf risotto roast salad sandwich skillet soup stew stir-fry tacos '
+    'tart traybake wrap'
+).split()
+
+
+class Zipf:
+    """Sample ranks 1..size with a probability proportional to 1/rank^s"""
+
+    def __init__(self, size, s):
+        weights = (1 / rank ** s for rank in range(1, size + 1))
+        self.cum_weights = list(itertools.accumulate(weights))
+        self.ranks = range(1, size + 1)
+
+    def sample(self, rng, k=1):
+        return rng.choices(self.ranks, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, rng, k, size):
+        """Return up to k distinct 0 based indexes below size"""
+        if size <= 0 or k <= 0:
+            return []
+        ranks = rng.choices(
+            self.ranks[:size], cum_weights=self.cum_weights[:size], k=k)
+        return list(dict.fromkeys(rank - 1 for rank in ranks))
+
+
+class RowWriter:
+    """Insert plain rows with ids allocated up front
+
+    Rows skip the model instances and the bulk_create compiler, which
+    cost more than the inserts themselves at this volume.
+    """
+
+    def __init__(self, using, batch_size):
+        self.connection = connections[using]
+        self.using = using
+        self.batch_size = batch_size
+        self.next_ids = {}
+
+    def reserve_ids(self, model, count):
+        table = model._meta.db_table
+        if table not in self.next_ids:
+            last = model.objects.using(self.using).order_by('-pk').values_list(
+                'pk', flat=True).first()
+            self.next_ids[table] = (last or 0) + 1
+        start = self.next_ids[table]
+        self.next_ids[table] += count
+        return range(start, start + count)
+
+    def quoted(self, model, fields):
+        """Return the quoted table and column names"""
+        quote = self.connection.ops.quote_name
+        columns = ', '.join(
+            quote(model._meta.get_field(name).column) for name in fields)
+        return quote(model._meta.db_table), columns
+
+    def write(self, model, fields, rows):
+        table, columns = self.quoted(model, fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        sql = f'INSERT INTO {table} ({columns}) VALUES ({placeholders})'
+        with self.connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                cursor.executemany(
+                    sql, rows[start:start + self.batch_size])
+
+
+class PostgresRowWriter(RowWriter):
+    """Allocate ids from the sequences and load the rows with COPY"""
+
+    def reserve_ids(self, model, count):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [model._meta.db_table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def write(self, model, fields, rows):
+        table, columns = self.quoted(model, fields)
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(map(self.copy_value, row)))
+            buffer.write('\n')
+        buffer.seek(0)
+        with self.connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN', buffer)
+
+    @staticmethod
+    def copy_value(value):
+        """Return a value in the COPY text format"""
+        if value is None:
+            return '\\N'
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        return (
+            str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r')
+        )
+
+
+class Command(BaseCommand):
+    """Django command to fill the database with synthetic data."""
+
+    help = (
+        'Generate users with Zipf distributed recipe, tag and ingredient '
+        'counts. The same seed always produces the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--max-recipes', type=int, default=1000,
+            help='Recipes of the most prolific user',
+        )
+        parser.add_argument('--max-tags', type=int, default=100)
+        parser.add_argument('--max-ingredients', type=int, default=400)
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Exponent of the Zipf distributions, larger is more skewed',
+        )
+        parser.add_argument(
+            '--chunk', type=int, default=200,
+            help='Users generated and written per transaction',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--password', default='password123')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        using = options['database']
+        writer_class = (
+            PostgresRowWriter
+            if connections[using].vendor == 'postgresql' else RowWriter
+        )
+        self.writer = writer_class(using, options['batch_size'])
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.recipes = Zipf(options['max_recipes'], options['zipf'])
+        self.tags = Zipf(options['max_tags'], options['zipf'])
+        self.ingredients = Zipf(options['max_ingredients'], options['zipf'])
+        # Generated text numbers recipes per run, the pks follow the sequences
+        self.recipe_numbers = itertools.count(1)
+        # Hashing is deliberately slow, every seeded user shares one hash
+        self.password = make_password(options['password'])
+
+        totals = dict.fromkeys(
+            ['users', 'recipes', 'tags', 'ingredients', 'links'], 0)
+        start = time.perf_counter()
+        for first in range(0, options['users'], options['chunk']):
+            count = min(options['chunk'], options['users'] - first)
+            with transaction.atomic(using=using):
+                for name, value in self.seed_users(first, count).items():
+                    totals[name] += value
+            self.stdout.write(
+                f'{first + count}/{options["users"]} users, '
+                f'{totals["recipes"]} recipes, '
+                f'{totals["links"]} through rows, '
+                f'{time.perf_counter() - start:.1f}s'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Seeded ' + ', '.join(f'{v} {k}' for k, v in totals.items())))
+
+    def seed_users(self, first, count):
+        """Generate and write a chunk of users with their objects"""
+        rng = self.rng
+        User = get_user_model()
+        seed = self.options['seed']
+        users = [
+            (
+                pk, f'seed{seed}-user{first + i}@example.com',
+                self.sentence(2, 2).title(), self.password,
+                True, False, False,
+            )
+            for i, pk in enumerate(self.writer.reserve_ids(User, count))
+        ]
+
+        tags, ingredients, recipes = [], [], []
+        recipe_tags, recipe_ingredients = [], []
+        for user_id, *_ in users:
+            tag_ids = self.named(
+                Tag, user_id, self.tags.sample(rng)[0], WORDS + STYLES, tags)
+            ingredient_ids = self.named(
+                Ingredient, user_id, self.ingredients.sample(rng)[0], WORDS,
+                ingredients)
+
+            recipe_count = self.recipes.sample(rng)[0]
+            for pk in self.writer.reserve_ids(Recipe, recipe_count):
+                recipes.append(self.recipe(pk, user_id))
+                recipe_tags += [
+                    (pk, tag_ids[index])
+                    for index in self.tags.distinct(
+                        rng, rng.randint(0, 5), len(tag_ids))
+                ]
+                recipe_ingredients += [
+                    (pk, ingredient_ids[index])
+                    for index in self.ingredients.distinct(
+                        rng, rng.randint(1, 15), len(ingredient_ids))
+                ]
+
+        # The links skip the signals maintaining the counts
+        tags = self.with_counts(tags, recipe_tags)
+        ingredients = self.with_counts(ingredients, recipe_ingredients)
+        recipes = self.with_counts(recipes, recipe_ingredients, column=0)
+
+        write = self.writer.write
+        write(User, [
+            'id', 'email', 'name', 'password',
+            'is_active', 'is_staff', 'is_superuser',
+        ], users)
+        write(Tag, ['id', 'user', 'name', 'recipe_count'], tags)
+        write(
+            Ingredient, ['id', 'user', 'name', 'recipe_count'], ingredients)
+        write(Recipe, [
+            'id', 'user', 'title', 'description', 'time_minutes', 'price',
+            'link', 'ingredient_count',
+        ], recipes)
+        write(Recipe.tags.through, ['recipe', 'tag'], recipe_tags)
+        write(
+            Recipe.ingredients.through, ['recipe', 'ingredient'],
+            recipe_ingredients)
+        return {
+            'users': len(users),
+            'recipes': len(recipes),
+            'tags': len(tags),
+            'ingredients': len(ingredients),
+            'links': len(recipe_tags) + len(recipe_ingredients),
+        }
+
+    def named(self, model, user_id, count, words, rows):
+        """Add count rows with distinct names, return their ids"""
+        names = self.rng.sample(words, min(count, len(words)))
+        names += [
+            f'{self.rng.choice(words)} {i}'
+            for i in range(count - len(names))
+        ]
+        ids = self.writer.reserve_ids(model, count)
+        rows += [
+            (pk, user_id, name.title()) for pk, name in zip(ids, names)]
+        return ids
+
+    @staticmethod
+    def with_counts(rows, links, column=1):
+        """Append the number of links of each row"""
+        counts = collections.Counter(link[column] for link in links)
+        return [row + (counts[row[0]],) for row in rows]
+
+    def recipe(self, pk, user_id):
+        """Return a recipe row with realistic text lengths"""
+        rng = self.rng
+        number = next(self.recipe_numbers)
+        title = ' '.join([
+            rng.choice(STYLES),
+            self.sentence(1, 3),
+            rng.choice(DISHES),
+        ]).capitalize()
+        # Most descriptions are a short paragraph, a few are long
+        words = min(400, int(rng.lognormvariate(3.5, 0.8)))
+        link = ''
+        if rng.random() < 0.6:
+            slug = title.lower().replace(' ', '-')
+            link = f'https://example.com/recipes/{number}-{slug}'
+        cents = max(50, min(99999, int(math.exp(rng.gauss(6.9, 0.7)))))
+        return (
+            pk,
+            user_id,
+            title,
+            self.sentence(words, words).capitalize(),
+            max(1, min(600, int(rng.lognormvariate(3.4, 0.6)))),
+            str(Decimal(cents) / 100),
+            link,
+        )
+
+    def sentence(self, low, high):
+        count = self.rng.randint(low, high)
+        return ' '.join(self.rng.choices(WORDS, k=count))
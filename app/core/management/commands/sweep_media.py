@@ -0,0 +1,112 @@
+"""
+Django command to remove the recipe images no recipe refers to
+"""
+
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+
+UPLOAD_DIR = os.path.join('uploads', 'recipe')
+
+
+class Command(BaseCommand):
+    """Django command to sweep the orphaned recipe images."""
+
+    help = (
+        'Stream the recipe upload directory and delete, or move to a '
+        'quarantine directory, the files older than the grace period '
+        'that no recipe refers to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Keep the newer files, their recipe may not be saved yet',
+        )
+        parser.add_argument(
+            '--quarantine', metavar='DIR',
+            help='Move the orphaned files to DIR instead of deleting them',
+        )
+        parser.add_argument(
+            '--database', action='append',
+            help='Database to check, every shard by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report the orphaned files without touching them',
+        )
+
+    def handle(self, *args, **options):
+        """Entry point"""
+        storage = Recipe._meta.get_field('image').storage
+        directory = storage.path(UPLOAD_DIR)
+        if not os.path.isdir(directory):
+            self.stdout.write(f'No {directory}, nothing to sweep')
+            return
+        quarantine = options['quarantine']
+        if quarantine and not options['dry_run']:
+            os.makedirs(quarantine, exist_ok=True)
+        cutoff = time.time() - options['grace_hours'] * 3600
+        databases = options['database'] or settings.SHARD_DATABASES
+
+        checked = swept = 0
+        for names in self.batches(directory, cutoff, options['batch_size']):
+            checked += len(names)
+            for name in self.orphans(names, databases):
+                if options['verbosity'] > 1:
+                    self.stdout.write(name)
+                if not options['dry_run']:
+                    self.sweep(directory, name, quarantine)
+                swept += 1
+
+        verb = 'Found' if options['dry_run'] else 'Swept'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {swept} orphaned of {checked} old files'))
+
+    def batches(self, directory, cutoff, size):
+        """Yield the names of the files older than cutoff, size at a time
+
+        Reads the directory as a stream, memory does not grow with it.
+        """
+        names = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                    continue
+                names.append(entry.name)
+                if len(names) >= size:
+                    yield names
+                    names = []
+        if names:
+            yield names
+
+    def orphans(self, names, databases):
+        """Return the names no recipe of the databases refers to"""
+        paths = {os.path.join(UPLOAD_DIR, name): name for name in names}
+        for using in databases:
+            if not paths:
+                break
+            for path in (
+                    Recipe.objects.using(using).filter(image__in=list(paths))
+                    .values_list('image', flat=True)):
+                paths.pop(path, None)
+        return list(paths.values())
+
+    def sweep(self, directory, name, quarantine):
+        path = os.path.join(directory, name)
+        try:
+            if quarantine:
+                shutil.move(path, os.path.join(quarantine, name))
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            # Removed since the scan, by a purge or another sweep
+            pass
@@ -0,0 +1,111 @@
+"""
+Prometheus metrics of the API
+
+Each uwsgi worker is a separate process. When PROMETHEUS_MULTIPROC_DIR
+is set every process writes its values to mmap files in that directory
+and a scrape of any worker aggregates the files of the whole container.
+Under uwsgi the files are named after the worker slot rather than the
+pid, so a worker recycled by max-requests takes over the files of the
+one it replaces instead of leaving them behind. The uwsgi master wipes
+the directory when it starts.
+"""
+
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    values,
+)
+
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+UNMATCHED_VIEW = '<unmatched>'
+
+
+def process_identifier():
+    """Return the uwsgi worker slot, or the pid outside uwsgi"""
+    if uwsgi is not None:
+        return uwsgi.worker_id()
+    return os.getpid()
+
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+# Before any metric is created, the values are bound to their files
+if multiprocess_dir():
+    values.ValueClass = values.MultiProcessValue(process_identifier)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Request latency by view and method',
+    ['view', 'method'],
+)
+REQUESTS = Counter(
+    'http_requests_total',
+    'Responses by view, method and status code',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Database queries per request by view',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total',
+    'Cache lookups by cache and result',
+    ['cache', 'result'],
+)
+TOKEN_AUTH = Counter(
+    'token_auth_total',
+    'Token authentications by result',
+    ['result'],
+)
+IMAGE_UPLOADS = Gauge(
+    'image_uploads_in_progress',
+    'Image uploads waiting for or being processed',
+    multiprocess_mode='livesum',
+)
+
+
+def observe_request(view, method, status, duration, queries=None):
+    """Record a finished request, and its query count when recorded"""
+    view = view or UNMATCHED_VIEW
+    REQUEST_LATENCY.labels(view, method).observe(duration)
+    REQUESTS.labels(view, method, status).inc()
+    if queries is not None:
+        DB_QUERIES.labels(view).observe(queries)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def render(path=None):
+    """Return the exposition body of all the processes, and its type"""
+    path = path or multiprocess_dir()
+    if path:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, path=path)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def install():
+    """Drop the live gauges of a uwsgi worker when it exits"""
+    if uwsgi is not None and multiprocess_dir():
+        uwsgi.atexit = lambda: multiprocess.mark_process_dead(
+            process_identifier())
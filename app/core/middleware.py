@@ -0,0 +1,246 @@
+"""
+Middleware for the project
+
+The session, CSRF, messages and clickjacking middleware only matter for
+the admin. The API authenticates with tokens only, so requests under
+LEAN_MIDDLEWARE_PREFIXES skip them entirely.
+"""
+
+import abc
+import asyncio
+import logging
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware
+
+from core import instrumentation, metrics, routers, sharding
+
+
+def is_lean_path(path):
+    """Return True if the path takes the minimal middleware stack"""
+    return path.startswith(tuple(settings.LEAN_MIDDLEWARE_PREFIXES)) and (
+        not path.startswith(
+            tuple(settings.LEAN_MIDDLEWARE_EXCLUDED_PREFIXES)))
+
+
+class LeanPathMixin:
+    """Bypass the middleware for requests on lean paths"""
+
+    def __call__(self, request):
+        if is_lean_path(request.path_info):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class LeanSessionMiddleware(LeanPathMixin, SessionMiddleware):
+    """Session middleware skipped on lean paths"""
+
+
+class LeanCsrfViewMiddleware(LeanPathMixin, CsrfViewMiddleware):
+    """CSRF middleware skipped on lean paths"""
+
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        if is_lean_path(request.path_info):
+            return None
+        return super().process_view(
+            request, callback, callback_args, callback_kwargs)
+
+
+class LeanAuthenticationMiddleware(LeanPathMixin, AuthenticationMiddleware):
+    """Session based authentication skipped on lean paths"""
+
+
+class LeanMessageMiddleware(LeanPathMixin, MessageMiddleware):
+    """Messages middleware skipped on lean paths"""
+
+
+class LeanXFrameOptionsMiddleware(LeanPathMixin, XFrameOptionsMiddleware):
+    """Clickjacking protection skipped on lean paths"""
+
+
+class HybridMiddleware(abc.ABC):
+    """Base of the middleware running in both the sync and async stacks
+
+    Under ASGI Django runs a sync only middleware, and everything below
+    it, on one shared thread, which serializes the requests. Subclasses
+    implement call for WSGI and __acall__ for ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Lets Django await the instance, like MiddlewareMixin
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.call(request)
+
+    @abc.abstractmethod
+    def call(self, request):
+        """Return the response of a request of the sync stack"""
+
+    @abc.abstractmethod
+    async def __acall__(self, request):
+        """Return the response of a request of the async stack"""
+
+
+class ShardMiddleware(HybridMiddleware):
+    """Scope the shard of the authenticated user to the request
+
+    Under ASGI the scope is set in the context of the request task, the
+    pool threads of the async views run with a copy of it.
+    """
+
+    def call(self, request):
+        if not sharding.is_sharded():
+            return self.get_response(request)
+        with sharding.request_scope():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not sharding.is_sharded():
+            return await self.get_response(request)
+        with sharding.request_scope():
+            return await self.get_response(request)
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """Read from the replicas on safe requests
+
+    A client that sent a write reads from the primary for
+    READ_YOUR_WRITES_SECONDS, so it sees its own changes. Clients are
+    told apart by their Authorization header, or their session cookie
+    on the admin.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def credentials(self, request):
+        return request.META.get('HTTP_AUTHORIZATION') or (
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''))
+
+    def call(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+
+        credentials = self.credentials(request)
+        if request.method not in self.SAFE_METHODS:
+            try:
+                return self.get_response(request)
+            finally:
+                routers.mark_write(credentials)
+        if routers.wrote_recently(credentials):
+            return self.get_response(request)
+        with routers.use_replicas():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return await self.get_response(request)
+
+        credentials = self.credentials(request)
+        # The sticky marks are in the database, kept off the loop
+        if request.method not in self.SAFE_METHODS:
+            try:
+                return await self.get_response(request)
+            finally:
+                await sync_to_async(
+                    routers.mark_write, thread_sensitive=False)(credentials)
+        if await sync_to_async(
+                routers.wrote_recently, thread_sensitive=False)(credentials):
+            return await self.get_response(request)
+        with routers.use_replicas():
+            return await self.get_response(request)
+
+
+class RequestTimingMiddleware(HybridMiddleware):
+    """Record the query count and timings of the requests
+
+    Only a sample of REQUEST_TIMING_SAMPLE_RATE activates the recorder,
+    which counts and times the queries, feeds the query metrics and is
+    logged. With METRICS_ENABLED the other requests only bump the
+    request counter and latency, with both off a request only pays for
+    a random number draw.
+    """
+
+    def sampled(self):
+        rate = settings.REQUEST_TIMING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def call(self, request):
+        if self.sampled():
+            timings, token = instrumentation.activate()
+            start = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                instrumentation.deactivate(token)
+            return self.record(
+                request, response, timings, time.perf_counter() - start)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response = self.get_response(request)
+        return self.count(request, response, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if self.sampled():
+            timings, token = instrumentation.activate()
+            start = time.perf_counter()
+            try:
+                response = await self.get_response(request)
+            finally:
+                instrumentation.deactivate(token)
+            return self.record(
+                request, response, timings, time.perf_counter() - start)
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        return self.count(request, response, time.perf_counter() - start)
+
+    def count(self, request, response, total):
+        """Feed the request counter and latency of an unsampled request"""
+        metrics.observe_request(
+            getattr(request, 'view_name', None), request.method,
+            response.status_code, total)
+        return response
+
+    def record(self, request, response, timings, total):
+        """Feed the metrics and log a sampled request"""
+        if settings.METRICS_ENABLED:
+            metrics.observe_request(
+                timings.view, request.method, response.status_code, total,
+                queries=timings.queries)
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = timings.server_timing(total)
+        instrumentation.log_event(instrumentation.logger, logging.INFO, {
+            'method': request.method,
+            'path': request.path_info,
+            'status': response.status_code,
+            **timings.as_dict(total),
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = instrumentation.current()
+        if timings is None and not settings.METRICS_ENABLED:
+            return
+        request.view_name = instrumentation.view_name(view_func, request)
+        if timings is not None:
+            timings.view = request.view_name
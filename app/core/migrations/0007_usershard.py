@@ -0,0 +1,22 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserShard',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='core.user')),
+                ('database', models.CharField(max_length=100)),
+                ('read_only', models.BooleanField(default=False)),
+            ],
+        ),
+    ]
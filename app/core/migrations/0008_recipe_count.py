@@ -0,0 +1,49 @@
+# Generated by Django 3.2.16 on 2026-10-19 08:42
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_recipes(apps, schema_editor):
+    """Fill the counts of the existing tags and ingredients"""
+    using = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    for name, field in [('Tag', 'tags'), ('Ingredient', 'ingredients')]:
+        model = apps.get_model('core', name)
+        through = getattr(Recipe, field).through
+        column = f'{name.lower()}_id'
+        counts = through.objects.using(using).filter(
+            **{column: OuterRef('pk')}).order_by().values(column).annotate(
+                count=Count('*')).values('count')
+        model.objects.using(using).update(recipe_count=Coalesce(
+            Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_usershard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count'], name='core_tag_user_count_idx'),
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.16 on 2026-10-19 09:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCard',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='core.recipe')),
+                ('data', models.TextField()),
+            ],
+        ),
+    ]
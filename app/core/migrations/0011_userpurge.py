@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserPurge',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('email', models.EmailField(max_length=255)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('recipes', models.PositiveIntegerField(default=0)),
+                ('tags', models.PositiveIntegerField(default=0)),
+                ('ingredients', models.PositiveIntegerField(default=0)),
+                ('images', models.PositiveIntegerField(default=0)),
+                ('finished_at', models.DateTimeField(null=True)),
+            ],
+        ),
+    ]
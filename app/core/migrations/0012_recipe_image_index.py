@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_userpurge'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='core_recipe_image_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price'], name='core_recipe_user_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'time_minutes'], name='core_recipe_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'title'], name='core_recipe_user_title_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+    ]
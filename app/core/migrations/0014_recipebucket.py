@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-19 08:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField()),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='core.recipe')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipebucket',
+            index=models.Index(fields=['user', 'key', 'recipe'], name='core_bucket_user_key_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:02
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_ingredients(apps, schema_editor):
+    """Fill the ingredient counts of the existing recipes"""
+    using = schema_editor.connection.alias
+    Recipe = apps.get_model('core', 'Recipe')
+    counts = Recipe.ingredients.through.objects.using(using).filter(
+        recipe_id=OuterRef('pk')).order_by().values('recipe_id').annotate(
+            count=Count('*')).values('count')
+    Recipe.objects.using(using).update(ingredient_count=Coalesce(
+        Subquery(counts, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipebucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'ingredient_count'], name='core_recipe_user_ingr_idx'),
+        ),
+        migrations.RunPython(count_ingredients, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-19 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_ingredient_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedCounter',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('expires', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-19 14:20
+
+from django.contrib.auth.hashers import make_password
+from django.db import migrations
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+STUB_EMAIL_DOMAIN = 'shard.invalid'
+
+
+def stub_shard_users(apps, schema_editor):
+    """Replace the full user copies of a shard with stub rows"""
+    using = schema_editor.connection.alias
+    if using == 'default':
+        return
+    User = apps.get_model('core', 'User')
+    User.objects.using(using).update(
+        email=Concat(
+            Cast('id', CharField()), Value(f'@{STUB_EMAIL_DOMAIN}')),
+        password=make_password(None), name='', is_active=False,
+        is_staff=False, is_superuser=False, last_login=None,
+    )
+    User.groups.through.objects.using(using).all().delete()
+    User.user_permissions.through.objects.using(using).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_sharedcounter'),
+    ]
+
+    operations = [
+        migrations.RunPython(stub_shard_users, migrations.RunPython.noop),
+    ]
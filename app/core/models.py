@@ -13,6 +13,8 @@ from django.contrib.auth.models import (
     PermissionsMixin,
 )
 
+from core import sharding
+
 
 def recipe_image_file_path(instance, filename):
     """Generate file path for the new recipe image"""
@@ -32,6 +34,7 @@ class UserManager(BaseUserManager):
         user = self.model(email=self.normalize_email(email), **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
+        sharding.assign(user)
 
         return user
 
@@ -70,6 +73,31 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # Maintained by core.signals, repaired by reconcile_counts
+    ingredient_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Looked up by file name in sweep_media
+            models.Index(fields=['image'], name='core_recipe_image_idx'),
+            # Range filters and ordering of the recipe list
+            models.Index(
+                fields=['user', 'price'], name='core_recipe_user_price_idx'),
+            models.Index(
+                fields=['user', 'time_minutes'],
+                name='core_recipe_user_time_idx'),
+            # Title prefix filter, LIKE 'prefix%' needs the pattern ops
+            models.Index(
+                fields=['user', 'title'],
+                name='core_recipe_user_title_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+            # Pantry matches of recipes with few ingredients
+            models.Index(
+                fields=['user', 'ingredient_count'],
+                name='core_recipe_user_ingr_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -82,6 +110,16 @@ class Tag(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by core.signals, repaired by reconcile_counts
+    recipe_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-recipe_count'],
+                name='core_tag_user_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -95,6 +133,135 @@ class Ingredient(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
     )
+    # Maintained by core.signals, repaired by reconcile_counts
+    recipe_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-recipe_count'],
+                name='core_ingredient_user_count_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class RecipeCard(models.Model):
+    """The list representation of a recipe, encoded as JSON
+
+    Rebuilt by recipe.signals when RECIPE_CARDS is on, the list endpoint
+    joins the stored JSON without decoding it.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='card',
+    )
+    data = models.TextField()
+
+
+class RecipeBucket(models.Model):
+    """LSH bucket of the MinHash signature of a recipe
+
+    Recipes sharing a bucket likely share tags and ingredients, see
+    recipe.similar.
+    """
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='buckets')
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    key = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', 'key', 'recipe'],
+                name='core_bucket_user_key_idx',
+            ),
+        ]
+
+
+class UserShard(models.Model):
+    """Directory entry of the database holding the objects of a user
+
+    Users without an entry live on the default database.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='shard',
+    )
+    database = models.CharField(max_length=100)
+    # Set while the objects of the user are moved to another database
+    read_only = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id} on {self.database}'
+
+
+class Task(models.Model):
+    """Deferred work run by the run_worker command, see core.queue"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    locked_at = models.DateTimeField(null=True)
+    locked_by = models.CharField(max_length=255, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'], name='core_task_status_run_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.status})'
+
+
+class UserPurge(models.Model):
+    """Progress of the background deletion of an account
+
+    Keeps the id rather than a foreign key, it outlives the user row.
+    """
+    user_id = models.BigIntegerField(primary_key=True)
+    email = models.EmailField(max_length=255)
+    requested_at = models.DateTimeField(auto_now_add=True)
+    recipes = models.PositiveIntegerField(default=0)
+    tags = models.PositiveIntegerField(default=0)
+    ingredients = models.PositiveIntegerField(default=0)
+    images = models.PositiveIntegerField(default=0)
+    finished_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return self.email
+
+
+class SharedCounter(models.Model):
+    """Counter shared by every worker process, see core.counters"""
+    key = models.CharField(max_length=255, primary_key=True)
+    count = models.PositiveIntegerField(default=0)
+    # Unix time the counter starts over from
+    expires = models.FloatField(db_index=True)
+
+    def __str__(self):
+        return f'{self.key}: {self.count}'
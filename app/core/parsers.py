@@ -0,0 +1,36 @@
+"""
+Parsers for the API requests
+"""
+
+import msgpack
+import orjson
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+
+class ORJSONParser(BaseParser):
+    """Parse JSON request bodies with orjson"""
+    media_type = 'application/json'
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming stream as JSON"""
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackParser(BaseParser):
+    """Parse MessagePack request bodies"""
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming stream as MessagePack"""
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
@@ -0,0 +1,157 @@
+"""
+EXPLAIN plans of the hot queries and their shape regressions
+
+A plan shape keeps the node types, relations and indexes of a plan
+and drops the costs, row counts and timings, so two runs on similar
+data compare equal unless the planner changed strategy.
+"""
+
+import json
+
+from django.db import connections
+from django.test.client import RequestFactory
+from rest_framework.request import Request
+
+from core.models import Recipe
+from recipe import fastpath, pantry
+from recipe.views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Heap Scan'}
+# Nodes a DISTINCT or ORDER BY change tends to add
+EXTRA_WORK = {
+    'Sort', 'Incremental Sort', 'HashAggregate', 'GroupAggregate', 'Unique'}
+AGGREGATES = {'Hashed': 'HashAggregate', 'Sorted': 'GroupAggregate'}
+
+
+def view_queryset(viewset, user, params=None):
+    """Return the queryset a list request with params would run"""
+    request = Request(RequestFactory().get('/', params or {}))
+    request.user = user
+    view = viewset(action='list', request=request, format_kwarg=None)
+    return view.get_queryset()
+
+
+def hot_queries(user, tag_ids, ingredient_ids):
+    """Return the hot querysets of the list endpoints by name"""
+    tags = ','.join(map(str, tag_ids))
+    ingredients = ','.join(map(str, ingredient_ids))
+    recipe_variants = {
+        'recipe_list': {},
+        'recipe_list_tags': {'tags': tags},
+        'recipe_list_ingredients': {'ingredients': ingredients},
+        'recipe_list_tags_ingredients': {
+            'tags': tags, 'ingredients': ingredients},
+        'recipe_list_range': {
+            'price_min': '2.00', 'price_max': '5.00', 'ordering': 'price'},
+        'recipe_list_title': {'title': 'Spicy'},
+    }
+    queries = {
+        name: view_queryset(RecipeViewSet, user, params).values(
+            *fastpath.RECIPE_FIELDS)
+        for name, params in recipe_variants.items()
+    }
+    recipe_ids = list(
+        Recipe.objects.filter(user=user).order_by('-id').values_list(
+            'id', flat=True)[:fastpath.BATCH_SIZE])
+    queries['recipe_list_related_tags'] = fastpath.related_queryset(
+        Recipe.tags.through, 'tag', recipe_ids)
+    queries['recipe_pantry'] = pantry.matches(
+        view_queryset(RecipeViewSet, user), ingredient_ids, 1).values(
+            'id', 'missing')
+    queries['tag_list_assigned_only'] = view_queryset(
+        TagViewSet, user, {'assigned_only': 1}).values(*fastpath.ATTR_FIELDS)
+    queries['tag_list_popular'] = view_queryset(
+        TagViewSet, user, {'popular': 1}).values(*fastpath.ATTR_FIELDS)
+    queries['ingredient_list_assigned_only'] = view_queryset(
+        IngredientViewSet, user, {'assigned_only': 1}).values(
+            *fastpath.ATTR_FIELDS)
+    return queries
+
+
+def explain(queryset, using='default', analyze=True):
+    """Return the JSON EXPLAIN output of a queryset on PostgreSQL
+
+    The plan tree is under 'Plan', ANALYZE adds the 'Execution Time'.
+    """
+    sql, params = queryset.query.sql_with_params()
+    options = 'ANALYZE, BUFFERS, ' if analyze else ''
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN ({options}FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def plan_shape(node):
+    """Return the shape of a plan node and its children"""
+    shape = {'node': node['Node Type']}
+    for key, name in [
+            ('Relation Name', 'relation'),
+            ('Index Name', 'index'),
+            ('Strategy', 'strategy'),
+            ('Join Type', 'join')]:
+        if key in node:
+            shape[name] = node[key]
+    children = [plan_shape(child) for child in node.get('Plans', [])]
+    if children:
+        shape['children'] = children
+    return shape
+
+
+def walk(shape):
+    """Yield every node of a shape"""
+    yield shape
+    for child in shape.get('children', []):
+        yield from walk(child)
+
+
+def format_shape(shape, depth=0):
+    """Return the shape as indented lines"""
+    detail = ' '.join(
+        f'{key}={shape[key]}'
+        for key in ('relation', 'index', 'strategy', 'join') if key in shape)
+    lines = [f'{"  " * depth}{shape["node"]} {detail}'.rstrip()]
+    for child in shape.get('children', []):
+        lines += format_shape(child, depth + 1)
+    return lines
+
+
+def _scans(shape):
+    """Map each relation to the scan node types reading it"""
+    scans = {}
+    for node in walk(shape):
+        relation = node.get('relation')
+        if relation:
+            scans.setdefault(relation, set()).add(node['node'])
+    return scans
+
+
+def _work(shape):
+    """Count the sort and aggregation nodes of a shape"""
+    counts = {}
+    for node in walk(shape):
+        name = node['node']
+        if name == 'Aggregate':
+            name = AGGREGATES.get(node.get('strategy'), name)
+        if name in EXTRA_WORK:
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def regressions(old, new):
+    """Return the strategy regressions from the old to the new shape"""
+    problems = []
+    old_scans, new_scans = _scans(old), _scans(new)
+    for relation, scans in new_scans.items():
+        before = old_scans.get(relation, set())
+        if 'Seq Scan' in scans and 'Seq Scan' not in before and (
+                before & INDEX_SCANS):
+            problems.append(
+                f'{relation}: {"/".join(sorted(before & INDEX_SCANS))} '
+                'became a Seq Scan')
+    old_work, new_work = _work(old), _work(new)
+    for node, count in sorted(new_work.items()):
+        if count > old_work.get(node, 0):
+            problems.append(f'adds {node}')
+    return problems
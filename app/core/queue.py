@@ -0,0 +1,163 @@
+"""
+A task queue kept in the Task table of the default database
+
+Functions decorated with @task are registered under their dotted name
+and queued with their enqueue() method, in the transaction of the
+caller. The run_worker command claims the due tasks with SELECT ...
+FOR UPDATE SKIP LOCKED, so concurrent workers never wait for each
+other nor run the same task twice, and deletes them once done. Failed
+tasks are retried with an exponential backoff, then kept as failed.
+With TASKS_EAGER the tasks run inline instead.
+"""
+
+import json
+import logging
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.instrumentation import log_event
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+# task name -> function
+_registry = {}
+
+
+def task(func=None, *, max_attempts=None):
+    """Register a function as a task
+
+    Its keyword arguments must be JSON serializable.
+    """
+    def register(func):
+        func.task_name = f'{func.__module__}.{func.__name__}'
+        func.max_attempts = max_attempts
+        func.enqueue = lambda **kwargs: enqueue(func, kwargs)
+        _registry[func.task_name] = func
+        return func
+
+    return register(func) if func else register
+
+
+def autodiscover():
+    """Import the tasks modules of the installed apps"""
+    autodiscover_modules('tasks')
+
+
+def enqueue(func, kwargs=None, run_at=None):
+    """Queue a call of a task, return the Task or None if run eagerly"""
+    # Round trip the arguments so eager mode sees what a worker would
+    kwargs = json.loads(json.dumps(kwargs or {}))
+    if settings.TASKS_EAGER:
+        func(**kwargs)
+        return None
+    return Task.objects.create(
+        name=func.task_name,
+        kwargs=kwargs,
+        run_at=run_at or timezone.now(),
+        max_attempts=func.max_attempts or settings.TASK_MAX_ATTEMPTS,
+    )
+
+
+def worker_name(suffix=''):
+    return f'{socket.gethostname()}:{suffix}'
+
+
+def claim(worker):
+    """Lock the next due task for a worker, return it or None
+
+    Running tasks older than TASK_TIMEOUT belong to a dead worker and
+    are claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASK_TIMEOUT)
+    with transaction.atomic():
+        task = (
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Task.QUEUED, run_at__lte=now)
+                | Q(status=Task.RUNNING, locked_at__lt=stale)
+            )
+            .order_by('run_at')
+            .first()
+        )
+        if task is None:
+            return None
+        task.status = Task.RUNNING
+        task.attempts += 1
+        task.locked_at = now
+        task.locked_by = worker
+        task.save(update_fields=[
+            'status', 'attempts', 'locked_at', 'locked_by'])
+    return task
+
+
+def execute(task):
+    """Run a claimed task, return True if it succeeded"""
+    func = _registry.get(task.name)
+    started = time.monotonic()
+    try:
+        if func is None:
+            raise LookupError(f'Unknown task {task.name}')
+        if task.attempts > task.max_attempts:
+            raise TimeoutError('Timed out on the last attempt')
+        func(**task.kwargs)
+    except Exception:
+        final = func is None or task.attempts >= task.max_attempts
+        _failed(task, traceback.format_exc(), final)
+        return False
+    # A task reclaimed by another worker is left to it
+    Task.objects.filter(pk=task.pk, locked_by=task.locked_by).delete()
+    log_event(logger, logging.INFO, {
+        'event': 'task_done',
+        'task': task.name,
+        'attempt': task.attempts,
+        'ms': round((time.monotonic() - started) * 1000, 1),
+    })
+    return True
+
+
+def retry_delay(attempts):
+    """Return the seconds to wait before the next attempt, with jitter"""
+    delay = settings.TASK_RETRY_DELAY * 2 ** (attempts - 1)
+    return delay * random.uniform(1, 1.5)
+
+
+def _failed(task, error, final):
+    if final:
+        status, run_at = Task.FAILED, task.run_at
+    else:
+        status = Task.QUEUED
+        run_at = timezone.now() + timedelta(
+            seconds=retry_delay(task.attempts))
+    Task.objects.filter(pk=task.pk, locked_by=task.locked_by).update(
+        status=status, run_at=run_at, locked_at=None, locked_by='',
+        last_error=error,
+    )
+    log_event(logger, logging.ERROR if final else logging.WARNING, {
+        'event': 'task_failed' if final else 'task_retry',
+        'task': task.name,
+        'attempt': task.attempts,
+        'error': error.strip().splitlines()[-1],
+    })
+
+
+def run_pending(worker=None):
+    """Run the due tasks until none is left, return how many ran"""
+    worker = worker or worker_name('burst')
+    count = 0
+    while True:
+        task = claim(worker)
+        if task is None:
+            return count
+        execute(task)
+        count += 1
@@ -0,0 +1,158 @@
+"""
+Database routing across the shards, the primary and the read replicas
+
+The sharded models go to the shard of the current user, see
+core.sharding. Other writes go to the default database. Its reads go
+to a healthy replica only inside use_replicas(), which
+ReplicaRoutingMiddleware enters for the safe requests of clients that
+did not write recently.
+"""
+
+import contextlib
+import contextvars
+import hashlib
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from core import counters, instrumentation, sharding
+
+logger = logging.getLogger(__name__)
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+# alias -> (checked at, healthy), per process
+_health = {}
+
+LAG_SQL = (
+    'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() '
+    'THEN 0 ELSE EXTRACT(EPOCH FROM now() - '
+    'pg_last_xact_replay_timestamp()) END'
+)
+
+
+@contextlib.contextmanager
+def use_replicas(enabled=True):
+    """Route the reads of the block to the replicas, or to the primary"""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_replicas():
+    return _replica_reads.get() and bool(settings.REPLICA_DATABASES)
+
+
+def replica_lag(alias):
+    """Return the replication lag of a database in seconds"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        connection.ensure_connection()
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        lag = cursor.fetchone()[0]
+    # NULL when the database is not in recovery, a primary has no lag
+    return float(lag or 0)
+
+
+def is_healthy(alias):
+    """Return True if the replica answers and is not lagging behind
+
+    The result is kept for REPLICA_CHECK_INTERVAL seconds.
+    """
+    now = time.monotonic()
+    checked_at, healthy = _health.get(alias, (None, False))
+    if checked_at is not None and now - checked_at < (
+            settings.REPLICA_CHECK_INTERVAL):
+        return healthy
+
+    error = None
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.REPLICA_MAX_LAG
+    except DatabaseError as exc:
+        connections[alias].close()
+        lag, healthy, error = None, False, str(exc)
+    if healthy != _health.get(alias, (None, True))[1]:
+        instrumentation.log_event(
+            logger, logging.INFO if healthy else logging.WARNING,
+            {'replica': alias, 'healthy': healthy, 'lag': lag,
+             'error': error},
+        )
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def healthy_replicas():
+    return [
+        alias for alias in settings.REPLICA_DATABASES if is_healthy(alias)]
+
+
+def sticky_key(credentials):
+    digest = hashlib.sha1(credentials.encode()).hexdigest()
+    return f'sticky:{digest}'
+
+
+def mark_write(credentials):
+    """Read from the primary for a while after a client wrote"""
+    if credentials and settings.REPLICA_DATABASES:
+        counters.database.incr(
+            sticky_key(credentials),
+            time.time() + settings.READ_YOUR_WRITES_SECONDS)
+
+
+def wrote_recently(credentials):
+    return bool(credentials) and counters.database.get(
+        sticky_key(credentials)) > 0
+
+
+class ShardRouter:
+    """Send the sharded models to the active shard
+
+    Without one, the instance hint keeps an object on the database it
+    was loaded from. The default database is left to the next router.
+    """
+
+    def _route(self, model, hints):
+        if not sharding.is_sharded_model(model):
+            return None
+        database = sharding.current()
+        if database is None and hints.get('instance') is not None:
+            database = hints['instance']._state.db
+        return None if database == 'default' else database
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+
+class ReplicaRouter:
+    """Send the reads to a random healthy replica when allowed"""
+
+    def db_for_read(self, model, **hints):
+        if not reading_replicas():
+            return 'default'
+        # Reads inside a transaction must see its writes
+        if connections['default'].in_atomic_block:
+            return 'default'
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.REPLICA_DATABASES:
+            return False
+        return None
@@ -0,0 +1,226 @@
+"""
+Placement of the user objects across the shard databases
+
+Recipes, tags and ingredients live on the shard of their user. The
+UserShard directory on the default database is authoritative, new users
+are placed on a consistent hash ring of SHARD_PLACEMENT_DATABASES. The
+shard of the authenticated user is activated for the request, and
+ShardRouter sends the queries of the sharded models to it.
+
+The users stay on the default database. A shard only holds a stub row
+for each of its users, with the primary key the foreign keys of the
+sharded rows refer to, and neither credentials nor profile to go stale.
+"""
+
+import bisect
+import contextlib
+import contextvars
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections, models
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# Model names of the sharded core models, with the m2m through tables
+SHARDED_MODELS = {
+    'recipe', 'tag', 'ingredient', 'recipe_tags', 'recipe_ingredients',
+    'recipecard', 'recipebucket',
+}
+# Every shard allocates the ids of the sharded tables from its own
+# range, so the rows of a user keep their ids when moved
+ID_RANGE = 10 ** 12
+# Domain of the email addresses of the stub users, reserved by RFC 2606
+STUB_EMAIL_DOMAIN = 'shard.invalid'
+
+
+class ShardMoving(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your recipes are being moved, retry shortly.'
+    default_code = 'shard_moving'
+
+
+class Scope:
+    """The shard of the current request, set once authenticated"""
+
+    def __init__(self, database=None):
+        self.database = database
+
+
+_scope = contextvars.ContextVar('shard_scope', default=None)
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes, points=100):
+        self.ring = sorted(
+            (self.hash(f'{node}:{point}'), node)
+            for node in nodes for point in range(points)
+        )
+        self.keys = [key for key, _ in self.ring]
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def node(self, key):
+        index = bisect.bisect(self.keys, self.hash(str(key)))
+        return self.ring[index % len(self.ring)][1]
+
+
+@lru_cache(maxsize=None)
+def _ring(nodes):
+    return HashRing(nodes)
+
+
+def is_sharded():
+    return len(settings.SHARD_DATABASES) > 1
+
+
+def is_sharded_model(model):
+    return (
+        model._meta.app_label == 'core'
+        and model._meta.model_name in SHARDED_MODELS
+    )
+
+
+def sharded_models():
+    """Return the sharded models, parents before the through tables"""
+    from core.models import Ingredient, Recipe, RecipeBucket, RecipeCard, Tag
+
+    return [
+        Tag, Ingredient, Recipe, Recipe.tags.through,
+        Recipe.ingredients.through, RecipeCard, RecipeBucket,
+    ]
+
+
+def place(user_id):
+    """Return the database a new user goes to"""
+    return _ring(tuple(settings.SHARD_PLACEMENT_DATABASES)).node(user_id)
+
+
+def directory_key(user_id):
+    return f'shard:{user_id}'
+
+
+def lookup(user_id):
+    """Return the database of a user and whether it is read only
+
+    Entries are kept for SHARD_DIRECTORY_TTL seconds in each process.
+    """
+    from core.models import UserShard
+
+    cache = caches['default']
+    key = directory_key(user_id)
+    entry = cache.get(key)
+    if entry is None:
+        row = UserShard.objects.using('default').filter(
+            user_id=user_id).values_list('database', 'read_only').first()
+        entry = row or ('default', False)
+        cache.set(key, entry, settings.SHARD_DIRECTORY_TTL)
+    return entry
+
+
+def forget(user_id):
+    caches['default'].delete(directory_key(user_id))
+
+
+def stub_user(user):
+    """Return the stub of a user, which cannot log in"""
+    stub = type(user)(
+        pk=user.pk, email=f'{user.pk}@{STUB_EMAIL_DOMAIN}', is_active=False)
+    stub.set_unusable_password()
+    return stub
+
+
+def add_stub_user(user, database):
+    """Add the stub row the sharded rows of a user refer to, if missing"""
+    type(user).objects.using(database).bulk_create(
+        [stub_user(user)], ignore_conflicts=True)
+
+
+def assign(user):
+    """Place a new user on a shard"""
+    from core.models import UserShard
+
+    if not is_sharded():
+        return
+    database = place(user.pk)
+    if database == 'default':
+        return
+    add_stub_user(user, database)
+    UserShard.objects.using('default').create(user=user, database=database)
+
+
+def current():
+    """Return the database activated for the context, if any"""
+    scope = _scope.get()
+    return scope.database if scope is not None else None
+
+
+def activate(user, write=False):
+    """Route the sharded queries of the request to the user database"""
+    scope = _scope.get()
+    if scope is None or not is_sharded():
+        return
+    database, read_only = lookup(user.pk)
+    if write and read_only:
+        raise ShardMoving()
+    scope.database = database
+
+
+@contextlib.contextmanager
+def request_scope():
+    """Scope the shard activated by the authentication to a request"""
+    token = _scope.set(Scope())
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+@contextlib.contextmanager
+def using_shard(database):
+    """Route the sharded queries of the block to a database"""
+    token = _scope.set(Scope(database))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def reserve_id_range(database):
+    """Start the id sequences of the sharded tables in the shard range"""
+    index = settings.SHARD_DATABASES.index(database)
+    if index == 0:
+        return
+    connection = connections[database]
+    start = index * ID_RANGE
+    with connection.cursor() as cursor:
+        for model in sharded_models():
+            if not isinstance(model._meta.pk, models.AutoField):
+                continue
+            table = model._meta.db_table
+            if connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f'SELECT last_value FROM {sequence}')
+                if cursor.fetchone()[0] < start:
+                    cursor.execute('SELECT setval(%s, %s)', [sequence, start])
+            elif connection.vendor == 'sqlite':
+                cursor.execute(
+                    'SELECT seq FROM sqlite_sequence WHERE name = %s',
+                    [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute(
+                        'INSERT INTO sqlite_sequence (name, seq) '
+                        'VALUES (%s, %s)', [table, start])
+                elif row[0] < start:
+                    cursor.execute(
+                        'UPDATE sqlite_sequence SET seq = %s '
+                        'WHERE name = %s', [start, table])
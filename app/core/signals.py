@@ -0,0 +1,183 @@
+"""
+Signal receivers maintaining the denormalized recipe_count columns
+
+Every change of the recipe tags and ingredients goes through the m2m
+signals or the deletions, and updates the counts in the same
+transaction. Recipes count their ingredients the same way in
+ingredient_count. Raw inserts into the through tables skip them, the
+reconcile_counts command repairs the counts.
+
+Deleting many recipes row by row would cost an UPDATE per row and
+model. Bulk deletes decrement the counts of the whole batch with
+uncount_recipes, then delete inside bulk_delete() which skips the per
+row receivers.
+"""
+
+import contextlib
+import contextvars
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+
+# Set while a caller updates the counts of its deletes itself
+_bulk_delete = contextvars.ContextVar('bulk_delete', default=False)
+
+# Counted model -> (through model, column of the counted model)
+COUNTED = {
+    Tag: (Recipe.tags.through, 'tag_id'),
+    Ingredient: (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+def actual_count(model):
+    """Return the expression counting the recipes of each row"""
+    through, column = COUNTED[model]
+    counts = (
+        through.objects.filter(**{column: OuterRef('pk')})
+        .order_by().values(column)
+        .annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount(queryset):
+    """Set the recipe_count of the rows from the through table"""
+    return queryset.update(recipe_count=actual_count(queryset.model))
+
+
+def actual_ingredient_count():
+    """Return the expression counting the ingredients of each recipe"""
+    counts = (
+        Recipe.ingredients.through.objects.filter(recipe_id=OuterRef('pk'))
+        .order_by().values('recipe_id')
+        .annotate(count=Count('*')).values('count')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def recount_ingredients(queryset):
+    """Set the ingredient_count of the recipes from the through table"""
+    return queryset.update(ingredient_count=actual_ingredient_count())
+
+
+# Model -> its count column, checked by reconcile_counts
+COUNT_FIELDS = {
+    Tag: 'recipe_count',
+    Ingredient: 'recipe_count',
+    Recipe: 'ingredient_count',
+}
+
+
+def expected_count(model):
+    """Return the expression computing the count column of a model"""
+    if model is Recipe:
+        return actual_ingredient_count()
+    return actual_count(model)
+
+
+def _shift(queryset, delta, field='recipe_count'):
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_links(sender, instance, action, reverse, model, pk_set, using,
+                **kwargs):
+    """Update the counts as recipes gain or lose tags and ingredients"""
+    if sender is Recipe.ingredients.through:
+        count_ingredients(instance, action, reverse, pk_set, using)
+    if reverse:
+        # tag.recipe_set changes, model is Recipe
+        counted = type(instance).objects.using(using).filter(pk=instance.pk)
+        if action == 'post_add' and pk_set:
+            _shift(counted, len(pk_set))
+        elif action in ('post_remove', 'post_clear'):
+            recount(counted)
+        return
+
+    # recipe.tags changes, the link rows still exist in pre_*
+    counted = model.objects.using(using)
+    if action == 'post_add' and pk_set:
+        _shift(counted.filter(pk__in=pk_set), 1)
+    elif action == 'pre_remove' and pk_set:
+        _shift(counted.filter(pk__in=pk_set, recipe=instance), -1)
+    elif action == 'pre_clear':
+        _shift(counted.filter(recipe=instance), -1)
+
+
+def count_ingredients(instance, action, reverse, pk_set, using):
+    """Update the ingredient_count of the recipes whose links change"""
+    recipes = Recipe.objects.using(using)
+    if not reverse:
+        recipe = recipes.filter(pk=instance.pk)
+        if action == 'post_add' and pk_set:
+            _shift(recipe, len(pk_set), 'ingredient_count')
+        elif action == 'post_remove':
+            # pk_set also holds the ids that were not linked
+            recount_ingredients(recipe)
+        elif action == 'post_clear':
+            recipe.update(ingredient_count=0)
+    elif action == 'post_add' and pk_set:
+        _shift(recipes.filter(pk__in=pk_set), 1, 'ingredient_count')
+    elif action == 'post_remove' and pk_set:
+        recount_ingredients(recipes.filter(pk__in=pk_set))
+    elif action == 'pre_clear':
+        _shift(recipes.filter(ingredients=instance), -1, 'ingredient_count')
+
+
+@contextlib.contextmanager
+def bulk_delete():
+    """Skip the per row delete receivers, the caller keeps the counts"""
+    token = _bulk_delete.set(True)
+    try:
+        yield
+    finally:
+        _bulk_delete.reset(token)
+
+
+def bulk_deleting():
+    return _bulk_delete.get()
+
+
+def uncount_recipes(recipe_ids, using):
+    """Decrement the counts of the tags and ingredients of the recipes
+
+    One UPDATE per counted model, run before the link rows are deleted.
+    """
+    for model, (through, column) in COUNTED.items():
+        links = through.objects.using(using).filter(recipe_id__in=recipe_ids)
+        counts = (
+            links.filter(**{column: OuterRef('pk')})
+            .order_by().values(column)
+            .annotate(count=Count('*')).values('count')
+        )
+        model.objects.using(using).filter(
+            pk__in=links.values(column),
+        ).update(recipe_count=Greatest(
+            F('recipe_count')
+            - Subquery(counts, output_field=IntegerField()),
+            0,
+        ))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def uncount_ingredient(sender, instance, using, **kwargs):
+    """Decrement the recipes before the links of an ingredient go"""
+    if bulk_deleting():
+        return
+    _shift(
+        Recipe.objects.using(using).filter(ingredients=instance), -1,
+        'ingredient_count')
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_recipe(sender, instance, using, **kwargs):
+    """Decrement the counts before the link rows are deleted"""
+    if bulk_deleting():
+        return
+    for model in COUNTED:
+        _shift(model.objects.using(using).filter(recipe=instance), -1)
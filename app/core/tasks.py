@@ -0,0 +1,17 @@
+"""
+Background tasks of the core app, see core.queue
+"""
+
+import io
+
+from django.core.management import call_command
+
+from core import queue
+
+
+@queue.task(max_attempts=3)
+def reconcile_counts(database=None):
+    """Repair the recipe_count columns of a database, or of every shard"""
+    call_command(
+        'reconcile_counts', database=[database] if database else None,
+        stdout=io.StringIO())
@@ -0,0 +1,56 @@
+"""
+Test the ASGI handler streaming async iterators
+"""
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from core.asgi import ASGIHandler, AsyncStreamingHttpResponse
+
+
+class Parts:
+    """Async iterator over some parts"""
+
+    def __init__(self, *parts):
+        self.parts = list(parts)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.parts:
+            raise StopAsyncIteration
+        return self.parts.pop(0)
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    """Test the ASGI handler"""
+
+    def test_async_streaming_response(self):
+        """Test each part of the async iterator is sent as it comes"""
+        response = AsyncStreamingHttpResponse(
+            Parts(b'one\n', 'two\n'), content_type='application/x-ndjson')
+        response.set_cookie('name', 'value')
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        async_to_sync(ASGIHandler().send_response)(response, send)
+
+        start = messages[0]
+        self.assertEqual(start['type'], 'http.response.start')
+        self.assertEqual(start['status'], 200)
+        self.assertIn(
+            (b'Content-Type', b'application/x-ndjson'), start['headers'])
+        self.assertIn((b'Set-Cookie', b'name=value; Path=/'), start['headers'])
+        self.assertEqual(
+            [(message.get('body'), message.get('more_body'))
+             for message in messages[1:]],
+            [(b'one\n', True), (b'two\n', True), (None, None)])
+        self.assertTrue(response.closed)
+
+    def test_sync_iteration(self):
+        """Test a sync server can still iterate the response"""
+        response = AsyncStreamingHttpResponse(Parts(b'one\n', b'two\n'))
+
+        self.assertEqual(b''.join(response), b'one\ntwo\n')
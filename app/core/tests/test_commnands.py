@@ -2,11 +2,19 @@
 Test Custom django management commands
 """
 
+import os
+import tempfile
+import time
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.conf import settings
 from django.core.management import call_command
+from django.db.models import Count
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.models import Ingredient, Recipe, Tag, User
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,3 +39,142 @@ class CommandTest(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class SeedDataTests(TestCase):
+    """Test generating synthetic data"""
+
+    # The commands visit every shard
+    databases = set(settings.SHARD_DATABASES)
+
+    def seed(self, seed):
+        """Seed the database and return a snapshot of the recipes"""
+        call_command(
+            'seed_data', users=30, seed=seed, max_recipes=50, chunk=10,
+            stdout=StringIO())
+        # Only fields that do not depend on the sequences, ids just order
+        recipes = list(Recipe.objects.order_by('id').values_list(
+            'user__email', 'title', 'description', 'time_minutes', 'price',
+            'link'))
+        links = list(Recipe.tags.through.objects.order_by('id').values_list(
+            'recipe__title', 'tag__name'))
+        return recipes, links
+
+    def test_seed_data(self):
+        """Test users get skewed, consistent related objects"""
+        self.seed(1)
+
+        self.assertEqual(User.objects.count(), 30)
+        counts = sorted(User.objects.annotate(
+            n=Count('recipe')).values_list('n', flat=True))
+        self.assertGreater(counts[-1], 2 * counts[len(counts) // 2])
+        user = User.objects.first()
+        self.assertTrue(user.check_password('password123'))
+        recipe = Recipe.objects.filter(tags__isnull=False).first()
+        self.assertEqual(recipe.tags.first().user_id, recipe.user_id)
+        self.assertTrue(recipe.ingredients.exists())
+        out = StringIO()
+        call_command('reconcile_counts', dry_run=True, stdout=out)
+        self.assertIn('Found 0 counts', out.getvalue())
+
+    def test_deterministic(self):
+        """Test the same seed produces the same data"""
+        first = self.seed(3)
+        User.objects.all().delete()
+
+        self.assertEqual(self.seed(3), first)
+        User.objects.all().delete()
+        self.assertNotEqual(self.seed(4)[0], first[0])
+
+
+class ReconcileCountsTests(TestCase):
+    """Test repairing the recipe counts"""
+
+    # The commands visit every shard
+    databases = set(settings.SHARD_DATABASES)
+
+    def test_reconcile_counts(self):
+        """Test drifted counts are fixed, correct ones left alone"""
+        user = User.objects.create_user('user@example.com', 'testpass123')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=10, price='2.00')
+        tags = [Tag.objects.create(user=user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        recipe.tags.add(tags[0])
+        # Raw link rows skip the signals
+        Recipe.tags.through.objects.create(recipe=recipe, tag=tags[1])
+        Recipe.ingredients.through.objects.create(
+            recipe=recipe, ingredient=ingredient)
+        Ingredient.objects.filter(pk=ingredient.pk).update(recipe_count=4)
+
+        out = StringIO()
+        call_command('reconcile_counts', batch_size=2, stdout=out)
+
+        self.assertIn('Fixed 3 counts', out.getvalue())
+        self.assertEqual(
+            [tag.recipe_count for tag in Tag.objects.order_by('id')],
+            [1, 1, 0])
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 1)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 1)
+
+
+class SweepMediaTests(TestCase):
+    """Test sweeping the orphaned recipe images"""
+
+    # The commands visit every shard
+    databases = set(settings.SHARD_DATABASES)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.directory = os.path.join(media.name, 'uploads', 'recipe')
+        os.makedirs(self.directory)
+        user = User.objects.create_user(
+            email='user@example.com', password='testpass123')
+        Recipe.objects.create(
+            user=user, title='Curry', time_minutes=5, price='5.00',
+            image='uploads/recipe/used.jpg')
+        old = time.time() - 2 * 86400
+        for name in ['used.jpg', 'orphan.jpg', 'new.jpg']:
+            path = os.path.join(self.directory, name)
+            with open(path, 'wb') as image:
+                image.write(b'jpeg')
+            if name != 'new.jpg':
+                os.utime(path, (old, old))
+
+    def files(self, directory=None):
+        return sorted(os.listdir(directory or self.directory))
+
+    def test_sweep(self):
+        """Test only the old unreferenced files are deleted"""
+        out = StringIO()
+
+        call_command('sweep_media', batch_size=1, stdout=out)
+
+        self.assertEqual(self.files(), ['new.jpg', 'used.jpg'])
+        self.assertIn('Swept 1 orphaned of 2 old files', out.getvalue())
+
+    def test_dry_run(self):
+        """Test a dry run reports the files and keeps them"""
+        out = StringIO()
+
+        call_command('sweep_media', dry_run=True, stdout=out)
+
+        self.assertEqual(len(self.files()), 3)
+        self.assertIn('Found 1 orphaned', out.getvalue())
+
+    def test_quarantine(self):
+        """Test the orphaned files can be moved aside"""
+        quarantine = os.path.join(self.directory, 'quarantine')
+
+        call_command('sweep_media', quarantine=quarantine, stdout=StringIO())
+
+        self.assertEqual(self.files(quarantine), ['orphan.jpg'])
+        self.assertEqual(
+            self.files(), ['new.jpg', 'quarantine', 'used.jpg'])
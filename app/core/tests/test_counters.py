@@ -0,0 +1,126 @@
+"""
+Test the counters shared across the worker processes
+"""
+import os
+import tempfile
+import threading
+
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from core import counters
+from core.models import SharedCounter
+
+
+class CounterTestsMixin:
+    """Tests common to the counter stores"""
+
+    def test_incr(self):
+        """Test each increment adds one until the expiry"""
+        counts = [self.counters.incr('key', 160, now=100) for _ in range(3)]
+
+        self.assertEqual(counts, [1, 2, 3])
+        self.assertEqual(self.counters.get('key', now=159), 3)
+        self.assertEqual(self.counters.get('other', now=100), 0)
+
+    def test_expired_counter_starts_over(self):
+        """Test the first increment after the expiry restarts at 1"""
+        self.counters.incr('key', 160, now=100)
+        self.counters.incr('key', 160, now=100)
+
+        self.assertEqual(self.counters.get('key', now=160), 0)
+        self.assertEqual(self.counters.incr('key', 220, now=160), 1)
+        self.assertEqual(self.counters.get('key', now=200), 1)
+
+    def test_live_counter_keeps_later_expiry(self):
+        """Test an increment can extend a counter but never shorten it"""
+        self.counters.incr('key', 150, now=100)
+        self.counters.incr('key', 120, now=100)
+        self.assertEqual(self.counters.get('key', now=140), 2)
+
+        self.counters.incr('key', 180, now=110)
+        self.assertEqual(self.counters.get('key', now=170), 3)
+
+
+class DatabaseCounterTests(CounterTestsMixin, TestCase):
+    """Test the counters of the default database"""
+
+    counters = counters.database
+
+    @override_settings(SHARED_COUNTER_PRUNE_RATE=1)
+    def test_prune(self):
+        """Test the expired counters are deleted"""
+        self.counters.incr('old', 50, now=0)
+        self.counters.incr('new', 160, now=100)
+
+        self.assertEqual(
+            list(SharedCounter.objects.values_list('key', flat=True)),
+            ['new'])
+
+
+class FileCounterTests(CounterTestsMixin, SimpleTestCase):
+    """Test the counters of a local directory"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.counters = counters.FileCounters(directory.name)
+
+    def test_prune(self):
+        """Test the files nobody wrote for a day are deleted"""
+        self.counters.incr('old', 160, now=100)
+        self.counters.incr('new', 160, now=100)
+        day_ago = os.path.getmtime(self.counters.path('old')) - 86401
+        os.utime(self.counters.path('old'), (day_ago, day_ago))
+
+        self.counters.prune()
+
+        self.assertFalse(os.path.exists(self.counters.path('old')))
+        self.assertTrue(os.path.exists(self.counters.path('new')))
+
+    def test_no_lost_increments(self):
+        """Test concurrent increments are all counted"""
+        def increment():
+            for _ in range(50):
+                self.counters.incr('key', 160, now=100)
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.counters.get('key', now=100), 200)
+
+    @override_settings(
+        THROTTLE_COUNTERS={'read': 'file'}, THROTTLE_FILE_DIRECTORY='/x')
+    def test_for_scope(self):
+        """Test the scopes use their configured store"""
+        self.assertEqual(counters.for_scope('read').directory, '/x')
+        self.assertIs(counters.for_scope('write'), counters.database)
+
+
+class ConcurrentCounterTests(TransactionTestCase):
+    """Test concurrent increments from several connections"""
+
+    def test_no_lost_increments(self):
+        """Test every increment is counted"""
+        def increment():
+            try:
+                for _ in range(20):
+                    counters.database.incr('key', 160, now=100)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=increment) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(counters.database.get('key', now=100), 80)
@@ -0,0 +1,97 @@
+"""
+Test the request timings and the slow query log
+"""
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class NormalizeSqlTests(SimpleTestCase):
+    """Test grouping queries by shape"""
+
+    def test_literals_and_in_lists_collapse(self):
+        """Test the literals and IN lists are replaced"""
+        sql = (
+            "SELECT * FROM t WHERE name = 'it''s'  AND id IN (%s, %s, %s)"
+            " AND price > 5.50 LIMIT 21"
+        )
+
+        self.assertEqual(
+            instrumentation.normalize_sql(sql),
+            'SELECT * FROM t WHERE name = %s AND id IN (...)'
+            ' AND price > %s LIMIT %s',
+        )
+
+
+class RequestTimingTests(TestCase):
+    """Test the timings of the sampled requests"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price='2.50')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=0)
+    def test_unsampled_request(self):
+        """Test unsampled requests are not recorded"""
+        with patch.object(instrumentation, 'log_event') as log_event, \
+                patch.object(instrumentation, 'activate') as activate:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        activate.assert_not_called()
+        log_event.assert_not_called()
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_log_line(self):
+        """Test sampled requests log their queries and timings"""
+        with self.assertLogs('core.requests', 'INFO') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', res)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line['view'], 'RecipeViewSet.list')
+        self.assertEqual(line['status'], 200)
+        self.assertEqual(line['queries'], 3)
+        for key in ['db_ms', 'serialize_ms', 'render_ms', 'total_ms']:
+            self.assertGreaterEqual(line[key], 0)
+
+    @override_settings(
+        REQUEST_TIMING_SAMPLE_RATE=1, SERVER_TIMING_HEADER=True)
+    def test_server_timing_header(self):
+        """Test the timings are exposed when enabled"""
+        with self.assertLogs('core.requests', 'INFO'):
+            res = self.client.get(RECIPES_URL)
+
+        metrics = [m.split(';')[0] for m in res['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'serialize', 'render', 'total'])
+        self.assertIn('desc="3 queries"', res['Server-Timing'])
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1, SLOW_QUERY_MS=0)
+    def test_slow_query_log(self):
+        """Test slow queries are logged with the issuing view"""
+        with self.assertLogs('core', 'INFO') as logs:
+            self.client.get(RECIPES_URL)
+
+        records = [r for r in logs.records if r.name == 'core.slow_query']
+        self.assertEqual(len(records), 3)
+        line = json.loads(records[0].getMessage())
+        self.assertEqual(line['view'], 'RecipeViewSet.list')
+        self.assertNotIn(str(self.user.id), line['sql'].split('= ')[-1])
+        self.assertIn('duration_ms', line)
@@ -0,0 +1,147 @@
+"""
+Test the metrics endpoint
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from prometheus_client.parser import text_string_to_metric_families
+
+from django.contrib.auth import get_user_model
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import metrics
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def samples(body):
+    """Return the samples of an exposition body by name and labels"""
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(body.decode())
+        for sample in family.samples
+    }
+
+
+@override_settings(METRICS_TOKEN='secret', REQUEST_TIMING_SAMPLE_RATE=0)
+class MetricsViewTests(TestCase):
+    """Test scraping the metrics"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        token = Token.objects.create(user=user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.scraper = Client(HTTP_AUTHORIZATION='Bearer secret')
+
+    def value(self, name, **labels):
+        res = self.scraper.get(METRICS_URL)
+        key = (name, tuple(sorted(labels.items())))
+        return samples(res.content).get(key, 0)
+
+    def test_request_metrics(self):
+        """Test requests are counted by view and status"""
+        labels = {'view': 'RecipeViewSet.list', 'method': 'GET'}
+        before = self.value('http_requests_total', status='200', **labels)
+        auth_before = self.value('token_auth_total', result='success')
+        queries_before = self.value(
+            'http_request_db_queries_count', view='RecipeViewSet.list')
+
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            self.value('http_requests_total', status='200', **labels),
+            before + 1,
+        )
+        self.assertEqual(
+            self.value('http_request_duration_seconds_count', **labels),
+            before + 1,
+        )
+        self.assertEqual(
+            self.value('token_auth_total', result='success'), auth_before + 1)
+        # Only the sampled requests record their queries
+        self.assertEqual(
+            self.value(
+                'http_request_db_queries_count', view='RecipeViewSet.list'),
+            queries_before,
+        )
+
+    @override_settings(REQUEST_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_queries(self):
+        """Test the sampled requests record their query count"""
+        # The scrapes are sampled and logged too
+        with self.assertLogs('core.requests', 'INFO'):
+            before = self.value(
+                'http_request_db_queries_sum', view='RecipeViewSet.list')
+            self.client.get(RECIPES_URL)
+            after = self.value(
+                'http_request_db_queries_sum', view='RecipeViewSet.list')
+
+        self.assertGreaterEqual(after, before + 2)
+
+    def test_metrics_token(self):
+        """Test the metrics require the token"""
+        res = Client().get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = self.scraper.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token(self):
+        """Test the metrics are not served without a token unless DEBUG"""
+        res = Client().get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.settings(DEBUG=True):
+            res = Client().get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class MultiprocessTests(SimpleTestCase):
+    """Test the values of separate processes are aggregated"""
+
+    def test_workers_aggregated(self):
+        """Test a scrape sums the counters of every worker"""
+        script = (
+            'from core import metrics\n'
+            'metrics.REQUESTS.labels("RecipeViewSet.list", "GET", 200).inc()\n'
+            'metrics.IMAGE_UPLOADS.inc()\n'
+        )
+        with tempfile.TemporaryDirectory() as path:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=path)
+            for _ in range(2):
+                subprocess.run(
+                    [sys.executable, '-c', script],
+                    cwd=APP_DIR, env=env, check=True,
+                )
+            body, _ = metrics.render(path)
+
+        values = samples(body)
+        key = ('http_requests_total', (
+            ('method', 'GET'),
+            ('status', '200'),
+            ('view', 'RecipeViewSet.list'),
+        ))
+        self.assertEqual(values[key], 2)
+        self.assertEqual(values[('image_uploads_in_progress', ())], 2)
+
+    def test_worker_slot_files(self):
+        """Test uwsgi workers name their files after their slot"""
+        with patch.object(
+                metrics, 'uwsgi', SimpleNamespace(worker_id=lambda: 3)):
+            self.assertEqual(metrics.process_identifier(), 3)
+        self.assertEqual(metrics.process_identifier(), os.getpid())
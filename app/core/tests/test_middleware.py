@@ -0,0 +1,143 @@
+"""
+Test the prefix aware middleware stack
+"""
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import path, reverse
+
+from rest_framework import status
+
+from core import sharding
+from recipe.async_views import run_sync
+
+RECIPES_URL = reverse('recipe:recipe-list')
+DOCS_URL = reverse('api-docs')
+TOKEN_URL = reverse('user:token')
+ADMIN_LOGIN_URL = reverse('admin:login')
+
+
+class Rendezvous:
+    """Let the requests through once all of them are waiting"""
+
+    def __init__(self, parties):
+        self.parties = parties
+        self.arrived = 0
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout):
+        self.arrived += 1
+        if self.arrived == self.parties:
+            self.event.set()
+        await asyncio.wait_for(self.event.wait(), timeout)
+
+
+rendezvous = None
+
+
+async def rendezvous_view(request):
+    """Answer once the other request reached the view, 504 otherwise"""
+    try:
+        await rendezvous.wait(timeout=2)
+    except asyncio.TimeoutError:
+        return HttpResponse(status=504)
+    return HttpResponse()
+
+
+async def shard_view(request):
+    """Activate a shard from a pool thread, answer the request shard"""
+    await run_sync(sharding.activate, SimpleNamespace(pk=1))
+    return HttpResponse(sharding.current() or '')
+
+
+urlpatterns = [
+    path('rendezvous/', rendezvous_view),
+    path('shard/', shard_view),
+]
+
+
+class LeanMiddlewareTests(TestCase):
+    """Test API requests skip the admin only middleware"""
+
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+
+    def test_api_request_is_lean(self):
+        """Test API responses skip sessions and clickjacking headers"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotIn('X-Frame-Options', res)
+        self.assertFalse(hasattr(res.wsgi_request, 'session'))
+        self.assertNotIn('Cookie', res.get('Vary', ''))
+
+    def test_api_post_without_csrf_token(self):
+        """Test API writes are not subject to CSRF checks"""
+        res = self.client.post(
+            TOKEN_URL,
+            {'email': 'user@example.com', 'password': 'wrong'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_docs_keep_clickjacking_header(self):
+        """Test the HTML docs page is not framed, unlike the JSON API"""
+        res = self.client.get(DOCS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+
+    def test_admin_keeps_full_stack(self):
+        """Test the admin still gets sessions, CSRF and clickjacking"""
+        res = self.client.get(ADMIN_LOGIN_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Frame-Options'], 'DENY')
+        self.assertTrue(hasattr(res.wsgi_request, 'session'))
+
+        res = self.client.post(ADMIN_LOGIN_URL, {})
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_admin_session_login(self):
+        """Test session authentication still works for the admin"""
+        user = get_user_model().objects.create_superuser(
+            'admin@example.com', 'testpass123')
+        self.client.force_login(user)
+
+        res = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(
+    ROOT_URLCONF=__name__,
+    REPLICA_DATABASES=['replica_1'],
+    SHARD_DATABASES=['default', 'shard_1'],
+    ASYNC_ORM_THREADS=2,
+)
+class AsgiMiddlewareTests(SimpleTestCase):
+    """Test the project middleware keeps the async views concurrent"""
+
+    async def test_requests_overlap(self):
+        """Test two slow async requests are served at the same time"""
+        global rendezvous
+        rendezvous = Rendezvous(2)
+
+        responses = await asyncio.gather(
+            self.async_client.get('/rendezvous/'),
+            self.async_client.get('/rendezvous/'),
+        )
+
+        self.assertEqual([res.status_code for res in responses], [200, 200])
+
+    @patch('core.sharding.lookup', return_value=('shard_1', False))
+    async def test_shard_scope_reaches_pool(self, lookup):
+        """Test the shard activated in a pool thread is the request one"""
+        res = await self.async_client.get('/shard/')
+
+        self.assertEqual(res.content, b'shard_1')
@@ -5,10 +5,12 @@ from decimal import Decimal
 
 from unittest.mock import patch
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 
-from core import models
+from core import models, signals
 
 
 def create_user(email='user@example.com', password='testpasswd'):
@@ -100,3 +102,100 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
 
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
+
+
+class RecipeCountTests(TestCase):
+    """Test the recipe counts follow the tag and ingredient links"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.tags = [
+            models.Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(3)
+        ]
+        self.recipes = [
+            models.Recipe.objects.create(
+                user=self.user, title=f'Recipe {i}', time_minutes=5,
+                price=Decimal('5.50'))
+            for i in range(2)
+        ]
+
+    def counts(self):
+        return [
+            tag.recipe_count
+            for tag in models.Tag.objects.order_by('id')
+        ]
+
+    def test_add_remove(self):
+        """Test adding and removing tags of a recipe"""
+        self.recipes[0].tags.add(*self.tags[:2])
+        self.recipes[1].tags.add(self.tags[0])
+        # Adding an existing link changes nothing
+        self.recipes[1].tags.add(self.tags[0])
+        self.assertEqual(self.counts(), [2, 1, 0])
+
+        # Removing a missing link changes nothing
+        self.recipes[1].tags.remove(self.tags[0], self.tags[2])
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        self.recipes[0].tags.set([self.tags[2]])
+        self.assertEqual(self.counts(), [0, 0, 1])
+
+    def test_clear(self):
+        """Test clearing the tags of a recipe"""
+        self.recipes[0].tags.add(*self.tags)
+        self.recipes[1].tags.add(self.tags[0])
+
+        self.recipes[0].tags.clear()
+
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+    def test_reverse(self):
+        """Test changing the recipes of a tag"""
+        self.tags[0].recipe_set.add(*self.recipes)
+        self.assertEqual(self.counts(), [2, 0, 0])
+
+        self.tags[0].recipe_set.remove(self.recipes[0])
+        self.assertEqual(self.counts(), [1, 0, 0])
+
+        self.tags[0].recipe_set.clear()
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+    def test_delete_recipes(self):
+        """Test deleting recipes, one and in bulk"""
+        ingredient = models.Ingredient.objects.create(
+            user=self.user, name='Salt')
+        for recipe in self.recipes:
+            recipe.tags.add(*self.tags[:2])
+            recipe.ingredients.add(ingredient)
+
+        self.recipes[0].delete()
+        self.assertEqual(self.counts(), [1, 1, 0])
+
+        models.Recipe.objects.all().delete()
+        self.assertEqual(self.counts(), [0, 0, 0])
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
+
+    def test_bulk_delete(self):
+        """Test a batch of recipes is uncounted with one UPDATE per model"""
+        ingredient = models.Ingredient.objects.create(
+            user=self.user, name='Salt')
+        for recipe in self.recipes:
+            recipe.tags.add(*self.tags[:2])
+            recipe.ingredients.add(ingredient)
+        ids = [recipe.id for recipe in self.recipes]
+
+        with self.assertNumQueries(2):
+            signals.uncount_recipes(ids, 'default')
+        self.assertEqual(self.counts(), [0, 0, 0])
+
+        with CaptureQueriesContext(connection) as queries, \
+                signals.bulk_delete():
+            models.Recipe.objects.filter(pk__in=ids).delete()
+        # The per row receivers are skipped, nothing is decremented twice
+        self.assertFalse(
+            [query for query in queries if query['sql'].startswith('UPDATE')])
+        self.assertEqual(self.counts(), [0, 0, 0])
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
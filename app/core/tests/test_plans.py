@@ -0,0 +1,156 @@
+"""
+Test the plan capture and the plan regression checks
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections
+from django.test import SimpleTestCase, TestCase
+
+from core import plans
+from core.management.commands.explain_plans import Command
+
+
+def scan(node_type, relation, index=None):
+    node = {'Node Type': node_type, 'Relation Name': relation}
+    if index:
+        node['Index Name'] = index
+    return node
+
+
+def plan(*children, node_type='Nested Loop', **extra):
+    return {'Node Type': node_type, 'Plans': list(children), **extra}
+
+
+INDEXED = plan(
+    scan('Index Scan', 'core_recipe', 'core_recipe_user_id_idx'),
+    scan('Index Only Scan', 'core_recipe_tags', 'core_recipe_tags_pkey'),
+)
+
+
+class PlanShapeTests(SimpleTestCase):
+    """Test comparing plan shapes"""
+
+    def test_shape_drops_costs(self):
+        """Test the shape keeps the strategy and drops the numbers"""
+        node = dict(INDEXED, **{'Total Cost': 12.5, 'Actual Rows': 3})
+
+        shape = plans.plan_shape(node)
+
+        self.assertEqual(shape, {
+            'node': 'Nested Loop',
+            'children': [
+                {
+                    'node': 'Index Scan', 'relation': 'core_recipe',
+                    'index': 'core_recipe_user_id_idx',
+                },
+                {
+                    'node': 'Index Only Scan',
+                    'relation': 'core_recipe_tags',
+                    'index': 'core_recipe_tags_pkey',
+                },
+            ],
+        })
+        self.assertEqual(plans.format_shape(shape)[1], (
+            '  Index Scan relation=core_recipe '
+            'index=core_recipe_user_id_idx'))
+
+    def test_same_shape(self):
+        """Test an unchanged plan has no regressions"""
+        shape = plans.plan_shape(INDEXED)
+
+        self.assertEqual(plans.regressions(shape, shape), [])
+
+    def test_index_scan_becomes_seq_scan(self):
+        """Test losing an index is flagged"""
+        new = plan(
+            scan('Seq Scan', 'core_recipe'),
+            scan(
+                'Index Only Scan', 'core_recipe_tags',
+                'core_recipe_tags_pkey'),
+        )
+
+        problems = plans.regressions(
+            plans.plan_shape(INDEXED), plans.plan_shape(new))
+
+        self.assertEqual(
+            problems, ['core_recipe: Index Scan became a Seq Scan'])
+
+    def test_distinct_adds_work(self):
+        """Test a new sort or hash aggregate is flagged"""
+        new = plan(
+            plan(INDEXED, node_type='Aggregate', Strategy='Hashed'),
+            node_type='Sort',
+        )
+
+        problems = plans.regressions(
+            plans.plan_shape(INDEXED), plans.plan_shape(new))
+
+        self.assertEqual(problems, ['adds HashAggregate', 'adds Sort'])
+
+
+class HotQueriesTests(TestCase):
+    """Test the hot queries match the views"""
+
+    def test_hot_queries(self):
+        """Test the queries are built through the views"""
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+
+        queries = plans.hot_queries(user, [1, 2], [3])
+
+        self.assertIn('recipe_list_tags_ingredients', queries)
+        sql = str(queries['recipe_list_tags_ingredients'].query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('core_recipe_tags', sql)
+        self.assertIn('"price" >=', str(queries['recipe_list_range'].query))
+        self.assertIn(
+            'recipe_count', str(queries['tag_list_assigned_only'].query))
+        self.assertIn(
+            'ingredient_count', str(queries['recipe_pantry'].query))
+
+    def test_command_needs_postgres(self):
+        """Test the command refuses to run on other databases"""
+        with patch.object(connections['default'], 'vendor', 'sqlite'), \
+                self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+            call_command('explain_plans')
+
+
+class BaselineTests(SimpleTestCase):
+    """Test the baseline of the plan regression check"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'plan_shapes.json')
+        self.command = Command(stdout=StringIO(), stderr=StringIO())
+        self.shapes = {'recipe_list': plans.plan_shape(INDEXED)}
+
+    def test_missing_baseline_is_stored(self):
+        """Test the first run stores its shapes with a warning"""
+        self.command.check_baseline(self.path, self.shapes)
+
+        with open(self.path) as baseline_file:
+            self.assertEqual(json.load(baseline_file), self.shapes)
+        self.assertIn('No baseline', self.command.stderr.getvalue())
+
+    def test_regression_fails(self):
+        """Test a shape regressing from the baseline fails the check"""
+        self.command.save_baseline(self.path, self.shapes)
+        seq_scan = plan(
+            scan('Seq Scan', 'core_recipe'),
+            scan(
+                'Index Only Scan', 'core_recipe_tags',
+                'core_recipe_tags_pkey'),
+        )
+
+        self.command.check_baseline(self.path, self.shapes)
+        with self.assertRaisesMessage(CommandError, '1 plan regressions'):
+            self.command.check_baseline(
+                self.path, {'recipe_list': plans.plan_shape(seq_scan)})
@@ -0,0 +1,256 @@
+"""
+Test every endpoint stays within its query budget
+
+The budgets in query_budgets.json map each view and action to the
+maximum number of queries of one request, on every database. Each
+endpoint runs against 1 and 100 rows and must issue the same number of
+queries for both. When shards are configured the users are placed on
+one, with the shard directory cached like in a warm worker.
+"""
+import contextlib
+import io
+import json
+import os
+from decimal import Decimal
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import instrumentation, sharding, signals
+from core.models import Ingredient, Recipe, Tag
+from recipe import similar
+
+BUDGETS_FILE = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+# Two rows at least, so the similar recipes endpoint finds a match
+ROW_COUNTS = [2, 100]
+# The last shard, the default database without shards
+DATABASE = settings.SHARD_DATABASES[-1]
+
+
+def load_budgets():
+    with open(BUDGETS_FILE) as budgets_file:
+        return json.load(budgets_file)
+
+
+def image_file():
+    """Return a small uploaded JPEG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return SimpleUploadedFile('image.jpg', buffer.getvalue())
+
+
+class Fixture:
+    """A user owning rows recipes, tags and ingredients"""
+
+    def __init__(self, rows):
+        self.password = 'testpass123'
+        self.user = get_user_model().objects.create_user(
+            email=f'budget-{rows}@example.com', password=self.password)
+        self.token = Token.objects.create(user=self.user)
+        sharding.lookup(self.user.pk)
+        with sharding.using_shard(DATABASE):
+            self.create_objects(rows)
+
+    def create_objects(self, rows):
+        """Create the sharded objects of the user"""
+        self.tags = Tag.objects.bulk_create(
+            Tag(user=self.user, name=f'Tag {i}') for i in range(rows))
+        self.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=self.user, name=f'Ingredient {i}')
+            for i in range(rows))
+        Recipe.objects.bulk_create(
+            Recipe(
+                user=self.user, title=f'Recipe {i}', time_minutes=i,
+                price=Decimal('5.50'),
+            )
+            for i in range(rows)
+        )
+        # Not every backend returns primary keys from bulk_create
+        self.tags = list(Tag.objects.filter(user=self.user).order_by('id'))
+        self.ingredients = list(
+            Ingredient.objects.filter(user=self.user).order_by('id'))
+        self.recipes = list(
+            Recipe.objects.filter(user=self.user).order_by('id'))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in self.recipes for tag in self.tags[:3])
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe.id, ingredient_id=ingredient.id)
+            for recipe in self.recipes for ingredient in self.ingredients[:3])
+        # The bulk inserts skip the signals maintaining the counts
+        signals.recount(Tag.objects.filter(user=self.user))
+        signals.recount(Ingredient.objects.filter(user=self.user))
+        signals.recount_ingredients(Recipe.objects.filter(user=self.user))
+        similar.build([recipe.id for recipe in self.recipes])
+
+    @property
+    def recipe(self):
+        return self.recipes[0]
+
+    def ids(self, objs):
+        return ','.join(str(obj.id) for obj in objs[:3])
+
+
+RECIPE_PAYLOAD = {
+    'title': 'Budget recipe',
+    'time_minutes': 20,
+    'price': '3.20',
+    'tags': [{'name': 'Tag 0'}, {'name': 'New tag'}],
+    'ingredients': [{'name': 'Ingredient 0'}, {'name': 'Salt'}],
+}
+
+# (budget key, case, method, url, request kwargs), the callables take
+# the fixture
+ENDPOINTS = [
+    ('RecipeViewSet.list', 'plain', 'get',
+     lambda f: reverse('recipe:recipe-list'), None),
+    ('RecipeViewSet.list', 'filtered', 'get',
+     lambda f: reverse('recipe:recipe-list'),
+     lambda f: {'data': {
+         'tags': f.ids(f.tags), 'ingredients': f.ids(f.ingredients)}}),
+    ('RecipeViewSet.retrieve', '', 'get',
+     lambda f: reverse('recipe:recipe-detail', args=[f.recipe.id]), None),
+    ('RecipeViewSet.similar', '', 'get',
+     lambda f: reverse('recipe:recipe-similar', args=[f.recipe.id]), None),
+    ('RecipeViewSet.pantry', '', 'get',
+     lambda f: reverse('recipe:recipe-pantry'),
+     lambda f: {'data': {
+         'ingredients': f.ids(f.ingredients), 'max_missing': 1}}),
+    ('RecipeViewSet.create', '', 'post',
+     lambda f: reverse('recipe:recipe-list'),
+     lambda f: {'data': RECIPE_PAYLOAD, 'format': 'json'}),
+    ('RecipeViewSet.update', '', 'put',
+     lambda f: reverse('recipe:recipe-detail', args=[f.recipe.id]),
+     lambda f: {'data': RECIPE_PAYLOAD, 'format': 'json'}),
+    ('RecipeViewSet.partial_update', '', 'patch',
+     lambda f: reverse('recipe:recipe-detail', args=[f.recipe.id]),
+     lambda f: {'data': {'title': 'Renamed'}, 'format': 'json'}),
+    ('RecipeViewSet.destroy', '', 'delete',
+     lambda f: reverse('recipe:recipe-detail', args=[f.recipe.id]), None),
+    ('RecipeViewSet.upload_image', '', 'post',
+     lambda f: reverse('recipe:recipe-upload-image', args=[f.recipe.id]),
+     lambda f: {'data': {'image': image_file()}, 'format': 'multipart'}),
+    ('upload_image', '', 'post',
+     lambda f: reverse(
+         'recipe:recipe-upload-image-async', args=[f.recipe.id]),
+     lambda f: {'data': {'image': image_file()}, 'format': 'multipart'}),
+    ('export_recipes', '', 'get',
+     lambda f: reverse('recipe:recipe-export'), None),
+    ('TagViewSet.list', 'plain', 'get',
+     lambda f: reverse('recipe:tag-list'), None),
+    ('TagViewSet.list', 'assigned_only', 'get',
+     lambda f: reverse('recipe:tag-list'),
+     lambda f: {'data': {'assigned_only': 1}}),
+    ('TagViewSet.partial_update', '', 'patch',
+     lambda f: reverse('recipe:tag-detail', args=[f.tags[0].id]),
+     lambda f: {'data': {'name': 'Renamed'}, 'format': 'json'}),
+    ('TagViewSet.destroy', '', 'delete',
+     lambda f: reverse('recipe:tag-detail', args=[f.tags[0].id]), None),
+    ('IngredientViewSet.list', 'plain', 'get',
+     lambda f: reverse('recipe:ingredient-list'), None),
+    ('IngredientViewSet.list', 'assigned_only', 'get',
+     lambda f: reverse('recipe:ingredient-list'),
+     lambda f: {'data': {'assigned_only': 1}}),
+    ('IngredientViewSet.partial_update', '', 'patch',
+     lambda f: reverse(
+         'recipe:ingredient-detail', args=[f.ingredients[0].id]),
+     lambda f: {'data': {'name': 'Renamed'}, 'format': 'json'}),
+    ('IngredientViewSet.destroy', '', 'delete',
+     lambda f: reverse(
+         'recipe:ingredient-detail', args=[f.ingredients[0].id]),
+     None),
+    ('CreateUserView.post', '', 'post',
+     lambda f: reverse('user:create'),
+     lambda f: {'data': {
+         'email': 'new@example.com', 'password': 'testpass123',
+         'name': 'New',
+     }}),
+    ('CreateTokenView.post', '', 'post',
+     lambda f: reverse('user:token'),
+     lambda f: {'data': {'email': f.user.email, 'password': f.password}}),
+    ('ManagerUserView.get', '', 'get', lambda f: reverse('user:me'), None),
+    ('ManagerUserView.patch', '', 'patch',
+     lambda f: reverse('user:me'), lambda f: {'data': {'name': 'Renamed'}}),
+    ('ManagerUserView.delete', '', 'delete',
+     lambda f: reverse('user:me'), None),
+]
+
+
+@contextlib.contextmanager
+def rolled_back():
+    """Roll back the writes of the block on every database"""
+    with contextlib.ExitStack() as stack:
+        for database in settings.SHARD_DATABASES:
+            stack.enter_context(transaction.atomic(using=database))
+        yield
+        for database in settings.SHARD_DATABASES:
+            transaction.set_rollback(True, using=database)
+
+
+@override_settings(
+    ASYNC_ORM_THREADS=0, SHARD_PLACEMENT_DATABASES=[DATABASE],
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+)
+class QueryBudgetTests(TestCase):
+    """Test the query counts of every endpoint"""
+
+    databases = set(settings.SHARD_DATABASES)
+
+    def run_endpoint(self, endpoint, rows):
+        """Return the view name and query count of a request"""
+        key, case, method, url, kwargs = endpoint
+        with rolled_back():
+            fixture = Fixture(rows)
+            client = APIClient()
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {fixture.token.key}')
+            request_kwargs = kwargs(fixture) if kwargs else {}
+            with contextlib.ExitStack() as stack:
+                captures = [
+                    stack.enter_context(
+                        CaptureQueriesContext(connections[database]))
+                    for database in settings.SHARD_DATABASES
+                ]
+                res = getattr(client, method)(url(fixture), **request_kwargs)
+
+        self.assertLess(res.status_code, 400, f'{key} {case}')
+        view = instrumentation.view_name(
+            res.resolver_match.func, res.wsgi_request)
+        return view, sum(len(queries) for queries in captures)
+
+    def test_budgets_cover_every_endpoint(self):
+        """Test the budget file lists exactly the exercised views"""
+        self.assertEqual(
+            set(load_budgets()), {endpoint[0] for endpoint in ENDPOINTS})
+
+    def test_query_budgets(self):
+        """Test the query counts are within budget and row independent"""
+        budgets = load_budgets()
+        for endpoint in ENDPOINTS:
+            key, case = endpoint[:2]
+            with self.subTest(endpoint=f'{key} {case}'.strip()):
+                counts = {}
+                for rows in ROW_COUNTS:
+                    view, counts[rows] = self.run_endpoint(endpoint, rows)
+                    self.assertEqual(view, key)
+                    self.assertLessEqual(
+                        counts[rows], budgets[key],
+                        f'{key} {case} ran {counts[rows]} queries with '
+                        f'{rows} rows, the budget is {budgets[key]}',
+                    )
+                self.assertEqual(
+                    len(set(counts.values())), 1,
+                    f'{key} {case} query count grows with the rows: '
+                    f'{counts}',
+                )
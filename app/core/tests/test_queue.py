@@ -0,0 +1,130 @@
+"""
+Test the background task queue
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import queue
+from core.models import Task
+
+calls = []
+
+
+@queue.task(max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@queue.task(max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+@override_settings(TASKS_EAGER=False, TASK_RETRY_DELAY=10)
+class QueueTests(TestCase):
+    """Test queueing and running the tasks"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue(self):
+        """Test a task is stored with its arguments"""
+        task = record.enqueue(value=[1, 2])
+
+        self.assertEqual(task.name, 'core.tests.test_queue.record')
+        self.assertEqual(task.kwargs, {'value': [1, 2]})
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(task.max_attempts, 2)
+        self.assertEqual(calls, [])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager(self):
+        """Test eager mode runs the task inline"""
+        self.assertIsNone(record.enqueue(value=1))
+
+        self.assertEqual(calls, [1])
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_worker(self):
+        """Test the worker runs the due tasks and deletes them"""
+        record.enqueue(value=1)
+        record.enqueue(value=2)
+        queue.enqueue(
+            record, {'value': 3},
+            run_at=timezone.now() + timedelta(hours=1))
+        out = StringIO()
+
+        with patch('core.management.commands.run_worker'
+                   '.close_old_connections'), \
+                self.assertLogs('core.queue', 'INFO') as logs:
+            call_command('run_worker', concurrency=1, burst=True, stdout=out)
+
+        self.assertEqual(calls, [1, 2])
+        self.assertIn('Ran 2 tasks', out.getvalue())
+        self.assertIn('"event":"task_done"', logs.output[0])
+        self.assertEqual(Task.objects.get().kwargs, {'value': 3})
+
+    def test_retry_with_backoff(self):
+        """Test a failed task is retried later, then kept as failed"""
+        task = explode.enqueue()
+
+        with self.assertLogs('core.queue', 'WARNING'):
+            self.assertEqual(queue.run_pending(), 1)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('ValueError: boom', task.last_error)
+        delay = (task.run_at - timezone.now()).total_seconds()
+        self.assertTrue(5 < delay <= 15)
+
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.queue', 'ERROR'):
+            queue.run_pending()
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+        self.assertEqual(queue.run_pending(), 0)
+
+    def test_retry_delay_doubles(self):
+        """Test the delay doubles with every attempt"""
+        with patch('random.uniform', return_value=1):
+            delays = [queue.retry_delay(n) for n in range(1, 4)]
+
+        self.assertEqual(delays, [10, 20, 40])
+
+    @override_settings(TASK_TIMEOUT=60)
+    def test_stale_task_reclaimed(self):
+        """Test a task left running by a dead worker runs again"""
+        task = record.enqueue(value=1)
+        Task.objects.update(
+            status=Task.RUNNING, attempts=1, locked_by='dead',
+            locked_at=timezone.now() - timedelta(seconds=30))
+
+        self.assertIsNone(queue.claim('worker'))
+
+        Task.objects.update(locked_at=timezone.now() - timedelta(minutes=5))
+        claimed = queue.claim('worker')
+
+        self.assertEqual(claimed.pk, task.pk)
+        self.assertEqual(claimed.attempts, 2)
+        self.assertEqual(claimed.locked_by, 'worker')
+
+    def test_unknown_task_fails(self):
+        """Test a task without a function fails at once"""
+        Task.objects.create(
+            name='core.tasks.missing', run_at=timezone.now(),
+            max_attempts=5)
+
+        with self.assertLogs('core.queue', 'ERROR'):
+            queue.run_pending()
+
+        task = Task.objects.get()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('Unknown task', task.last_error)
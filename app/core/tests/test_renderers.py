@@ -0,0 +1,142 @@
+"""
+Test the API renderers and parsers
+"""
+import datetime
+import io
+from decimal import Decimal
+
+import msgpack
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RendererTests(SimpleTestCase):
+    """Test rendering and parsing payloads"""
+
+    def test_orjson_matches_json_renderer(self):
+        """Test orjson output is identical to the DRF JSON renderer"""
+        data = [{'id': 1, 'title': 'Crêpes', 'price': '5.50', 'tags': []}]
+
+        self.assertEqual(
+            ORJSONRenderer().render(data),
+            JSONRenderer().render(data),
+        )
+
+    def test_orjson_matches_json_renderer_edge_cases(self):
+        """Test timestamps and line separators render like DRF"""
+        data = {
+            'created': datetime.datetime(
+                2022, 10, 1, 12, 30, 15, 123456,
+                tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2022, 10, 1, 12, 30, 15, 987654),
+            'offset': datetime.datetime(
+                2022, 10, 1, 12, 30, 15, 500,
+                tzinfo=datetime.timezone(datetime.timedelta(hours=2))),
+            'day': datetime.date(2022, 10, 1),
+            'time': datetime.time(12, 30, 15, 250000),
+            'description': 'line\u2028paragraph\u2029end',
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data),
+            JSONRenderer().render(data),
+        )
+
+    def test_orjson_native_types(self):
+        """Test decimals and datetimes are rendered"""
+        data = {
+            'price': Decimal('5.50'),
+            'created': datetime.datetime(
+                2022, 10, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        }
+
+        res = ORJSONRenderer().render(data)
+
+        self.assertEqual(
+            res, b'{"price":5.5,"created":"2022-10-01T12:30:00Z"}')
+
+    def test_orjson_indent(self):
+        """Test pretty printing is honoured"""
+        res = ORJSONRenderer().render(
+            {'id': 1}, 'application/json; indent=4')
+
+        self.assertEqual(res, b'{\n  "id": 1\n}')
+
+    def test_render_none(self):
+        """Test empty responses render to an empty body"""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+        self.assertEqual(MessagePackRenderer().render(None), b'')
+
+    def test_msgpack_round_trip(self):
+        """Test msgpack payloads round trip through the parser"""
+        data = {'title': 'Soup', 'price': Decimal('2.25'), 'tags': [1, 2]}
+
+        body = MessagePackRenderer().render(data)
+        res = MessagePackParser().parse(io.BytesIO(body))
+
+        self.assertEqual(res, {'title': 'Soup', 'price': 2.25, 'tags': [1, 2]})
+
+    def test_invalid_payloads(self):
+        """Test malformed bodies raise a parse error"""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
+
+
+class ContentNegotiationTests(TestCase):
+    """Test the API negotiates JSON and MessagePack"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_json_is_default(self):
+        """Test JSON is served without an Accept header"""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+
+    def test_msgpack_response(self):
+        """Test msgpack is served when accepted"""
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5,
+            price=Decimal('2.50'))
+
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), res.data)
+
+    def test_msgpack_request(self):
+        """Test a recipe can be created from a msgpack body"""
+        payload = {
+            'title': 'Curry',
+            'time_minutes': 30,
+            'price': '4.20',
+            'tags': [{'name': 'Thai'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.price, Decimal('4.20'))
+        self.assertEqual(recipe.tags.get().name, 'Thai')
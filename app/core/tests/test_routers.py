@@ -0,0 +1,171 @@
+"""
+Test the routing of the reads to the replicas
+"""
+import asyncio
+import time
+from unittest.mock import MagicMock, patch
+
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import routers
+from core.authentication import CountedTokenAuthentication
+from core.middleware import ReplicaRoutingMiddleware
+from core.models import Recipe
+
+REPLICAS = ['replica_1', 'replica_2']
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class ReplicaRouterTests(SimpleTestCase):
+    """Test choosing the database of a query"""
+
+    def setUp(self):
+        routers._health.clear()
+        self.router = routers.ReplicaRouter()
+
+    def read(self):
+        with routers.use_replicas():
+            return self.router.db_for_read(Recipe)
+
+    def test_reads_primary_by_default(self):
+        """Test reads outside use_replicas go to the primary"""
+        with patch.object(routers, 'replica_lag', return_value=0):
+            self.assertEqual(self.router.db_for_read(Recipe), 'default')
+            self.assertIn(self.read(), REPLICAS)
+
+    def test_writes_primary(self):
+        """Test writes and migrations stay on the primary"""
+        with routers.use_replicas():
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'core'))
+        self.assertIsNone(self.router.allow_migrate('default', 'core'))
+
+    def test_lagging_replica_skipped(self):
+        """Test a replica behind the primary takes no reads"""
+        def lag(alias):
+            return 10 if alias == 'replica_1' else 0
+
+        with patch.object(routers, 'replica_lag', side_effect=lag), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertEqual({self.read() for _ in range(20)}, {'replica_2'})
+
+    def test_all_replicas_down(self):
+        """Test the reads fall back to the primary"""
+        connections = MagicMock()
+        connections.__getitem__.return_value.in_atomic_block = False
+        with patch.object(
+                routers, 'replica_lag', side_effect=DatabaseError('down')), \
+                patch.object(routers, 'connections', connections), \
+                self.assertLogs('core.routers', 'WARNING'):
+            self.assertEqual(self.read(), 'default')
+
+    def test_health_checks_cached(self):
+        """Test each replica is checked once per interval"""
+        with patch.object(routers, 'replica_lag', return_value=0) as lag:
+            for _ in range(10):
+                self.read()
+
+        self.assertEqual(lag.call_count, len(REPLICAS))
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class ReplicaRoutingMiddlewareTests(TransactionTestCase):
+    """Test the requests allowed to read from the replicas
+
+    The async stack marks the writes from pool threads, on their own
+    connections, so the marks are committed.
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.routed = []
+
+        def get_response(request):
+            self.routed.append(routers.reading_replicas())
+            return HttpResponse()
+
+        self.middleware = ReplicaRoutingMiddleware(get_response)
+
+    def send(self, method, token='abc'):
+        request = getattr(self.factory, method)(
+            '/api/recipe/recipe/', HTTP_AUTHORIZATION=f'Token {token}')
+        self.middleware(request)
+        return self.routed[-1]
+
+    async def asend(self, middleware, method, token='abc'):
+        request = getattr(self.factory, method)(
+            '/api/recipe/recipe/', HTTP_AUTHORIZATION=f'Token {token}')
+        await middleware(request)
+        return self.routed[-1]
+
+    def test_safe_requests_read_replicas(self):
+        """Test GET requests read from the replicas, writes do not"""
+        self.assertTrue(self.send('get'))
+        self.assertFalse(self.send('post'))
+
+    def test_read_your_writes(self):
+        """Test a client reads from the primary after writing"""
+        self.send('patch')
+
+        self.assertFalse(self.send('get'))
+        self.assertTrue(self.send('get', token='other'))
+
+    async def test_async_stack(self):
+        """Test the routing under ASGI, without leaving the event loop"""
+        async def get_response(request):
+            self.routed.append(routers.reading_replicas())
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        self.assertTrue(await self.asend(middleware, 'get'))
+        self.assertFalse(await self.asend(middleware, 'post'))
+        self.assertFalse(await self.asend(middleware, 'get'))
+        self.assertTrue(await self.asend(middleware, 'get', token='other'))
+
+    @override_settings(READ_YOUR_WRITES_SECONDS=0.001)
+    def test_stickiness_expires(self):
+        """Test the client goes back to the replicas after the window"""
+        self.send('delete')
+        time.sleep(0.01)
+
+        self.assertTrue(self.send('get'))
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_no_replicas(self):
+        """Test nothing is routed without replicas"""
+        self.assertFalse(self.send('get'))
+
+
+@override_settings(REPLICA_DATABASES=REPLICAS)
+class TokenFallbackTests(SimpleTestCase):
+    """Test a token missing on a replica is looked up on the primary"""
+
+    def test_token_fallback(self):
+        seen = []
+
+        def authenticate(key):
+            seen.append(routers.reading_replicas())
+            if len(seen) == 1:
+                raise AuthenticationFailed('Invalid token.')
+            return 'user', key
+
+        with patch.object(
+                TokenAuthentication, 'authenticate_credentials',
+                side_effect=authenticate), routers.use_replicas():
+            result = CountedTokenAuthentication().authenticate_credentials(
+                'key')
+
+        self.assertEqual(result, ('user', 'key'))
+        self.assertEqual(seen, [True, False])
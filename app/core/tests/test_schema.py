@@ -0,0 +1,75 @@
+"""
+Test the cached OpenAPI schema
+"""
+import json
+import os
+from io import StringIO
+import tempfile
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.views import clear_schema_cache
+
+SCHEMA_URL = reverse('api-schema')
+MISSING_FILE = os.path.join(tempfile.gettempdir(), 'missing-schema.json')
+
+
+@override_settings(SCHEMA_FILE=MISSING_FILE)
+class CachedSchemaTests(TestCase):
+    """Test serving the schema"""
+
+    def setUp(self):
+        clear_schema_cache()
+        self.client = APIClient()
+
+    def tearDown(self):
+        clear_schema_cache()
+
+    def test_schema_generated_once(self):
+        """Test the schema is generated on first request only"""
+        with patch(
+            'drf_spectacular.generators.SchemaGenerator.get_schema',
+            return_value={'openapi': '3.0.3'},
+        ) as get_schema:
+            self.client.get(SCHEMA_URL)
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(res.content), {'openapi': '3.0.3'})
+        get_schema.assert_called_once()
+
+    def test_cache_headers(self):
+        """Test the schema is served with an ETag and Cache-Control"""
+        res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', res)
+        self.assertIn('max-age=', res['Cache-Control'])
+
+        res = self.client.get(SCHEMA_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_schema_served_from_file(self):
+        """Test a schema built by the command is served from disk"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'schema.json')
+            call_command('build_schema', file=path, stdout=StringIO())
+            with open(path) as schema_file:
+                built = json.load(schema_file)
+
+            with override_settings(SCHEMA_FILE=path), patch(
+                'drf_spectacular.generators.SchemaGenerator.get_schema',
+            ) as get_schema:
+                res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        self.assertEqual(json.loads(res.content), built)
+        self.assertIn('/api/recipe/recipe/', built['paths'])
+        get_schema.assert_not_called()
@@ -0,0 +1,163 @@
+"""
+Test placing and routing the user objects across shards
+"""
+import io
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import routers, sharding
+from core.models import Recipe, Tag, User, UserShard
+
+SHARDS = ['default', 'shard_1', 'shard_2']
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class HashRingTests(SimpleTestCase):
+    """Test the placement of the new users"""
+
+    def test_spread(self):
+        """Test every node gets a fair share of the keys"""
+        ring = sharding.HashRing(SHARDS)
+
+        counts = {node: 0 for node in SHARDS}
+        for key in range(3000):
+            counts[ring.node(key)] += 1
+
+        for count in counts.values():
+            self.assertGreater(count, 700)
+
+    def test_adding_node_moves_few_keys(self):
+        """Test a new node only takes keys from the others"""
+        before = sharding.HashRing(SHARDS)
+        after = sharding.HashRing(SHARDS + ['shard_3'])
+
+        moved = [
+            key for key in range(3000)
+            if before.node(key) != after.node(key)
+        ]
+
+        self.assertLess(len(moved), 1200)
+        self.assertEqual({after.node(key) for key in moved}, {'shard_3'})
+
+    @override_settings(
+        SHARD_DATABASES=SHARDS, SHARD_PLACEMENT_DATABASES=['shard_2'])
+    def test_placement_databases(self):
+        """Test the new users only go to the placement databases"""
+        self.assertEqual(
+            {sharding.place(user_id) for user_id in range(100)}, {'shard_2'})
+
+
+@override_settings(SHARD_DATABASES=SHARDS)
+class ShardRouterTests(SimpleTestCase):
+    """Test the sharded models follow the active shard"""
+
+    def setUp(self):
+        self.router = routers.ShardRouter()
+
+    def test_active_shard(self):
+        """Test the sharded models and their m2m tables are routed"""
+        with sharding.using_shard('shard_2'):
+            for model in sharding.sharded_models():
+                self.assertEqual(self.router.db_for_read(model), 'shard_2')
+                self.assertEqual(self.router.db_for_write(model), 'shard_2')
+            self.assertIsNone(self.router.db_for_read(User))
+
+    def test_default_shard(self):
+        """Test the default shard is left to the replica router"""
+        with sharding.using_shard('default'):
+            self.assertIsNone(self.router.db_for_read(Recipe))
+        self.assertIsNone(self.router.db_for_write(Recipe))
+
+    def test_instance_hint(self):
+        """Test an object loaded from a shard is saved back to it"""
+        tag = Tag(name='Vegan')
+        tag._state.db = 'shard_1'
+
+        self.assertEqual(
+            self.router.db_for_write(Tag, instance=tag), 'shard_1')
+
+
+@unittest.skipUnless(
+    'shard_1' in settings.SHARD_DATABASES, 'needs a shard_1 database')
+class ShardedApiTests(TestCase):
+    """Test the API against a user placed on another shard"""
+
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        caches['default'].clear()
+        with patch.object(sharding, 'place', return_value='shard_1'):
+            self.user = get_user_model().objects.create_user(
+                email='user@example.com', password='testpass123')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def create_recipe(self):
+        return self.client.post(RECIPES_URL, {
+            'title': 'Curry', 'time_minutes': 30, 'price': '5.00',
+            'tags': [{'name': 'Spicy'}],
+        }, format='json')
+
+    def test_objects_on_shard(self):
+        """Test the recipes of the user are written to its shard"""
+        res = self.create_recipe()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Recipe.objects.using('default').exists())
+        recipe = Recipe.objects.using('shard_1').get()
+        self.assertGreater(recipe.id, sharding.ID_RANGE)
+        self.assertEqual(recipe.tags.get().name, 'Spicy')
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
+
+    def test_stub_user_on_shard(self):
+        """Test the shard only holds a stub of the user"""
+        stub = User.objects.using('shard_1').get(pk=self.user.pk)
+
+        self.assertEqual(stub.email, f'{self.user.pk}@shard.invalid')
+        self.assertFalse(stub.has_usable_password())
+        self.assertFalse(stub.is_active)
+        sharding.add_stub_user(self.user, 'shard_1')
+        self.assertEqual(User.objects.using('shard_1').count(), 1)
+
+    def test_writes_refused_while_moving(self):
+        """Test writes get a 503 while the user is moved, reads work"""
+        UserShard.objects.filter(user=self.user).update(read_only=True)
+
+        self.assertEqual(
+            self.create_recipe().status_code,
+            status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(
+            self.client.get(RECIPES_URL).status_code, status.HTTP_200_OK)
+
+    def test_move_user(self):
+        """Test the command moves the objects with their ids"""
+        self.create_recipe()
+        recipe = Recipe.objects.using('shard_1').get()
+
+        call_command(
+            'move_user_shard', self.user.email, 'default', settle=0,
+            stdout=io.StringIO())
+
+        self.assertFalse(Recipe.objects.using('shard_1').exists())
+        moved = Recipe.objects.using('default').get()
+        self.assertEqual(moved.id, recipe.id)
+        self.assertEqual(moved.price, Decimal('5.00'))
+        self.assertEqual(moved.tags.get().name, 'Spicy')
+        self.assertEqual(
+            UserShard.objects.get(user=self.user).database, 'default')
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual([item['id'] for item in res.data], [recipe.id])
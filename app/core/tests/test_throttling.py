@@ -0,0 +1,133 @@
+"""
+Test the request throttles
+"""
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core.throttling import SharedRateThrottle
+
+TOKEN_URL = reverse('user:token')
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def throttle_rates(**rates):
+    """Return the REST_FRAMEWORK settings with the given rates"""
+    from django.conf import settings
+
+    options = dict(settings.REST_FRAMEWORK)
+    options['DEFAULT_THROTTLE_RATES'] = {
+        **api_settings.DEFAULT_THROTTLE_RATES, **rates}
+    return options
+
+
+class ThrottleTests(TestCase):
+    """Test the API budgets"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        files = override_settings(THROTTLE_FILE_DIRECTORY=directory.name)
+        files.enable()
+        self.addCleanup(files.disable)
+        # A test crossing a window boundary would start a new budget
+        timer = patch.object(
+            SharedRateThrottle, 'timer', return_value=1_000_000.0)
+        timer.start()
+        self.addCleanup(timer.stop)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_read_budget(self):
+        """Test reads over the budget get a 429 with Retry-After"""
+        with override_settings(REST_FRAMEWORK=throttle_rates(read='2/min')):
+            for _ in range(2):
+                res = self.client.get(TAGS_URL)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(1 <= int(res['Retry-After']) <= 60)
+
+    def test_reads_counted_off_the_database(self):
+        """Test the read budget does not write to the primary"""
+        with override_settings(REST_FRAMEWORK=throttle_rates(read='2/min')):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(TAGS_URL)
+            self.client.get(TAGS_URL)
+            res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(any(
+            'sharedcounter' in query['sql'] for query in queries))
+
+    def test_budgets_are_separate(self):
+        """Test reads, writes and each user have their own budget"""
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        rates = throttle_rates(read='1/min', write='1/min')
+        with override_settings(REST_FRAMEWORK=rates):
+            self.client.get(TAGS_URL)
+            res_write = self.client.post(RECIPES_URL, {})
+            self.client.force_authenticate(other)
+            res_other = self.client.get(TAGS_URL)
+
+        self.assertEqual(res_write.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res_other.status_code, status.HTTP_200_OK)
+
+    def test_login_throttled_before_password_check(self):
+        """Test throttled logins never reach the password hasher"""
+        self.client.force_authenticate(None)
+        payload = {'email': 'user@example.com', 'password': 'wrong'}
+        rates = throttle_rates(login='100/min', login_account='2/min')
+        with override_settings(REST_FRAMEWORK=rates):
+            for _ in range(2):
+                self.client.post(TOKEN_URL, payload)
+            with patch(
+                    'user.serializers.authenticate', return_value=None,
+            ) as authenticate:
+                res = self.client.post(TOKEN_URL, payload)
+                other = self.client.post(
+                    TOKEN_URL,
+                    {'email': 'other@example.com', 'password': 'wrong'},
+                )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(other.status_code, status.HTTP_400_BAD_REQUEST)
+        authenticate.assert_called_once()
+
+    def test_login_budget_per_ip(self):
+        """Test a client IP can not spray logins over many accounts"""
+        self.client.force_authenticate(None)
+        rates = throttle_rates(login='2/min')
+        with override_settings(REST_FRAMEWORK=rates):
+            for i in range(2):
+                self.client.post(
+                    TOKEN_URL, {'email': f'{i}@example.com', 'password': 'x'})
+            res = self.client.post(
+                TOKEN_URL, {'email': 'x@example.com', 'password': 'x'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_login_body_not_an_object(self):
+        """Test a list or scalar login body is rejected, not a 500"""
+        self.client.force_authenticate(None)
+        rates = throttle_rates(login='100/min', login_account='2/min')
+        with override_settings(REST_FRAMEWORK=rates):
+            for body in [['user@example.com'], 'user@example.com', 1]:
+                res = self.client.post(TOKEN_URL, body, format='json')
+
+                self.assertEqual(
+                    res.status_code, status.HTTP_400_BAD_REQUEST)
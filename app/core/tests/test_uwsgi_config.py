@@ -0,0 +1,126 @@
+"""
+Test the uwsgi configuration derived from the cgroup limits
+"""
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from app import uwsgi_config
+
+GB = 1024 * uwsgi_config.MB
+
+
+def write(root, path, content):
+    """Write a fake cgroup file"""
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as cgroup_file:
+        cgroup_file.write(content)
+
+
+@patch('app.uwsgi_config.available_cpus', return_value=16)
+class CgroupLimitTests(SimpleTestCase):
+    """Test reading the container limits"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cgroup_v2(self, patched_cpus):
+        """Test reading the cgroup v2 quota and memory limit"""
+        write(self.root, 'cpu.max', '250000 100000\n')
+        write(self.root, 'memory.max', f'{2 * GB}\n')
+
+        self.assertEqual(uwsgi_config.cpu_limit(self.root), 3)
+        self.assertEqual(uwsgi_config.memory_limit(self.root), 2 * GB)
+
+    def test_cgroup_v1(self, patched_cpus):
+        """Test reading the cgroup v1 quota and memory limit"""
+        write(self.root, 'cpu/cpu.cfs_quota_us', '100000\n')
+        write(self.root, 'cpu/cpu.cfs_period_us', '100000\n')
+        write(self.root, 'memory/memory.limit_in_bytes', f'{GB}\n')
+
+        self.assertEqual(uwsgi_config.cpu_limit(self.root), 1)
+        self.assertEqual(uwsgi_config.memory_limit(self.root), GB)
+
+    def test_unlimited(self, patched_cpus):
+        """Test falling back to the host without limits"""
+        write(self.root, 'cpu.max', 'max 100000\n')
+        write(self.root, 'memory.max', 'max\n')
+
+        self.assertEqual(uwsgi_config.cpu_limit(self.root), 16)
+        self.assertGreater(uwsgi_config.memory_limit(self.root), 0)
+
+
+class BuildOptionsTests(SimpleTestCase):
+    """Test the generated uwsgi options"""
+
+    def test_scaled_to_limits(self):
+        """Test processes follow the CPUs and memory"""
+        options = uwsgi_config.build_options(
+            env={}, cpus=4, memory=4 * GB, max_listen=4096)
+
+        self.assertEqual(options['processes'], 8)
+        self.assertEqual(options['threads'], 4)
+        self.assertEqual(options['offload-threads'], 2)
+        self.assertEqual(options['listen'], 1024)
+        self.assertEqual(options['reload-on-rss'], 300)
+        self.assertNotIn('lazy-apps', options)
+        self.assertEqual(options['touch-reload'], '/tmp/uwsgi-reload')
+
+    def test_memory_caps_processes(self):
+        """Test a small memory limit lowers the process count"""
+        options = uwsgi_config.build_options(
+            env={}, cpus=8, memory=512 * uwsgi_config.MB, max_listen=128)
+
+        self.assertEqual(options['processes'], 2)
+        self.assertEqual(options['listen'], 128)
+        self.assertEqual(options['reload-on-rss'], 204)
+
+    def test_env_overrides(self):
+        """Test every value can be set from the environment"""
+        env = {
+            'UWSGI_PROCESSES': '3',
+            'UWSGI_THREADS': '8',
+            'UWSGI_HARAKIRI': '60',
+            'UWSGI_SOCKET': ':9100',
+        }
+        options = uwsgi_config.build_options(
+            env=env, cpus=2, memory=8 * GB, max_listen=1024)
+
+        self.assertEqual(options['processes'], 3)
+        self.assertEqual(options['threads'], 8)
+        self.assertEqual(options['harakiri'], 60)
+        self.assertEqual(options['socket'], ':9100')
+
+    def test_lazy_apps(self):
+        """Test chain reloads are opt-in, they give up the preloading"""
+        options = uwsgi_config.build_options(
+            env={'UWSGI_LAZY_APPS': '1'}, cpus=2, memory=8 * GB,
+            max_listen=1024)
+
+        self.assertTrue(options['lazy-apps'])
+        self.assertEqual(options['touch-chain-reload'], '/tmp/uwsgi-reload')
+        self.assertNotIn('touch-reload', options)
+
+    def test_metrics_dir_wiped(self):
+        """Test the master removes the metric files of the last run"""
+        options = uwsgi_config.build_options(
+            env={}, cpus=2, memory=8 * GB, max_listen=1024)
+        self.assertNotIn('exec-asap', options)
+
+        options = uwsgi_config.build_options(
+            env={'PROMETHEUS_MULTIPROC_DIR': '/tmp/metrics'}, cpus=2,
+            memory=8 * GB, max_listen=1024)
+        self.assertEqual(options['exec-asap'], 'rm -f /tmp/metrics/*.db')
+
+    def test_render_ini(self):
+        """Test rendering the ini file"""
+        ini = uwsgi_config.render_ini({'master': True, 'processes': 2})
+
+        self.assertEqual(ini, '[uwsgi]\nmaster = true\nprocesses = 2\n')
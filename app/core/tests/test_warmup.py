@@ -0,0 +1,69 @@
+"""
+Test the application warmup
+"""
+from unittest.mock import MagicMock, patch
+
+from django.db import OperationalError
+from django.test import TestCase
+
+from app import warmup
+
+
+class WarmupTests(TestCase):
+    """Test the warmup steps"""
+
+    # The workers connect to the replicas too, when configured
+    databases = '__all__'
+
+    @patch('app.warmup.connections')
+    def test_preload_closes_connections(self, patched_connections):
+        """Test preload runs every step and closes the connections"""
+        with patch('core.views.CachedSchemaView._get_schema'), \
+                self.assertLogs('app.warmup', 'INFO'):
+            durations = warmup.preload()
+
+        self.assertEqual(
+            list(durations), [name for name, _ in warmup.PRELOAD_STEPS])
+        patched_connections.close_all.assert_called_once()
+
+    def test_warm_worker(self):
+        """Test the worker warmup runs every step"""
+        with self.assertLogs('app.warmup', 'INFO'):
+            durations = warmup.warm_worker()
+
+        self.assertEqual(
+            list(durations), [name for name, _ in warmup.WORKER_STEPS])
+
+    def databases_down(self, *down):
+        """Return patched connections to default and replica_1"""
+        wrappers = {}
+        for alias in ['default', 'replica_1']:
+            wrappers[alias] = MagicMock()
+            if alias in down:
+                wrappers[alias].ensure_connection.side_effect = (
+                    OperationalError('down'))
+        connections = MagicMock()
+        connections.__iter__.side_effect = lambda: iter(wrappers)
+        connections.__getitem__.side_effect = wrappers.__getitem__
+        return patch('app.warmup.connections', connections)
+
+    def test_unreachable_replica_skipped(self):
+        """Test a database other than the default one may be down"""
+        with self.databases_down('replica_1'), \
+                self.assertLogs('app.warmup', 'WARNING') as logs:
+            warmup._connect_databases()
+
+        self.assertIn('could not connect to replica_1', logs.output[0])
+
+    def test_default_database_required(self):
+        """Test the worker does not start without the default database"""
+        with self.databases_down('default'), \
+                self.assertRaises(OperationalError):
+            warmup._connect_databases()
+
+    @patch('app.warmup.preload')
+    def test_install_outside_uwsgi(self, patched_preload):
+        """Test installing the hooks outside of uwsgi does nothing"""
+        warmup.install()
+
+        patched_preload.assert_not_called()
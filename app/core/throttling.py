@@ -0,0 +1,111 @@
+"""
+Request throttles with counters shared across the worker processes
+"""
+
+import hashlib
+from collections.abc import Mapping
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+from core import counters
+
+
+class SharedRateThrottle(SimpleRateThrottle):
+    """Fixed window throttle keyed on the user, or the client IP
+
+    Each budget is a core.counters counter expiring with the window,
+    shared by the worker processes. THROTTLE_COUNTERS picks the store
+    of each scope.
+    """
+
+    @property
+    def counters(self):
+        return counters.for_scope(self.scope)
+
+    def get_rate(self):
+        """Return the rate of the scope from the current settings"""
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError:
+            raise ImproperlyConfigured(
+                f'No default throttle rate set for "{self.scope}" scope')
+
+    def applies(self, request, view):
+        """Return True if the request counts against this throttle"""
+        return True
+
+    def get_ident_key(self, request):
+        """Return the identity the budget is counted for"""
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user-{user.pk}'
+        return f'ip-{self.get_ident(request)}'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident_key(request),
+        }
+
+    def allow_request(self, request, view):
+        if self.rate is None or not self.applies(request, view):
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        window = int(self.now // self.duration)
+        self.window_end = (window + 1) * self.duration
+        count = self.counters.incr(self.key, self.window_end, self.now)
+        return count <= self.num_requests
+
+    def wait(self):
+        """Return the seconds until the current window ends"""
+        return max(self.window_end - self.now, 1)
+
+
+class ReadRateThrottle(SharedRateThrottle):
+    """Budget for the safe methods"""
+    scope = 'read'
+
+    def applies(self, request, view):
+        return request.method in SAFE_METHODS
+
+
+class WriteRateThrottle(SharedRateThrottle):
+    """Budget for the unsafe methods"""
+    scope = 'write'
+
+    def applies(self, request, view):
+        return request.method not in SAFE_METHODS
+
+
+class UploadRateThrottle(SharedRateThrottle):
+    """Budget for the image uploads"""
+    scope = 'upload'
+
+
+class LoginRateThrottle(SharedRateThrottle):
+    """Budget for the login attempts of a client IP"""
+    scope = 'login'
+
+    def get_ident_key(self, request):
+        return f'ip-{self.get_ident(request)}'
+
+
+class LoginAccountRateThrottle(SharedRateThrottle):
+    """Budget for the login attempts on a single account"""
+    scope = 'login_account'
+
+    def get_cache_key(self, request, view):
+        if not isinstance(request.data, Mapping):
+            return None
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        ident = hashlib.sha1(email.strip().lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
@@ -0,0 +1,93 @@
+"""
+Views for the project wide endpoints
+"""
+
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils import translation
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+from drf_spectacular.views import SpectacularAPIView
+
+from core import metrics
+
+_schema_cache = {}
+
+
+def clear_schema_cache():
+    """Drop the memoized schemas and renderings of this process"""
+    _schema_cache.clear()
+
+
+class CachedSchemaView(SpectacularAPIView):
+    """Serve the OpenAPI schema generated once per process or at build"""
+
+    def _get_schema(self, request, language):
+        """Return the schema from the build artifact or generate it once"""
+        key = ('schema', language)
+        if key not in _schema_cache:
+            if (language == settings.LANGUAGE_CODE
+                    and os.path.exists(settings.SCHEMA_FILE)):
+                with open(settings.SCHEMA_FILE, 'rb') as schema_file:
+                    schema = json.load(schema_file)
+            else:
+                generator = self.generator_class(
+                    urlconf=self.urlconf,
+                    api_version=self.api_version,
+                )
+                schema = generator.get_schema(
+                    request=request,
+                    public=self.serve_public,
+                )
+            _schema_cache[key] = schema
+        return _schema_cache[key]
+
+    def _get_schema_response(self, request):
+        """Return the rendered schema with caching headers"""
+        renderer = request.accepted_renderer
+        language = translation.get_language()
+        key = ('body', language, request.accepted_media_type)
+        metrics.cache_lookup('schema', key in _schema_cache)
+        if key not in _schema_cache:
+            schema = self._get_schema(request, language)
+            body = renderer.render(
+                schema,
+                request.accepted_media_type,
+                self.get_renderer_context(),
+            )
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            _schema_cache[key] = (body, etag)
+        body, etag = _schema_cache[key]
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            content_type = renderer.media_type
+            if renderer.charset:
+                content_type += f'; charset={renderer.charset}'
+            response = HttpResponse(body, content_type=content_type)
+        response['ETag'] = etag
+        response['Cache-Control'] = (
+            f'public, max-age={settings.SCHEMA_CACHE_MAX_AGE}')
+        return response
+
+
+def metrics_view(request):
+    """Expose the metrics of every worker in the Prometheus format
+
+    The scrape needs METRICS_TOKEN as a bearer token. Without one the
+    metrics are only served with DEBUG on.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            raise Http404
+    elif not constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
@@ -0,0 +1,171 @@
+"""
+Async views for the slow, I/O bound recipe endpoints.
+
+Under the ASGI deployment a slow client only holds a coroutine, while
+the blocking ORM and image work runs in a bounded thread pool. The
+views run a DRF view in the pool, so the authentication, permissions,
+throttles and error responses are those of the rest of the API.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.generics import get_object_or_404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import metrics
+from core.asgi import AsyncStreamingHttpResponse
+from core.authentication import CountedTokenAuthentication
+from core.models import Recipe
+from core.throttling import UploadRateThrottle
+from recipe import fastpath, serializers
+
+EXPORT_BATCH_SIZE = 500
+
+_executor = None
+
+
+def _get_executor():
+    """Return the thread pool running the ORM work"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_ORM_THREADS,
+            thread_name_prefix='orm',
+        )
+    return _executor
+
+
+def _in_pool(call):
+    """Run call in a pool thread with the request connection handling"""
+    close_old_connections()
+    try:
+        return call()
+    finally:
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking work in the bounded thread pool"""
+    call = functools.partial(func, *args, **kwargs)
+    if not settings.ASYNC_ORM_THREADS:
+        return await sync_to_async(call)()
+    # Carry the context variables, like the request timings, to the pool
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), context.run, _in_pool, call)
+
+
+def _dispatch(view, request, **kwargs):
+    """Run a DRF view and render its response, in the pool"""
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+class UploadImageView(APIView):
+    """The upload_image action of RecipeViewSet"""
+    authentication_classes = [CountedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_throttles(self):
+        """Add the upload budget to the write budget"""
+        return super().get_throttles() + [UploadRateThrottle()]
+
+    def post(self, request, pk):
+        recipe = get_object_or_404(
+            Recipe.objects.filter(user=request.user), pk=pk)
+        serializer = serializers.RecipeImageSerializer(
+            recipe, data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+
+def _export_batch(user, before_id):
+    """Return the next batch of the user recipes, newest first"""
+    queryset = Recipe.objects.filter(user=user)
+    if before_id is not None:
+        queryset = queryset.filter(id__lt=before_id)
+    return fastpath.serialize_recipes(
+        queryset.order_by('-id')[:EXPORT_BATCH_SIZE])
+
+
+def _export_chunk(user, before_id):
+    """Return the next batch encoded, its size and its last id"""
+    batch = _export_batch(user, before_id)
+    return (
+        b''.join(orjson.dumps(item) + b'\n' for item in batch),
+        len(batch),
+        batch[-1]['id'] if batch else None,
+    )
+
+
+class ExportChunks:
+    """Async iterator over the encoded export batches
+
+    Each batch is read in the pool, in the context of the request, like
+    the shard of the user, which the middleware has left by the time
+    the response is sent. Memory stays at a single batch.
+    """
+
+    def __init__(self, user, first):
+        self.user = user
+        self.context = contextvars.copy_context()
+        self.next = first
+        self.last_id = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.next is None:
+            if self.last_id is None:
+                raise StopAsyncIteration
+            self.next = await run_sync(
+                self.context.run, _export_chunk, self.user, self.last_id)
+        chunk, size, last_id = self.next
+        self.next = None
+        if not size:
+            raise StopAsyncIteration
+        # A short batch is the last one
+        self.last_id = last_id if size == EXPORT_BATCH_SIZE else None
+        return chunk
+
+
+class ExportView(APIView):
+    """Export the user recipes as newline delimited JSON"""
+    authentication_classes = [CountedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # The first batch is read here, an error is still a 500
+        first = _export_chunk(request.user, None)
+        return AsyncStreamingHttpResponse(
+            ExportChunks(request.user, first),
+            content_type='application/x-ndjson')
+
+
+_upload_image_view = UploadImageView.as_view()
+_export_view = ExportView.as_view()
+
+
+async def upload_image(request, pk):
+    """Upload an image to a recipe"""
+    with metrics.IMAGE_UPLOADS.track_inprogress():
+        return await run_sync(_dispatch, _upload_image_view, request, pk=pk)
+
+
+async def export_recipes(request):
+    """Export the user recipes as newline delimited JSON"""
+    return await run_sync(_dispatch, _export_view, request)
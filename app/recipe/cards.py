@@ -0,0 +1,74 @@
+"""
+Precomputed list representations of the recipes.
+
+A card holds the RecipeSerializer output of one recipe as JSON. Writes
+mark the recipes they change and the cards are rebuilt once, when the
+transaction commits, by a background task when there are more than a
+batch of them. The list endpoint joins the stored JSON into the
+response without decoding it.
+"""
+
+from django.conf import settings
+
+from core import queue
+from core.instrumentation import measure
+from core.models import Recipe, RecipeCard
+from core.renderers import ORJSONRenderer, dumps
+from recipe import fastpath, rebuild
+
+
+def encode(item):
+    """Return the JSON of a card, as ORJSONRenderer renders the item"""
+    return dumps(item).decode()
+
+
+@queue.task
+def build(recipe_ids, using='default'):
+    """Rebuild the cards of the recipes, return how many were written
+
+    Ids of deleted recipes are skipped.
+    """
+    def make_rows(batch):
+        return [
+            RecipeCard(recipe_id=item['id'], data=encode(item))
+            for item in fastpath.serialize_recipes(
+                Recipe.objects.using(using).filter(id__in=batch))
+        ]
+
+    return rebuild.replace_rows(RecipeCard, recipe_ids, using, make_rows)
+
+
+mark = rebuild.Rebuilder(build).mark
+
+
+def enabled():
+    return settings.RECIPE_CARDS
+
+
+def accepts_cards(request):
+    """Return True if the response is the compact JSON of the cards"""
+    return (
+        isinstance(request.accepted_renderer, ORJSONRenderer)
+        and 'indent' not in request.accepted_media_type
+    )
+
+
+def render_list(queryset):
+    """Return the JSON list of the recipes of a queryset from the cards
+
+    Keeps the order of the queryset. Recipes without a card yet are
+    serialized on the fly.
+    """
+    rows = list(queryset.values_list('id', 'card__data'))
+    missing = [pk for pk, data in rows if data is None]
+    built = {}
+    if missing:
+        built = {
+            item['id']: encode(item)
+            for item in fastpath.serialize_recipes(
+                Recipe.objects.using(queryset.db).filter(pk__in=missing))
+        }
+    with measure('render'):
+        return '[{}]'.format(','.join(
+            built[pk] if data is None else data for pk, data in rows
+        )).encode()
@@ -0,0 +1,115 @@
+"""
+Query parameters of the recipe, tag and ingredient lists.
+
+The parameters are validated together, so a bad value is a 400 before
+any query runs, then compiled into the WHERE and ORDER BY of a single
+statement. Tag and ingredient filters are IN subqueries on the through
+tables, which keeps the rows unique without a DISTINCT.
+"""
+
+from django.db.models import Q
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from rest_framework import serializers
+
+from core.models import Recipe
+
+ORDERING = ['id', 'price', 'time_minutes', 'title']
+# Parameter -> lookup of the recipe columns
+LOOKUPS = {
+    'price_min': 'price__gte',
+    'price_max': 'price__lte',
+    'time_min': 'time_minutes__gte',
+    'time_max': 'time_minutes__lte',
+    'title': 'title__startswith',
+}
+# Parameter -> (through table, column of the related ids)
+RELATED = {
+    'tags': (Recipe.tags.through, 'tag_id'),
+    'ingredients': (Recipe.ingredients.through, 'ingredient_id'),
+}
+
+
+@extend_schema_field(OpenApiTypes.STR)
+class IdListField(serializers.Field):
+    """Comma separated list of IDs"""
+
+    default_error_messages = {
+        'invalid': 'Expected a comma separated list of IDs.',
+    }
+
+    def to_internal_value(self, data):
+        try:
+            ids = [int(value) for value in data.split(',')]
+        except (AttributeError, ValueError):
+            self.fail('invalid')
+        if any(pk < 1 for pk in ids):
+            self.fail('invalid')
+        return ids
+
+    def to_representation(self, value):
+        return ','.join(map(str, value))
+
+
+class RecipeFilterSerializer(serializers.Serializer):
+    """Filters and ordering of the recipe list"""
+
+    tags = IdListField(
+        required=False, help_text='Recipes with any of these tag IDs')
+    ingredients = IdListField(
+        required=False, help_text='Recipes with any of these ingredient IDs')
+    price_min = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, required=False)
+    price_max = serializers.DecimalField(
+        max_digits=5, decimal_places=2, min_value=0, required=False)
+    time_min = serializers.IntegerField(min_value=0, required=False)
+    time_max = serializers.IntegerField(min_value=0, required=False)
+    title = serializers.CharField(
+        max_length=255, required=False,
+        help_text='Case sensitive prefix of the title')
+    ordering = serializers.ChoiceField(
+        choices=ORDERING + [f'-{field}' for field in ORDERING],
+        default='-id',
+        help_text='Field to order by, prefixed with - for descending')
+
+    def validate(self, attrs):
+        for low, high in [('price_min', 'price_max'),
+                          ('time_min', 'time_max')]:
+            if low in attrs and high in attrs and attrs[low] > attrs[high]:
+                raise serializers.ValidationError(
+                    {low: f'Must not be greater than {high}.'})
+        return attrs
+
+    def filter(self, queryset):
+        """Return the queryset filtered and ordered by the parameters"""
+        data = self.validated_data
+        conditions = Q(**{
+            lookup: data[name] for name, lookup in LOOKUPS.items()
+            if name in data
+        })
+        for name, (through, column) in RELATED.items():
+            if name in data:
+                conditions &= Q(id__in=through.objects.filter(
+                    **{f'{column}__in': data[name]}).values('recipe_id'))
+        queryset = queryset.filter(conditions)
+        ordering = data['ordering']
+        if ordering.lstrip('-') == 'id':
+            return queryset.order_by(ordering)
+        # The id breaks the ties, so pages of equal values are stable
+        return queryset.order_by(ordering, '-id')
+
+
+class AttrFilterSerializer(serializers.Serializer):
+    """Filters and ordering of the tag and ingredient lists"""
+
+    assigned_only = serializers.ChoiceField(choices=[0, 1], default=0)
+    popular = serializers.ChoiceField(choices=[0, 1], default=0)
+
+    def filter(self, queryset):
+        """Return the queryset filtered and ordered by the parameters"""
+        data = self.validated_data
+        if data['assigned_only']:
+            queryset = queryset.filter(recipe_count__gt=0)
+        if data['popular']:
+            return queryset.order_by('-recipe_count', '-name')
+        return queryset.order_by('-name')
@@ -0,0 +1,44 @@
+"""
+Recipes the user can cook with the ingredients at hand.
+
+The through table is the inverted index from the ingredients to their
+recipes: its (ingredient, recipe) rows of the pantry give the
+candidates and how many of their ingredients each one has, while the
+maintained ingredient_count gives how many it needs. Recipes needing
+no more than max_missing ingredients qualify without any hit, through
+the (user, ingredient_count) index. Everything runs as one statement
+and only the matches leave the database.
+"""
+
+from django.db.models import (
+    Count, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery)
+from django.db.models.functions import Coalesce
+
+from core.models import Recipe
+
+
+def matches(queryset, ingredient_ids, max_missing=0):
+    """Return the recipes missing at most max_missing ingredients
+
+    Annotated with the ingredients they have and miss, the fewest
+    missing first.
+    """
+    hits = Recipe.ingredients.through.objects.filter(
+        ingredient_id__in=ingredient_ids)
+    have = (
+        hits.filter(recipe_id=OuterRef('pk'))
+        .order_by().values('recipe_id')
+        .annotate(count=Count('*')).values('count')
+    )
+    return (
+        queryset
+        .filter(
+            Q(id__in=hits.values('recipe_id'))
+            | Q(ingredient_count__lte=max_missing))
+        .annotate(have=Coalesce(
+            Subquery(have, output_field=IntegerField()), 0))
+        .annotate(missing=ExpressionWrapper(
+            F('ingredient_count') - F('have'), output_field=IntegerField()))
+        .filter(missing__lte=max_missing)
+        .order_by('missing', '-have', '-id')
+    )
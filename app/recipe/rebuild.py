@@ -0,0 +1,82 @@
+"""
+Rows derived from the recipes, rebuilt after the writes changing them.
+
+Writes mark the recipes they change. The ids marked during a
+transaction are rebuilt once, when it commits, inline up to a batch and
+by a background task beyond. The ids of a transaction that rolls back
+are dropped with its on_commit callback.
+"""
+
+import threading
+
+from django.db import transaction
+
+from core import queue
+from recipe import fastpath
+
+
+def replace_rows(model, recipe_ids, using, make_rows):
+    """Replace the rows of model of the recipes, a batch at a time
+
+    make_rows(batch) returns the new rows of a batch of recipe ids.
+    Returns how many rows were written.
+    """
+    recipe_ids = sorted(recipe_ids)
+    objects = model.objects.using(using)
+    written = 0
+    for start in range(0, len(recipe_ids), fastpath.BATCH_SIZE):
+        batch = recipe_ids[start:start + fastpath.BATCH_SIZE]
+        rows = make_rows(batch)
+        with transaction.atomic(using=using):
+            objects.filter(recipe_id__in=batch).delete()
+            objects.bulk_create(rows)
+        written += len(rows)
+    return written
+
+
+class Rebuilder:
+    """Run a build task on the recipes marked during a transaction
+
+    The task takes the recipe_ids and using keyword arguments.
+    """
+
+    def __init__(self, build):
+        self.build = build
+        # database alias -> (ids, on_commit callback), per thread
+        self._pending = threading.local()
+
+    def scheduled(self, callback, using):
+        """Return True if the callback waits for the transaction"""
+        connection = transaction.get_connection(using)
+        return any(item[1] is callback for item in connection.run_on_commit)
+
+    def mark(self, recipe_ids, using):
+        """Rebuild the recipes when the transaction commits
+
+        Outside a transaction they are rebuilt at once.
+        """
+        if not recipe_ids:
+            return
+        pending = self._pending.__dict__.get(using)
+        if pending is not None and self.scheduled(pending[1], using):
+            pending[0].update(recipe_ids)
+            return
+        # None yet, or the transaction of the last ones rolled back
+        ids = set(recipe_ids)
+
+        def callback():
+            self.flush(ids, using)
+
+        self._pending.__dict__[using] = (ids, callback)
+        transaction.on_commit(callback, using=using)
+
+    def flush(self, ids, using):
+        pending = self._pending.__dict__.get(using)
+        if pending is not None and pending[0] is ids:
+            del self._pending.__dict__[using]
+        recipe_ids = list(ids)
+        if len(recipe_ids) > fastpath.BATCH_SIZE:
+            queue.enqueue(
+                self.build, {'recipe_ids': recipe_ids, 'using': using})
+        else:
+            self.build(recipe_ids, using)
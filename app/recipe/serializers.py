@@ -1,29 +1,46 @@
 """"Serializers for Recipes"""
 
+from django.db import models, router, transaction
 from rest_framework import serializers
 
+from core.instrumentation import TimedSerializerMixin
 from core.models import Recipe, Tag, Ingredient
+from recipe.filters import IdListField
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class ByIdListSerializer(serializers.ListSerializer):
+    """List related objects by id, the order of the read fast path
+
+    Sorted in Python, so a prefetched relation costs no query.
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = sorted(data.all(), key=lambda obj: obj.pk)
+        return super().to_representation(data)
+
+
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """The ingredient Serializer"""
 
     class Meta:
         model = Ingredient
         fields = ['id', 'name']
         read_only_field = ['id']
+        list_serializer_class = ByIdListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Tag"""
 
     class Meta:
         model = Tag
         fields = ['id', 'name']
         read_only_field = ['id']
+        list_serializer_class = ByIdListSerializer
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Recipe"""
 
     tags = TagSerializer(many=True, required=False)
@@ -38,45 +55,57 @@ class RecipeSerializer(serializers.ModelSerializer):
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed"""
         auth_user = self.context['request'].user
+        tag_objs = []
         for tag in tags:
             tag_obj, created = Tag.objects.get_or_create(
                 user=auth_user,
                 **tag
             )
-            recipe.tags.add(tag_obj)
+            tag_objs.append(tag_obj)
+        # One add, so the recipe counts are updated once
+        recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed"""
         auth_user = self.context['request'].user
+        ingredient_objs = []
         for ingredient in ingredients:
             ingredient_obj, created = Ingredient.objects.get_or_create(
                 user=auth_user,
                 **ingredient
             )
-            recipe.ingredients.add(ingredient_obj)
+            ingredient_objs.append(ingredient_obj)
+        recipe.ingredients.add(*ingredient_objs)
+
+    def _atomic(self):
+        """Group the nested writes, the cards are rebuilt once at commit"""
+        return transaction.atomic(
+            using=router.db_for_write(Recipe), savepoint=False)
 
     def create(self, validated_data):
         """Create a recipe"""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
-        recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        with self._atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self._get_or_create_tags(tags, recipe)
+            self._get_or_create_ingredients(ingredients, recipe)
         return recipe
 
     def update(self, instance, validated_data):
         """Update a recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with self._atomic():
+            if tags is not None:
+                instance.tags.clear()
+                self._get_or_create_tags(tags, instance)
+            if ingredients is not None:
+                instance.ingredients.clear()
+                self._get_or_create_ingredients(ingredients, instance)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
         return instance
 
 
@@ -87,7 +116,41 @@ class RecipeDetailSerializer(RecipeSerializer):
         fields = RecipeSerializer.Meta.fields + ['description', 'image']
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class SimilarRecipeSerializer(RecipeSerializer):
+    """Recipe with its similarity to the requested one"""
+    similarity = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['similarity']
+
+
+class SimilarParamsSerializer(serializers.Serializer):
+    """Query parameters of the similar recipes"""
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+    metric = serializers.ChoiceField(
+        choices=['jaccard', 'cosine'], default='jaccard')
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Recipe with the ingredients missing from the pantry"""
+    missing = serializers.IntegerField(read_only=True)
+    missing_ingredients = IngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + [
+            'missing', 'missing_ingredients']
+
+
+class PantryParamsSerializer(serializers.Serializer):
+    """Query parameters of the pantry matches"""
+    ingredients = IdListField(help_text='IDs of the ingredients at hand')
+    max_missing = serializers.IntegerField(
+        min_value=0, max_value=50, default=0,
+        help_text='0 lists the recipes that can be cooked right away')
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+
+class RecipeImageSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer to upload Images to recipe"""
 
     class Meta:
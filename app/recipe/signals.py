@@ -0,0 +1,66 @@
+"""
+Signal receivers keeping the recipe cards and similarity buckets up to date
+"""
+
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+from core.signals import bulk_deleting
+from recipe import cards, similar
+
+THROUGH = {
+    Tag: Recipe.tags.through,
+    Ingredient: Recipe.ingredients.through,
+}
+
+
+def linked_recipes(instance, using):
+    """Return the ids of the recipes using a tag or ingredient"""
+    column = f'{type(instance)._meta.model_name}_id'
+    return list(
+        THROUGH[type(instance)].objects.using(using)
+        .filter(**{column: instance.pk})
+        .values_list('recipe_id', flat=True)
+    )
+
+
+def links_of(recipe_ids, using):
+    """Rebuild what depends on the tags and ingredients of the recipes"""
+    if cards.enabled():
+        cards.mark(recipe_ids, using)
+    similar.mark(recipe_ids, using)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, using, **kwargs):
+    if cards.enabled():
+        cards.mark([instance.pk], using)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def links_changed(sender, instance, action, reverse, pk_set, using,
+                  **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            links_of([instance.pk], using)
+    elif action in ('post_add', 'post_remove'):
+        links_of(pk_set, using)
+    elif action == 'pre_clear':
+        links_of(linked_recipes(instance, using), using)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def attr_saved(sender, instance, created, using, **kwargs):
+    """Rebuild the cards of the recipes showing a renamed tag or ingredient"""
+    if cards.enabled() and not created:
+        cards.mark(linked_recipes(instance, using), using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def attr_deleted(sender, instance, using, **kwargs):
+    if not bulk_deleting():
+        links_of(linked_recipes(instance, using), using)
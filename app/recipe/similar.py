@@ -0,0 +1,137 @@
+"""
+Similar recipes from MinHash signatures of their tags and ingredients.
+
+The signature of a recipe keeps, for each of BANDS * ROWS hash
+functions, the smallest hash of its features. Two recipes agree on a
+row with a probability equal to the Jaccard similarity of their
+features, so recipes agreeing on every row of a band are likely alike.
+Each band is stored as one RecipeBucket key: the recipes sharing a key
+with the requested one are the candidates, and only those are scored
+exactly. A signature only depends on the links of its own recipe, so
+writes rebuild the buckets of the recipes they touch, like the cards.
+"""
+
+import hashlib
+import math
+import random
+from collections import defaultdict
+
+from django.db.models import Count
+
+from core import queue
+from core.models import Recipe, RecipeBucket
+from recipe import fastpath, rebuild
+
+# Recipes with a Jaccard similarity around (1 / BANDS) ** (1 / ROWS)
+# and above share a bucket with good odds
+BANDS = 16
+ROWS = 2
+# Candidates scored exactly for a request
+MAX_CANDIDATES = 2000
+PRIME = (1 << 61) - 1
+# (a, b) of the hash functions (a * x + b) % PRIME, fixed so the
+# signatures stay comparable across processes
+_rng = random.Random(49)
+HASHES = [
+    (_rng.randrange(1, PRIME), _rng.randrange(PRIME))
+    for _ in range(BANDS * ROWS)
+]
+# Through table, column and feature offset, tags and ingredients get
+# distinct features
+FEATURES = [
+    (Recipe.tags.through, 'tag_id', 0),
+    (Recipe.ingredients.through, 'ingredient_id', 1),
+]
+
+
+def features(recipe_ids, using):
+    """Map each recipe id to the features of its tags and ingredients"""
+    result = defaultdict(set)
+    for through, column, offset in FEATURES:
+        for start in range(0, len(recipe_ids), fastpath.BATCH_SIZE):
+            rows = through.objects.using(using).filter(
+                recipe_id__in=recipe_ids[start:start + fastpath.BATCH_SIZE],
+            ).values_list('recipe_id', column)
+            for recipe_id, pk in rows:
+                result[recipe_id].add(pk * 2 + offset)
+    return result
+
+
+def bucket_keys(feature_set):
+    """Return the bucket keys of a set of features, one per band"""
+    if not feature_set:
+        return []
+    signature = [
+        min((a * x + b) % PRIME for x in feature_set) for a, b in HASHES]
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = hashlib.blake2b(
+            repr((band, rows)).encode(), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'big', signed=True))
+    return keys
+
+
+@queue.task
+def build(recipe_ids, using='default'):
+    """Rebuild the buckets of the recipes, return how many were written
+
+    Ids of deleted recipes are skipped.
+    """
+    def make_rows(batch):
+        owners = Recipe.objects.using(using).filter(
+            id__in=batch).values_list('id', 'user_id')
+        feature_map = features(batch, using)
+        return [
+            RecipeBucket(recipe_id=pk, user_id=user_id, key=key)
+            for pk, user_id in owners
+            for key in bucket_keys(feature_map.get(pk))
+        ]
+
+    return rebuild.replace_rows(RecipeBucket, recipe_ids, using, make_rows)
+
+
+mark = rebuild.Rebuilder(build).mark
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b)
+
+
+def cosine(a, b):
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+METRICS = {'jaccard': jaccard, 'cosine': cosine}
+
+
+def rank(recipe, limit=10, metric='jaccard'):
+    """Return the (id, similarity) of the most similar recipes of the user
+
+    Candidates come from the shared buckets, the most shared first.
+    """
+    using = recipe._state.db
+    buckets = RecipeBucket.objects.using(using)
+    keys = list(
+        buckets.filter(recipe=recipe).values_list('key', flat=True))
+    if not keys:
+        return []
+    candidates = list(
+        buckets.filter(user_id=recipe.user_id, key__in=keys)
+        .exclude(recipe_id=recipe.pk)
+        .values('recipe_id')
+        .annotate(shared=Count('*'))
+        .order_by('-shared', '-recipe_id')
+        .values_list('recipe_id', flat=True)[:MAX_CANDIDATES]
+    )
+    feature_map = features([recipe.pk] + candidates, using)
+    target = feature_map.get(recipe.pk)
+    if not target:
+        return []
+    score = METRICS[metric]
+    scored = [
+        (pk, round(score(target, feature_map[pk]), 4))
+        for pk in candidates if target & feature_map.get(pk, set())
+    ]
+    scored.sort(key=lambda item: (-item[1], -item[0]))
+    return scored[:limit]
@@ -0,0 +1,207 @@
+"""
+Test the async upload and export endpoints
+"""
+import json
+import os
+import tempfile
+import threading
+from decimal import Decimal
+from unittest.mock import patch
+
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from core.throttling import SharedRateThrottle
+from recipe import async_views, fastpath
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def upload_url(recipe_id):
+    """Create and return the async image upload URL"""
+    return reverse('recipe:recipe-upload-image-async', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.50'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(ASYNC_ORM_THREADS=0)
+class AsyncViewsTests(TestCase):
+    """Test the async views"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_auth_required(self):
+        """Test the endpoints require a token"""
+        recipe = create_recipe(self.user)
+        client = APIClient()
+
+        res = client.get(EXPORT_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+        res = client.post(upload_url(recipe.id), {})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export(self):
+        """Test exporting the recipes of the user in batches"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}').tags.add(tag)
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        create_recipe(other_user)
+
+        # The export is read in batches of 2
+        with patch('recipe.async_views.EXPORT_BATCH_SIZE', 2):
+            res = self.client.get(EXPORT_URL)
+            lines = b''.join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        expected = fastpath.serialize_recipes(
+            Recipe.objects.filter(user=self.user).order_by('-id'))
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_export_method_not_allowed(self):
+        """Test the export only accepts GET"""
+        res = self.client.post(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    def test_export_read_throttled(self):
+        """Test exports count against the read budget"""
+        rates = {'read': '1/min'}
+
+        with patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates), \
+                patch.object(
+                    SharedRateThrottle, 'timer', return_value=1_000_000.0):
+            self.client.get(EXPORT_URL)
+            res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_upload_image(self):
+        """Test uploading an image asynchronously"""
+        recipe = create_recipe(self.user)
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                upload_url(recipe.id), {'image': image_file},
+                format='multipart')
+
+        recipe.refresh_from_db()
+        self.addCleanup(recipe.image.delete)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('image', res.json())
+        self.assertTrue(os.path.exists(recipe.image.path))
+
+    def test_upload_image_bad_request(self):
+        """Test uploading something that is not an image"""
+        recipe = create_recipe(self.user)
+
+        res = self.client.post(
+            upload_url(recipe.id), {'image': 'not an image'},
+            format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_other_user_recipe(self):
+        """Test uploading to another user recipe returns 404"""
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        recipe = create_recipe(other_user)
+
+        res = self.client.post(upload_url(recipe.id), {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_upload_image_throttled(self):
+        """Test uploads over the budget get a 429 with Retry-After"""
+        recipe = create_recipe(self.user)
+        rates = {'upload': '1/min'}
+
+        # A test crossing a window boundary would start a new budget
+        with patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates), \
+                patch.object(
+                    SharedRateThrottle, 'timer', return_value=1_000_000.0):
+            self.client.post(upload_url(recipe.id), {}, format='multipart')
+            res = self.client.post(
+                upload_url(recipe.id), {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+
+    def test_upload_image_write_throttled(self):
+        """Test uploads count against the write budget too"""
+        recipe = create_recipe(self.user)
+        rates = {'write': '1/min', 'upload': '30/min'}
+
+        with patch.dict(api_settings.DEFAULT_THROTTLE_RATES, rates), \
+                patch.object(
+                    SharedRateThrottle, 'timer', return_value=1_000_000.0):
+            self.client.post(upload_url(recipe.id), {}, format='multipart')
+            res = self.client.post(
+                upload_url(recipe.id), {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+
+@override_settings(ASYNC_ORM_THREADS=2)
+class AsyncViewsPoolTests(TransactionTestCase):
+    """Test the async views with the ORM work in the thread pool"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_export_streams_batches(self):
+        """Test the batches are read from the pool as the export is sent"""
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}')
+        batches = []
+
+        def export_batch(user, before_id):
+            batches.append(threading.current_thread().name)
+            return export_batch.wrapped(user, before_id)
+
+        export_batch.wrapped = async_views._export_batch
+        with patch('recipe.async_views.EXPORT_BATCH_SIZE', 2), \
+                patch('recipe.async_views._export_batch', export_batch):
+            res = self.client.get(EXPORT_URL)
+            self.assertEqual(len(batches), 1)
+            lines = b''.join(res.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(batches), 3)
+        self.assertTrue(all(name.startswith('orm') for name in batches))
+        expected = fastpath.serialize_recipes(
+            Recipe.objects.filter(user=self.user).order_by('-id'))
+        self.assertEqual([json.loads(line) for line in lines], expected)
@@ -0,0 +1,181 @@
+"""
+Test the precomputed recipe cards
+"""
+import json
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core import queue
+from core.models import Ingredient, Recipe, RecipeCard, Tag, Task
+from core.renderers import ORJSONRenderer
+from recipe import fastpath
+from recipe.serializers import RecipeSerializer
+from recipe.tests.test_fastpath import create_recipe, create_user
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def card(recipe):
+    return json.loads(RecipeCard.objects.get(recipe=recipe).data)
+
+
+def expected(recipe):
+    return json.loads(json.dumps(RecipeSerializer(recipe).data))
+
+
+@override_settings(RECIPE_CARDS=True)
+class RecipeCardTests(TestCase):
+    """Test the cards follow the recipe writes"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_through_api(self):
+        """Test a new recipe gets a card once, with its tags"""
+        payload = {
+            'title': 'Curry', 'time_minutes': 30, 'price': '5.00',
+            'tags': [{'name': 'Spicy'}], 'ingredients': [{'name': 'Rice'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(card(recipe), expected(recipe))
+        # The callbacks after the first find nothing left to build
+        self.assertGreater(len(callbacks), 1)
+
+    def test_rename_fans_out(self):
+        """Test renaming a tag or ingredient rebuilds its recipes"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Kale')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [create_recipe(self.user) for _ in range(3)]
+            tag.recipe_set.add(*recipes[:2])
+            recipes[2].ingredients.add(ingredient)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Plant based'
+            tag.save()
+            ingredient.name = 'Curly kale'
+            ingredient.save()
+
+        for recipe in recipes:
+            self.assertEqual(card(recipe), expected(recipe))
+        self.assertEqual(card(recipes[0])['tags'][0]['name'], 'Plant based')
+
+    @override_settings(TASKS_EAGER=False)
+    def test_large_fan_out_deferred(self):
+        """Test a rename touching many recipes is left to a worker"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [create_recipe(self.user) for _ in range(3)]
+            tag.recipe_set.add(*recipes)
+
+        with patch.object(fastpath, 'BATCH_SIZE', 2), \
+                self.captureOnCommitCallbacks(execute=True):
+            tag.name = 'Plant based'
+            tag.save()
+
+        self.assertEqual(card(recipes[0])['tags'][0]['name'], 'Vegan')
+        task = Task.objects.get()
+        self.assertEqual(
+            sorted(task.kwargs['recipe_ids']),
+            sorted(recipe.id for recipe in recipes))
+        with self.assertLogs('core.queue', 'INFO'):
+            queue.run_pending()
+
+        self.assertEqual(card(recipes[0])['tags'][0]['name'], 'Plant based')
+        self.assertFalse(Task.objects.exists())
+
+    def test_delete_tag(self):
+        """Test deleting a tag removes it from the cards"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(tag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.delete()
+
+        self.assertEqual(card(recipe)['tags'], [])
+
+    def test_list_from_cards(self):
+        """Test the list matches the serializers, with missing cards"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes = [
+                create_recipe(self.user, price=Decimal(f'{i}.50'))
+                for i in range(3)
+            ]
+            recipes[0].tags.add(tag)
+        RecipeCard.objects.filter(recipe=recipes[1]).delete()
+
+        res = self.client.get(RECIPES_URL)
+        filtered = self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        recipes = Recipe.objects.order_by('-id')
+        self.assertEqual(
+            json.loads(res.content),
+            json.loads(json.dumps(RecipeSerializer(recipes, many=True).data)),
+        )
+        self.assertEqual(
+            [item['id'] for item in json.loads(filtered.content)],
+            [recipes.last().id])
+
+    def test_list_bytes_match_renderer(self):
+        """Test the cards give the bytes of the rendered serializer data"""
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user, title='Line\u2028and\u2029paragraph')
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            res.content,
+            ORJSONRenderer().render(RecipeSerializer(
+                Recipe.objects.order_by('-id'), many=True).data),
+        )
+        self.assertIn(b'\\u2028', res.content)
+
+    @override_settings(RECIPE_CARDS=False)
+    def test_disabled(self):
+        """Test no card is built when the cards are off"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            create_recipe(self.user)
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(RecipeCard.objects.exists())
+
+
+class BuildRecipeCardsTests(TestCase):
+    """Test the backfill and the consistency check"""
+
+    # The commands visit every shard
+    databases = set(settings.SHARD_DATABASES)
+
+    def test_backfill_and_check(self):
+        user = create_user()
+        recipes = [create_recipe(user) for _ in range(3)]
+        out = StringIO()
+
+        with self.assertRaisesMessage(CommandError, '3 recipe cards differ'):
+            call_command('build_recipe_cards', check=True, stdout=out)
+        call_command('build_recipe_cards', batch_size=2, stdout=out)
+        call_command('build_recipe_cards', check=True, stdout=out)
+
+        Recipe.objects.filter(pk=recipes[0].pk).update(title='Renamed')
+        with self.assertRaisesMessage(CommandError, '1 recipe cards differ'):
+            call_command('build_recipe_cards', check=True, stdout=out)
+        self.assertIn(f'recipe {recipes[0].pk}: stale card', out.getvalue())
+        call_command('build_recipe_cards', check=True, fix=True, stdout=out)
+        self.assertEqual(card(recipes[0])['title'], 'Renamed')
@@ -0,0 +1,139 @@
+"""
+Test the read-only fast path matches the serializers output.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe import fastpath
+from recipe.serializers import (
+    RecipeSerializer,
+    TagSerializer,
+    IngredientSerializer,
+)
+
+
+def create_user(email='user@example.com', password='testpass123'):
+    """Create and return a new user"""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe"""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': Decimal('5.50'),
+        'link': 'http://example.com/recipe.pdf',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def render(data):
+    """Render data the same way the API does"""
+    return JSONRenderer().render(data)
+
+
+class FastPathParityTests(TestCase):
+    """Test the fast path output is byte-identical to the serializers"""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_recipes_without_relations(self):
+        """Test recipes without tags or ingredients"""
+        create_recipe(self.user, price=Decimal('7'))
+        create_recipe(self.user, title='Soup', link='')
+        recipes = Recipe.objects.order_by('-id')
+
+        self.assertEqual(
+            render(fastpath.serialize_recipes(recipes)),
+            render(RecipeSerializer(recipes, many=True).data),
+        )
+
+    def test_recipes_with_relations(self):
+        """Test recipes sharing tags and ingredients"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(3)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ing {i}')
+            for i in range(4)
+        ]
+        r1 = create_recipe(self.user, title='Curry', price=Decimal('12.30'))
+        r1.tags.add(*tags[:2])
+        # Links added out of id order, both paths still order by id
+        for ingredient in reversed(ingredients):
+            r1.ingredients.add(ingredient)
+        r2 = create_recipe(self.user, title='Salad')
+        r2.tags.add(tags[2])
+        r2.ingredients.add(ingredients[1])
+        create_recipe(self.user, title='Toast')
+        recipes = Recipe.objects.order_by('-id')
+
+        self.assertEqual(
+            render(fastpath.serialize_recipes(recipes)),
+            render(RecipeSerializer(recipes, many=True).data),
+        )
+
+    def test_recipes_respect_queryset_filters(self):
+        """Test only recipes from the queryset are returned"""
+        other_user = create_user(email='other@example.com')
+        tag = Tag.objects.create(user=other_user, name='Other')
+        create_recipe(other_user).tags.add(tag)
+        create_recipe(self.user)
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+
+        self.assertEqual(
+            render(fastpath.serialize_recipes(recipes)),
+            render(RecipeSerializer(recipes, many=True).data),
+        )
+
+    def test_recipes_query_count_is_constant(self):
+        """Test the fast path does not query once per recipe"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}').tags.add(tag)
+
+        with self.assertNumQueries(3):
+            fastpath.serialize_recipes(Recipe.objects.order_by('-id'))
+
+    def test_prefetched_serializer_query_count_is_constant(self):
+        """Test the serializers keep the prefetched relations"""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(2)]
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}').tags.add(*tags)
+        recipes = Recipe.objects.order_by('-id').prefetch_related(
+            'tags', 'ingredients')
+
+        with self.assertNumQueries(3):
+            data = RecipeSerializer(recipes, many=True).data
+
+        self.assertEqual(
+            render(data), render(fastpath.serialize_recipes(recipes)))
+
+    def test_attrs(self):
+        """Test tags and ingredients lists"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+        Ingredient.objects.create(user=self.user, name='Kale')
+        tags = Tag.objects.order_by('-name')
+        ingredients = Ingredient.objects.order_by('-name')
+
+        self.assertEqual(
+            render(fastpath.serialize_attrs(tags)),
+            render(TagSerializer(tags, many=True).data),
+        )
+        self.assertEqual(
+            render(fastpath.serialize_attrs(ingredients)),
+            render(IngredientSerializer(ingredients, many=True).data),
+        )
@@ -0,0 +1,134 @@
+"""
+Test the pantry matches and the ingredient counts behind them
+"""
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient
+from recipe.tests.test_fastpath import create_recipe, create_user
+
+PANTRY_URL = reverse('recipe:recipe-pantry')
+
+
+class IngredientCountTests(TestCase):
+    """Test the recipes count their ingredients"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.recipe = create_recipe(self.user)
+        self.ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Rice', 'Egg', 'Leek']]
+
+    def count(self):
+        self.recipe.refresh_from_db()
+        return self.recipe.ingredient_count
+
+    def test_forward_changes(self):
+        """Test adding, removing and clearing from the recipe side"""
+        self.recipe.ingredients.add(*self.ingredients)
+        self.recipe.ingredients.add(self.ingredients[0])
+        self.assertEqual(self.count(), 3)
+
+        other = Ingredient.objects.create(user=self.user, name='Salt')
+        self.recipe.ingredients.remove(self.ingredients[0], other)
+        self.assertEqual(self.count(), 2)
+
+        self.recipe.ingredients.clear()
+        self.assertEqual(self.count(), 0)
+
+    def test_reverse_changes(self):
+        """Test changes from the ingredient side and deletions"""
+        rice, egg, leek = self.ingredients
+        rice.recipe_set.add(self.recipe)
+        egg.recipe_set.add(self.recipe)
+        leek.recipe_set.add(self.recipe)
+        self.assertEqual(self.count(), 3)
+
+        rice.recipe_set.remove(self.recipe)
+        self.assertEqual(self.count(), 2)
+
+        egg.recipe_set.clear()
+        self.assertEqual(self.count(), 1)
+
+        leek.delete()
+        self.assertEqual(self.count(), 0)
+
+
+class PantryApiTests(TestCase):
+    """Test the pantry endpoint"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.rice, self.egg, self.leek, self.fish = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ['Rice', 'Egg', 'Leek', 'Fish']]
+
+    def recipe(self, title, *ingredients, user=None):
+        recipe = create_recipe(user or self.user, title=title)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def test_cookable(self):
+        """Test only the recipes with every ingredient at hand are listed"""
+        fried_rice = self.recipe('Fried rice', self.rice, self.egg)
+        plain = self.recipe('Plain rice', self.rice)
+        self.recipe('Kedgeree', self.rice, self.egg, self.fish)
+        water = self.recipe('Hot water')
+        other = create_user(email='other@example.com')
+        self.recipe('Other rice', user=other)
+
+        res = self.client.get(
+            PANTRY_URL, {'ingredients': f'{self.rice.id},{self.egg.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['missing']) for item in res.data],
+            [(fried_rice.id, 0), (plain.id, 0), (water.id, 0)])
+
+    def test_missing_at_most(self):
+        """Test max_missing ranks the recipes by missing ingredients"""
+        kedgeree = self.recipe('Kedgeree', self.rice, self.egg, self.fish)
+        soup = self.recipe('Leek soup', self.leek)
+        fried_rice = self.recipe('Fried rice', self.rice, self.egg)
+        self.recipe('Fish pie', self.fish, self.leek, self.egg)
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{self.rice.id},{self.egg.id}',
+            'max_missing': 1,
+        })
+
+        self.assertEqual(
+            [(item['id'], item['missing']) for item in res.data],
+            [(fried_rice.id, 0), (kedgeree.id, 1), (soup.id, 1)])
+        self.assertEqual(
+            res.data[1]['missing_ingredients'],
+            [{'id': self.fish.id, 'name': 'Fish'}])
+
+    def test_limit(self):
+        """Test the limit keeps the best matches"""
+        for n in range(3):
+            self.recipe(f'Rice {n}', self.rice)
+        best = self.recipe('Rice and egg', self.rice, self.egg)
+
+        res = self.client.get(PANTRY_URL, {
+            'ingredients': f'{self.rice.id},{self.egg.id}', 'limit': 1})
+
+        self.assertEqual([item['id'] for item in res.data], [best.id])
+
+    def test_invalid_params(self):
+        """Test the ingredients are required and the values checked"""
+        for params in [
+                {},
+                {'ingredients': 'rice'},
+                {'ingredients': '1', 'max_missing': -1},
+                {'ingredients': '1', 'limit': 0}]:
+            with self.subTest(params=params):
+                res = self.client.get(PANTRY_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
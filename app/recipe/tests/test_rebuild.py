@@ -0,0 +1,43 @@
+"""
+Test the rebuilds deferred to the end of the transaction
+"""
+from django.db import DatabaseError, transaction
+from django.test import TestCase
+
+from recipe import rebuild
+
+
+class RebuilderTests(TestCase):
+    """Test marking the recipes to rebuild"""
+
+    def setUp(self):
+        self.built = []
+
+        def build(recipe_ids, using):
+            self.built.append(sorted(recipe_ids))
+
+        self.rebuilder = rebuild.Rebuilder(build)
+
+    def test_once_per_transaction(self):
+        """Test the ids of a transaction are built together at commit"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.rebuilder.mark([2, 1], 'default')
+            self.rebuilder.mark([3, 2], 'default')
+
+            self.assertEqual(self.built, [])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.built, [[1, 2, 3]])
+
+    def test_rollback_drops_ids(self):
+        """Test the ids of a rolled back transaction are not kept"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.rebuilder.mark([1, 2], 'default')
+                    raise DatabaseError('rolled back')
+            except DatabaseError:
+                pass
+            self.rebuilder.mark([3], 'default')
+
+        self.assertEqual(self.built, [[3]])
@@ -422,6 +422,64 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_price_and_time(self):
+        """Test the range filters combine with the tag filter"""
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        other = Tag.objects.create(user=self.user, name='Cheap')
+        cheap = create_recipe(
+            user=self.user, price=Decimal('3.00'), time_minutes=10)
+        pricey = create_recipe(
+            user=self.user, price=Decimal('9.00'), time_minutes=10)
+        slow = create_recipe(
+            user=self.user, price=Decimal('3.00'), time_minutes=90)
+        untagged = create_recipe(
+            user=self.user, price=Decimal('3.00'), time_minutes=10)
+        for recipe in [cheap, pricey, slow]:
+            recipe.tags.add(tag, other)
+
+        res = self.client.get(RECIPES_URL, {
+            'tags': f'{tag.id},{other.id}', 'price_max': '5.00',
+            'time_min': 5, 'time_max': 30,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data], [cheap.id])
+
+        res = self.client.get(RECIPES_URL, {
+            'price_max': '5.00', 'time_min': 5, 'time_max': 30,
+        })
+
+        self.assertEqual(
+            [item['id'] for item in res.data], [untagged.id, cheap.id])
+
+    def test_title_prefix_and_ordering(self):
+        """Test filtering on a title prefix and ordering by price"""
+        r1 = create_recipe(user=self.user, title='Curry', price='8.00')
+        r2 = create_recipe(user=self.user, title='Curry rice', price='4.00')
+        r3 = create_recipe(user=self.user, title='Curry soup', price='4.00')
+        create_recipe(user=self.user, title='Thai curry', price='1.00')
+
+        res = self.client.get(
+            RECIPES_URL, {'title': 'Curry', 'ordering': 'price'})
+
+        self.assertEqual(
+            [item['id'] for item in res.data], [r3.id, r2.id, r1.id])
+
+    def test_invalid_filters(self):
+        """Test bad filter values are rejected before querying"""
+        for params in [
+                {'tags': '1,a'},
+                {'ingredients': '-1'},
+                {'price_min': 'cheap'},
+                {'time_min': -5},
+                {'price_min': '9.00', 'price_max': '1.00'},
+                {'ordering': 'description'}]:
+            with self.subTest(params=params):
+                res = self.client.get(RECIPES_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(set(res.data), {next(iter(params))})
+
 
 class ImageUploadTests(TestCase):
     """Test for the image upload API"""
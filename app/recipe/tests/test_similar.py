@@ -0,0 +1,134 @@
+"""
+Test the similar recipes index and endpoint
+"""
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, RecipeBucket, Tag
+from recipe import similar
+from recipe.tests.test_fastpath import create_recipe, create_user
+
+
+def similar_url(recipe_id):
+    return reverse('recipe:recipe-similar', args=[recipe_id])
+
+
+class BucketKeyTests(SimpleTestCase):
+    """Test the MinHash bucket keys"""
+
+    def test_keys(self):
+        """Test equal feature sets share every bucket"""
+        keys = similar.bucket_keys({2, 5, 8})
+
+        self.assertEqual(len(keys), similar.BANDS)
+        self.assertEqual(keys, similar.bucket_keys({8, 5, 2}))
+        self.assertNotEqual(keys, similar.bucket_keys({3, 7, 11}))
+        self.assertEqual(similar.bucket_keys(set()), [])
+
+    def test_metrics(self):
+        """Test the exact similarity of two feature sets"""
+        self.assertEqual(similar.jaccard({1, 2, 3}, {2, 3, 4}), 0.5)
+        self.assertAlmostEqual(similar.cosine({1, 2}, {1, 2, 3, 4}), 0.7071, 4)
+
+
+class SimilarRecipesTests(TestCase):
+    """Test the similar recipes endpoint"""
+
+    # The commands visit every shard
+    databases = set(settings.SHARD_DATABASES)
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['Vegan', 'Quick', 'Cheap', 'Spicy']]
+        self.rice = Ingredient.objects.create(user=self.user, name='Rice')
+
+    def recipe(self, tags, user=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = create_recipe(user or self.user)
+            recipe.tags.add(*tags)
+        return recipe
+
+    def test_similar(self):
+        """Test the recipes are ranked by shared tags and ingredients"""
+        target = self.recipe(self.tags[:3])
+        near = self.recipe(self.tags)
+        far = self.recipe(self.tags[:1])
+        self.recipe([self.tags[3]])
+        other = create_user(email='other@example.com')
+        self.recipe(
+            [Tag.objects.create(user=other, name='Vegan')], user=other)
+
+        res = self.client.get(similar_url(target.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item['id'], item['similarity']) for item in res.data],
+            [(near.id, 0.75), (far.id, 0.3333)])
+        self.assertEqual(
+            [tag['name'] for tag in res.data[0]['tags']],
+            ['Vegan', 'Quick', 'Cheap', 'Spicy'])
+
+    def test_cosine_and_limit(self):
+        """Test the metric and limit parameters"""
+        target = self.recipe(self.tags[:2])
+        near = self.recipe(self.tags[:3])
+        self.recipe(self.tags[1:])
+
+        res = self.client.get(
+            similar_url(target.id), {'metric': 'cosine', 'limit': 1})
+
+        self.assertEqual(
+            [(item['id'], item['similarity']) for item in res.data],
+            [(near.id, 0.8165)])
+
+    def test_invalid_params(self):
+        """Test bad parameters are rejected"""
+        target = self.recipe(self.tags[:2])
+
+        for params in [{'limit': 0}, {'limit': 'all'}, {'metric': 'dice'}]:
+            with self.subTest(params=params):
+                res = self.client.get(similar_url(target.id), params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_links_rebuild_buckets(self):
+        """Test changing the links of a recipe updates its buckets"""
+        target = self.recipe(self.tags[:2])
+        near = self.recipe(self.tags[:2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            near.tags.clear()
+            near.ingredients.add(self.rice)
+
+        self.assertEqual(self.client.get(similar_url(target.id)).data, [])
+        self.assertEqual(
+            set(RecipeBucket.objects.filter(recipe=near)
+                .values_list('key', flat=True)),
+            set(similar.bucket_keys({self.rice.id * 2 + 1})))
+
+    def test_build_command(self):
+        """Test the command builds the buckets of bulk inserted recipes"""
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f'Recipe {n}', time_minutes=5,
+                   price='5.00')
+            for n in range(2))
+        recipes = list(Recipe.objects.filter(user=self.user))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tags[0].id)
+            for recipe in recipes)
+
+        call_command('build_similar_index', stdout=StringIO())
+
+        res = self.client.get(similar_url(recipes[0].id))
+        self.assertEqual([item['id'] for item in res.data], [recipes[1].id])
@@ -147,3 +147,31 @@ class PrivateTagsApiTest(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_popular_tags(self):
+        """Test listing the tags by number of recipes"""
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ['Dinner', 'Vegan', 'Quick']
+        ]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f'Recipe {i}',
+                time_minutes=5,
+                price=Decimal('4.50'),
+                user=self.user,
+            )
+            recipe.tags.add(*tags[i:])
+
+        res = self.client.get(TAGS_URL, {'popular': 1})
+
+        self.assertEqual(
+            [tag['name'] for tag in res.data], ['Quick', 'Vegan', 'Dinner'])
+
+    def test_invalid_params(self):
+        """Test bad flags are rejected"""
+        for params in [{'popular': 'x'}, {'assigned_only': 2}]:
+            with self.subTest(params=params):
+                res = self.client.get(TAGS_URL, params)
+
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -7,7 +7,7 @@ from django.urls import (
 
 from rest_framework.routers import DefaultRouter
 
-from recipe import views
+from recipe import async_views, views
 
 router = DefaultRouter()
 router.register('recipe', views.RecipeViewSet)
@@ -17,5 +17,11 @@ router.register('ingredients', views.IngredientViewSet)
 app_name = 'recipe'
 
 urlpatterns = [
+    path('export/', async_views.export_recipes, name='recipe-export'),
+    path(
+        'recipe/<int:pk>/upload_image_async/',
+        async_views.upload_image,
+        name='recipe-upload-image-async',
+    ),
     path('', include(router.urls)),
 ]
@@ -1,5 +1,6 @@
 """"Views for the Recipe API"""
 
+from django.http import HttpResponse
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -13,84 +14,144 @@ from rest_framework import (
 
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core import metrics
+from core.authentication import CountedTokenAuthentication
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.throttling import UploadRateThrottle
+from recipe import cards, fastpath, pantry, serializers, similar
+from recipe.filters import AttrFilterSerializer, RecipeFilterSerializer
 
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of IDs to filter',
-            )
-        ]
-    )
+    list=extend_schema(parameters=[RecipeFilterSerializer])
 )
 class RecipeViewSet(viewsets.ModelViewSet):
     """The model view for the Recipe APIs"""
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CountedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
-    def _params_to_ints(self, qs):
-        """Concert a list of strings to integer"""
-        return [int(str_id) for str_id in qs.split(',')]
-
     def get_queryset(self):
         """Retrieve recipe for authenticated users"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(
-            user=self.request.user
-        ).order_by('-id').distinct()
-        # return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != 'list':
+            return queryset.order_by('-id')
+        # Blank parameters are left out, like before they were validated
+        params = RecipeFilterSerializer(data={
+            name: value
+            for name, value in self.request.query_params.items() if value
+        })
+        params.is_valid(raise_exception=True)
+        return params.filter(queryset)
+
+    def get_throttles(self):
+        """Add the upload budget to the image uploads"""
+        throttles = super().get_throttles()
+        if self.action == 'upload_image':
+            throttles.append(UploadRateThrottle())
+        return throttles
 
     def get_serializer_class(self):
         """Get the Serializer for the current action"""
         if self.action == 'list':
             return serializers.RecipeSerializer
+        elif self.action == 'similar':
+            return serializers.SimilarRecipeSerializer
+        elif self.action == 'pantry':
+            return serializers.PantryRecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
         else:
             return self.serializer_class
 
+    def list(self, request, *args, **kwargs):
+        """List recipes through the read-only fast path"""
+        queryset = self.filter_queryset(self.get_queryset())
+        if cards.enabled() and cards.accepts_cards(request):
+            return HttpResponse(
+                cards.render_list(queryset), content_type='application/json')
+        return Response(fastpath.serialize_recipes(queryset))
+
     def perform_create(self, serializer):
         """Create a new Recipe"""
         serializer.save(user=self.request.user)
 
+    @extend_schema(
+        parameters=[serializers.SimilarParamsSerializer],
+        responses=serializers.SimilarRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=True)
+    def similar(self, request, pk=None):
+        """List the recipes sharing the most tags and ingredients"""
+        recipe = self.get_object()
+        params = serializers.SimilarParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        scores = similar.rank(recipe, **params.validated_data)
+        items = {
+            item['id']: item
+            for item in fastpath.serialize_recipes(
+                self.get_queryset().filter(
+                    pk__in=[recipe_id for recipe_id, _ in scores]))
+        }
+        return Response([
+            {**items[recipe_id], 'similarity': similarity}
+            for recipe_id, similarity in scores if recipe_id in items
+        ])
+
+    @extend_schema(
+        parameters=[serializers.PantryParamsSerializer],
+        responses=serializers.PantryRecipeSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False)
+    def pantry(self, request):
+        """List the recipes missing the fewest of the given ingredients"""
+        params = serializers.PantryParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        at_hand = set(params.validated_data['ingredients'])
+        found = list(
+            pantry.matches(
+                self.get_queryset(), at_hand,
+                params.validated_data['max_missing'],
+            ).values_list('id', 'missing')[:params.validated_data['limit']]
+        )
+        items = {
+            item['id']: item
+            for item in fastpath.serialize_recipes(
+                self.get_queryset().filter(
+                    pk__in=[recipe_id for recipe_id, _ in found]))
+        }
+        return Response([
+            {
+                **items[recipe_id],
+                'missing': missing,
+                'missing_ingredients': [
+                    ingredient
+                    for ingredient in items[recipe_id]['ingredients']
+                    if ingredient['id'] not in at_hand
+                ],
+            }
+            for recipe_id, missing in found if recipe_id in items
+        ])
+
     @action(methods=['POST'], detail=True, url_path='upload_image')
     def upload_image(self, request, pk=None):
         """Upload an image to recipe"""
-        recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
+        with metrics.IMAGE_UPLOADS.track_inprogress():
+            recipe = self.get_object()
+            serializer = self.get_serializer(recipe, data=request.data)
 
-        if serializer.is_valid():
-            serializer.save()
-            return Response(
-                serializer.data,
-                status=status.HTTP_200_OK)
-        else:
-            return Response(
-                serializer.errors,
-                status=status.HTTP_400_BAD_REQUEST)
+            if serializer.is_valid():
+                serializer.save()
+                return Response(
+                    serializer.data,
+                    status=status.HTTP_200_OK)
+            else:
+                return Response(
+                    serializer.errors,
+                    status=status.HTTP_400_BAD_REQUEST)
 
 
 @extend_schema_view(
@@ -101,6 +162,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT, enum=[0, 1],
                 description='filter by items assigned to recipes',
             ),
+            OpenApiParameter(
+                'popular',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='order by the number of recipes',
+            ),
         ]
     )
 )
@@ -109,17 +175,24 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base class for recipe Attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CountedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0)))
-        queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        queryset = self.queryset.filter(user=self.request.user)
+        if self.action != 'list':
+            return queryset.order_by('-name')
+        params = AttrFilterSerializer(data={
+            name: value
+            for name, value in self.request.query_params.items() if value
+        })
+        params.is_valid(raise_exception=True)
+        return params.filter(queryset)
+
+    def list(self, request, *args, **kwargs):
+        """List the attributes through the read-only fast path"""
+        queryset = self.filter_queryset(self.get_queryset())
+        return Response(fastpath.serialize_attrs(queryset))
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -0,0 +1,96 @@
+"""
+Background tasks of the user app, see core.queue
+"""
+
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import queue, sharding, signals
+from core.models import Ingredient, Recipe, Tag, User, UserPurge
+
+logger = logging.getLogger(__name__)
+
+# Deleted in this order, the recipes release their links first
+PURGED = [(Recipe, 'recipes'), (Tag, 'tags'), (Ingredient, 'ingredients')]
+
+
+@queue.task
+def purge_user(user_id):
+    """Delete the objects of a deleted account in batches, then the user
+
+    Queues itself again after PURGE_BATCHES batches, so a big account
+    never holds a worker past TASK_TIMEOUT. Safe to run twice.
+    """
+    progress = UserPurge.objects.filter(
+        user_id=user_id, finished_at=None).first()
+    if progress is None:
+        return
+    database, _ = sharding.lookup(user_id)
+    for _ in range(settings.PURGE_BATCHES):
+        if not purge_batch(user_id, database):
+            finish(progress, database)
+            return
+    purge_user.enqueue(user_id=user_id)
+
+
+def purge_batch(user_id, database):
+    """Delete the next batch of objects, return False once none is left"""
+    for model, counter in PURGED:
+        objects = model.objects.using(database)
+        ids = list(
+            objects.filter(user_id=user_id).order_by('pk')
+            .values_list('pk', flat=True)[:settings.PURGE_BATCH_SIZE])
+        if ids:
+            break
+    else:
+        return False
+
+    with transaction.atomic(using=database):
+        if model is Recipe:
+            images = [
+                name for name in objects.filter(pk__in=ids)
+                .exclude(image='').exclude(image=None)
+                .values_list('image', flat=True)
+            ]
+            signals.uncount_recipes(ids, database)
+            for through in (Recipe.tags.through, Recipe.ingredients.through):
+                through.objects.using(database).filter(
+                    recipe_id__in=ids).delete()
+            if images:
+                transaction.on_commit(
+                    lambda: remove_images(user_id, images), using=database)
+        # The tags and ingredients only go once no recipe is left
+        with signals.bulk_delete():
+            objects.filter(pk__in=ids).delete()
+    UserPurge.objects.filter(user_id=user_id).update(
+        **{counter: F(counter) + len(ids)})
+    return True
+
+
+def remove_images(user_id, names):
+    """Delete the image files of purged recipes"""
+    storage = Recipe._meta.get_field('image').storage
+    removed = 0
+    for name in names:
+        try:
+            storage.delete(name)
+            removed += 1
+        except OSError:
+            logger.warning('Could not remove %s', name, exc_info=True)
+    UserPurge.objects.filter(user_id=user_id).update(
+        images=F('images') + removed)
+
+
+def finish(progress, database):
+    """Delete the user row, with its stub on the shard"""
+    if database != 'default':
+        User.objects.using(database).filter(pk=progress.user_id).delete()
+    with transaction.atomic(using='default'):
+        User.objects.using('default').filter(pk=progress.user_id).delete()
+        UserPurge.objects.filter(user_id=progress.user_id).update(
+            finished_at=timezone.now())
+    sharding.forget(progress.user_id)
@@ -0,0 +1,73 @@
+"""
+Test purging the data of the deleted accounts
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+
+from core import queue
+from core.models import Ingredient, Recipe, Tag, Task, UserPurge
+from user.tasks import purge_user
+
+
+@override_settings(TASKS_EAGER=False, PURGE_BATCH_SIZE=2, PURGE_BATCHES=2)
+class PurgeUserTests(TestCase):
+    """Test the purge task"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123')
+        self.other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        Ingredient.objects.create(user=self.user, name='Kale')
+        self.recipes = []
+        for n in range(3):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Recipe {n}', time_minutes=5,
+                price='5.00')
+            recipe.tags.add(tag)
+            self.recipes.append(recipe)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].image.save('curry.jpg', ContentFile(b'jpeg'))
+        self.image_path = self.recipes[0].image.path
+        self.kept = Recipe.objects.create(
+            user=self.other, title='Kept', time_minutes=5, price='5.00')
+        UserPurge.objects.create(user_id=self.user.id, email=self.user.email)
+
+    def test_purge_in_batches(self):
+        """Test each task deletes a bounded batch and queues the next"""
+        with self.captureOnCommitCallbacks(execute=True):
+            purge_user(user_id=self.user.id)
+
+        # Two batches of up to two rows took the three recipes
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        self.assertEqual(Tag.objects.get(user=self.user).recipe_count, 0)
+        self.assertFalse(os.path.exists(self.image_path))
+        self.assertEqual(Task.objects.get().kwargs, {'user_id': self.user.id})
+
+        with self.captureOnCommitCallbacks(execute=True), \
+                self.assertLogs('core.queue', 'INFO'):
+            queue.run_pending()
+
+        self.assertFalse(
+            get_user_model().objects.filter(pk=self.user.id).exists())
+        progress = UserPurge.objects.get()
+        self.assertIsNotNone(progress.finished_at)
+        self.assertEqual(
+            (progress.recipes, progress.tags, progress.ingredients,
+             progress.images),
+            (3, 1, 1, 1))
+        self.assertTrue(Recipe.objects.filter(pk=self.kept.pk).exists())
+        self.assertFalse(Task.objects.exists())
+
+    def test_finished_purge_skipped(self):
+        """Test a purge queued twice does nothing the second time"""
+        UserPurge.objects.update(finished_at='2024-01-01T00:00:00Z')
+
+        purge_user(user_id=self.user.id)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+        self.assertFalse(Task.objects.exists())
@@ -2,13 +2,16 @@
 Test for the user API
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import Recipe, Task, UserPurge
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -167,3 +170,22 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(TASKS_EAGER=False)
+    def test_delete_account(self):
+        """Test deleting the account deactivates it and queues the purge"""
+        Token.objects.create(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Curry', time_minutes=30, price='5.00')
+
+        res = self.client.delete(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            UserPurge.objects.get(user_id=self.user.id).email,
+            self.user.email)
+        self.assertEqual(Task.objects.get().kwargs, {'user_id': self.user.id})
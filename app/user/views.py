@@ -2,13 +2,23 @@
 Views for the user API
 """
 
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+
+from core.authentication import CountedTokenAuthentication
+from core.models import UserPurge
+from core.throttling import (
+    LoginAccountRateThrottle,
+    LoginRateThrottle,
+)
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
+from user.tasks import purge_user
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -20,13 +30,26 @@ class CreateTokenView(ObtainAuthToken):
     """Create a new AuthToken for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # Checked before the serializer runs the password hasher
+    throttle_classes = [LoginRateThrottle, LoginAccountRateThrottle]
 
 
-class ManagerUserView(generics.RetrieveUpdateAPIView):
+class ManagerUserView(generics.RetrieveUpdateDestroyAPIView):
     """Manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CountedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         return self.request.user
+
+    def perform_destroy(self, instance):
+        """Deactivate the user now, purge the data in the background"""
+        with transaction.atomic():
+            instance.is_active = False
+            instance.save(update_fields=['is_active'])
+            Token.objects.filter(user=instance).delete()
+            # Inactive users cannot authenticate to delete twice
+            UserPurge.objects.create(
+                user_id=instance.pk, email=instance.email)
+            purge_user.enqueue(user_id=instance.pk)
@@ -2,5 +2,12 @@
 
 set -e
 
-envsubst < /etc/nginx/default.conf.tpl > /etc/nginx/conf.d/default.conf
+# APP_PROTOCOL=http proxies to an ASGI server instead of uwsgi
+if [ "$APP_PROTOCOL" = "http" ]; then
+    TEMPLATE=/etc/nginx/default-http.conf.tpl
+else
+    TEMPLATE=/etc/nginx/default.conf.tpl
+fi
+
+envsubst '${LISTEN_PORT} ${APP_HOST} ${APP_PORT}' < "$TEMPLATE" > /etc/nginx/conf.d/default.conf
 nginx -g 'daemon off;'
@@ -0,0 +1,19 @@
+#!/bin/sh
+
+# Check the hot query plans of the current migrations on seeded data.
+# Run inside the app container against a disposable Postgres database:
+#   docker-compose run --rm app sh /scripts/check_plans.sh
+# The first run on a tree without app/core/plan_shapes.json stores the
+# current plans there with a warning: review the printed plans and
+# commit the file, later runs fail on a regression against it.
+# Store a new baseline after an intended plan change with:
+#   python manage.py explain_plans --save
+
+set -e
+
+python manage.py wait_for_db
+python manage.py migrate
+if [ -z "$(python manage.py shell -c 'from core.models import Recipe; print(Recipe.objects.exists() or "")')" ]; then
+    python manage.py seed_data --users "${SEED_USERS:-20000}" --seed 1
+fi
+python manage.py explain_plans "$@"
@@ -0,0 +1,13 @@
+#!/bin/sh
+
+set -e
+
+# Reload the uwsgi workers without dropping in-flight requests. With
+# UWSGI_LAZY_APPS=1 they restart one at a time (chain reload), otherwise
+# the master reloads the preloaded app gracefully while the listen
+# queue holds the new requests.
+if [ "${UWSGI_LAZY_APPS:-0}" = 1 ]; then
+    echo c > "${UWSGI_FIFO:-/tmp/uwsgi-fifo}"
+else
+    echo r > "${UWSGI_FIFO:-/tmp/uwsgi-fifo}"
+fi
@@ -4,8 +4,44 @@ set -e
 
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
+python manage.py build_schema
 python manage.py migrate
+# The shards are shard_1, shard_2... in the DB_SHARD_HOSTS order
+SHARD=0
+for HOST in $(echo "${DB_SHARD_HOSTS:-}" | tr ',' ' '); do
+    SHARD=$((SHARD + 1))
+    python manage.py migrate --database "shard_$SHARD"
+done
 
 env
 
-uwsgi --socket :9000  --workers 4 --master --enable-threads --module app.wsgi
+# Every worker writes its metrics to this directory, stale files of a
+# previous run would be added to the new counters. The uwsgi master
+# wipes it again when a reload restarts it
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# APP_SERVER selects the server: uwsgi (WSGI), uvicorn or gunicorn (ASGI)
+CPUS=$(python -c 'from app.uwsgi_config import cpu_limit; print(cpu_limit())')
+
+case "${APP_SERVER:-uwsgi}" in
+    uvicorn)
+        exec uvicorn app.asgi:application \
+            --host 0.0.0.0 --port 9000 \
+            --workers "${WEB_CONCURRENCY:-$CPUS}"
+        ;;
+    gunicorn)
+        exec gunicorn app.asgi:application \
+            --worker-class uvicorn.workers.UvicornWorker \
+            --bind :9000 \
+            --workers "${WEB_CONCURRENCY:-$CPUS}" \
+            --graceful-timeout 30
+        ;;
+    *)
+        python -m app.uwsgi_config > /tmp/uwsgi.ini
+        cat /tmp/uwsgi.ini
+
+        exec uwsgi --ini /tmp/uwsgi.ini
+        ;;
+esac